@@ -1,8 +1,8 @@
 from __future__ import annotations
 
 from copy import deepcopy
-from dataclasses import asdict, dataclass
-from typing import List, Optional
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Set
 
 from domain.errors import DomainError, QuestError
 from domain.events import EventKind, EventLogEntry
@@ -24,6 +24,14 @@ from domain.models import (
     QuestInstance,
     QuestStatus,
     Rarity,
+    SECTION_ABILITIES,
+    SECTION_CHARACTER,
+    SECTION_CHATS,
+    SECTION_CLASSES,
+    SECTION_MESSAGES,
+    SECTION_QUESTS,
+    SECTION_SETTINGS,
+    SECTION_TEMPLATES,
     SystemMessage,
     chat_link_from_dict,
     chat_link_to_dict,
@@ -51,10 +59,19 @@ from .permissions import (
 @dataclass
 class CampaignService:
     state: CampaignState
+    dirty_sections: Set[str] = field(default_factory=set)
+    # Bumped on every change to a section and never reset, unlike ``dirty_sections``.
+    section_versions: Dict[str, int] = field(default_factory=dict)
+
+    def take_dirty_sections(self) -> Set[str]:
+        """Return the state sections changed since the last call and start afresh."""
+        sections, self.dirty_sections = self.dirty_sections, set()
+        return sections
 
     def grant_xp(self, amount: int, actor_role: str = HOST_ROLE) -> List[EventLogEntry]:
         ensure_host(actor_role)
         class_def = self._get_class_def()
+        self._mark(SECTION_CHARACTER)
         messages, events = grant_xp_and_level(
             self.state.character,
             amount,
@@ -63,6 +80,7 @@ class CampaignService:
             class_def,
         )
         if messages:
+            self._mark(SECTION_MESSAGES)
             self.state.system_messages.extend(messages)
             events.extend(self._events_for_messages(messages, actor_role))
         return events
@@ -74,6 +92,7 @@ class CampaignService:
         if levels <= 0:
             raise DomainError("Уровни должны быть больше нуля")
         class_def = self._get_class_def()
+        self._mark(SECTION_CHARACTER)
         messages, events = grant_levels(
             self.state.character,
             levels,
@@ -81,6 +100,7 @@ class CampaignService:
             class_def,
         )
         if messages:
+            self._mark(SECTION_MESSAGES)
             self.state.system_messages.extend(messages)
             events.extend(self._events_for_messages(messages, actor_role))
         return events
@@ -97,6 +117,7 @@ class CampaignService:
         available = int(self.state.character.unspent_stat_points or 0)
         if amount > available:
             raise DomainError("Недостаточно свободных очков")
+        self._mark(SECTION_CHARACTER)
         current = int(self.state.character.stats.get(stat_id, 0))
         new_value = current + amount
         self.state.character.stats[stat_id] = new_value
@@ -128,6 +149,7 @@ class CampaignService:
         actor_role: str = HOST_ROLE,
     ) -> List[EventLogEntry]:
         ensure_host(actor_role)
+        self._mark(SECTION_SETTINGS)
         payload: dict = {}
         if base_xp is not None and growth_rate is not None:
             self.state.settings.xp_curve = XPCurveExponential(
@@ -179,6 +201,7 @@ class CampaignService:
         class_def = self.state.classes.get(class_id)
         if not class_def:
             raise DomainError("Class not found")
+        self._mark(SECTION_CLASSES)
         class_def.per_level_bonus.per_level_stat_delta = {
             str(key): int(value) for key, value in per_level_bonus.items()
         }
@@ -221,6 +244,7 @@ class CampaignService:
             stat_mods={str(k): int(v) for k, v in stat_mods.items()},
             tags=[str(tag) for tag in tags],
         )
+        self._mark(SECTION_TEMPLATES)
         self.state.item_templates[template_id] = template
         return [
             EventLogEntry(
@@ -264,6 +288,7 @@ class CampaignService:
             severity=severity,
             collapsible=collapsible,
         )
+        self._mark(SECTION_TEMPLATES)
         self.state.message_templates[template_id] = template
         return [
             EventLogEntry(
@@ -293,6 +318,7 @@ class CampaignService:
             qty=qty,
             custom_name=custom_name,
         )
+        self._mark(SECTION_CHARACTER)
         self.state.character.inventory.add(inst)
         return [
             EventLogEntry(
@@ -305,6 +331,7 @@ class CampaignService:
                     "item_instance_id": inst.id,
                     "template_id": template_id,
                     "qty": qty,
+                    "custom_name": custom_name,
                 },
             )
         ]
@@ -313,6 +340,7 @@ class CampaignService:
         self, item_instance_id: str, actor_role: str = HOST_ROLE
     ) -> List[EventLogEntry]:
         ensure_host(actor_role)
+        self._mark(SECTION_CHARACTER)
         before_slots = dict(self.state.character.equipment.slots)
         self._unequip_if_equipped(item_instance_id)
         unequip_events = self._build_unequip_events(
@@ -340,6 +368,7 @@ class CampaignService:
     ) -> List[EventLogEntry]:
         ensure_host(actor_role)
         class_def = self._get_class_def()
+        self._mark(SECTION_CHARACTER)
         before_slots = dict(self.state.character.equipment.slots)
         events = equip_item_domain(
             self.state.character,
@@ -400,6 +429,7 @@ class CampaignService:
             objectives=objectives,
             started_at=utcnow(),
         )
+        self._mark(SECTION_QUESTS)
         self.state.active_quests.append(quest)
         return [
             EventLogEntry(
@@ -424,6 +454,7 @@ class CampaignService:
     ) -> List[EventLogEntry]:
         ensure_host(actor_role)
         quest = self._get_active_quest(quest_id)
+        self._mark(SECTION_QUESTS)
         quest.status = new_status
         if new_status in (QuestStatus.completed, QuestStatus.failed):
             quest.completed_at = utcnow()
@@ -462,6 +493,7 @@ class CampaignService:
             collapsible=collapsible,
             sound=severity,
         )
+        self._mark(SECTION_MESSAGES)
         self.state.system_messages.append(msg)
         return self._events_for_messages([msg], actor_role)
 
@@ -474,6 +506,7 @@ class CampaignService:
         ensure_player(actor_role)
         ensure_player_can_act(self.state.character)
         msg = self._find_message(message_id)
+        self._mark(SECTION_MESSAGES)
         choose_message_option(msg, option_id)
         return [
             EventLogEntry(
@@ -493,6 +526,7 @@ class CampaignService:
 
     def freeze_player(self, frozen: bool, actor_role: str = HOST_ROLE) -> List[EventLogEntry]:
         ensure_host(actor_role)
+        self._mark(SECTION_CHARACTER)
         self.state.character.frozen = frozen
         return [
             EventLogEntry(
@@ -511,6 +545,7 @@ class CampaignService:
         self, currency_id: str, value: int, actor_role: str = HOST_ROLE
     ) -> List[EventLogEntry]:
         ensure_host(actor_role)
+        self._mark(SECTION_CHARACTER)
         old_value = int(self.state.character.currencies.get(currency_id, 0))
         self.state.character.currencies[currency_id] = int(value)
         return [
@@ -543,6 +578,7 @@ class CampaignService:
             raise DomainError("Текущее значение ресурса не может быть отрицательным")
         if current > maximum:
             raise DomainError("Текущее значение не может превышать максимум")
+        self._mark(SECTION_CHARACTER)
         old_current, old_max = self.state.character.resources.get(resource_id, (0, 0))
         self.state.character.resources[resource_id] = (int(current), int(maximum))
         return [
@@ -567,6 +603,7 @@ class CampaignService:
         self, reputation_id: str, value: int, actor_role: str = HOST_ROLE
     ) -> List[EventLogEntry]:
         ensure_host(actor_role)
+        self._mark(SECTION_CHARACTER)
         old_value = int(self.state.character.reputations.get(reputation_id, 0))
         self.state.character.reputations[reputation_id] = int(value)
         return [
@@ -646,6 +683,7 @@ class CampaignService:
             display_name=display_name,
             link_payload=link_payload or {},
         )
+        self._mark(SECTION_CHATS)
         self.state.contacts[contact.id] = contact
         return [
             EventLogEntry(
@@ -656,6 +694,7 @@ class CampaignService:
                 payload={
                     "contact_id": contact.id,
                     "display_name": contact.display_name,
+                    "link_payload": contact.link_payload,
                 },
             )
         ]
@@ -685,11 +724,12 @@ class CampaignService:
             contact_id=contact_id,
             created_at=utcnow(),
         )
+        self._mark(SECTION_CHATS)
         self.state.friend_requests[request.id] = request
         return [
             EventLogEntry(
                 seq=0,
-                ts=utcnow(),
+                ts=request.created_at,
                 actor=actor_role,
                 kind=EventKind.chat_friend_request_sent.value,
                 payload={
@@ -711,6 +751,7 @@ class CampaignService:
             raise DomainError("Friend request not found")
         if request.accepted:
             raise DomainError("Friend request already accepted")
+        self._mark(SECTION_CHATS)
         request.accepted = True
         request.accepted_at = utcnow()
         chat = self._get_or_create_chat_thread(request.contact_id)
@@ -718,7 +759,7 @@ class CampaignService:
         return [
             EventLogEntry(
                 seq=0,
-                ts=utcnow(),
+                ts=request.accepted_at,
                 actor=actor_role,
                 kind=EventKind.chat_friend_request_accepted.value,
                 payload={
@@ -769,11 +810,12 @@ class CampaignService:
             created_at=utcnow(),
             links=normalized_links,
         )
+        self._mark(SECTION_CHATS)
         chat.messages.append(message)
         return [
             EventLogEntry(
                 seq=0,
-                ts=utcnow(),
+                ts=message.created_at,
                 actor=actor_role,
                 kind=EventKind.chat_message.value,
                 payload={
@@ -787,6 +829,11 @@ class CampaignService:
             )
         ]
 
+    def _mark(self, *sections: str) -> None:
+        self.dirty_sections.update(sections)
+        for section in sections:
+            self.section_versions[section] = self.section_versions.get(section, 0) + 1
+
     def _get_class_def(self) -> ClassDefinition:
         class_def = self.state.classes.get(self.state.character.class_id)
         if not class_def:
@@ -867,8 +914,10 @@ class CampaignService:
 
     def _get_ability_target(self, scope: str) -> dict:
         if scope == "library":
+            self._mark(SECTION_ABILITIES)
             return self.state.abilities
         if scope == "character":
+            self._mark(SECTION_CHARACTER)
             if not self.state.character.abilities:
                 self.state.character.abilities = {}
             return self.state.character.abilities
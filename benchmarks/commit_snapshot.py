@@ -0,0 +1,61 @@
+"""Measure the event-loop cost of queueing a chat message commit as the chat history grows.
+
+Usage: python benchmarks/commit_snapshot.py [--messages N ...] [--rounds N]
+
+``PersistenceQueue.submit`` serializes every dirty section on the event loop.
+A chat message marks the whole ``chats`` section, so its cost grows with the
+chat history; this prints that cost next to the ``deepcopy`` it used to pay on
+top.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from copy import deepcopy
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.storage_codecs import build_campaign  # noqa: E402
+from domain.models import SECTION_CHATS  # noqa: E402
+from storage.json_repo import serialize_campaign_sections, snapshot_keys  # noqa: E402
+
+
+def bench_chat_commit(messages: int, rounds: int) -> dict:
+    state = build_campaign(0, messages)
+    keys = snapshot_keys([SECTION_CHATS])
+    serialized = serialize_campaign_sections(state, keys)
+    return {
+        "messages": sum(len(chat.messages) for chat in state.chats.values()),
+        "serialize": _best_of(rounds, lambda: serialize_campaign_sections(state, keys)),
+        "deepcopy": _best_of(rounds, lambda: deepcopy(serialized)),
+    }
+
+
+def _best_of(rounds: int, func) -> float:
+    best = float("inf")
+    for _ in range(max(1, rounds)):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'chat messages':>14}{'serialize ms':>14}{'deepcopy ms':>13}")
+    for messages in args.messages:
+        row = bench_chat_commit(messages, args.rounds)
+        print(
+            f"{row['messages']:>14}{row['serialize'] * 1000:>14.1f}"
+            f"{row['deepcopy'] * 1000:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Compare snapshot codecs on a large generated campaign.
+
+Usage: python benchmarks/storage_codecs.py [--items N] [--messages N] [--rounds N]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from domain.helpers import new_id, utcnow  # noqa: E402
+from domain.models import (  # noqa: E402
+    CampaignState,
+    ChatContact,
+    ChatMessage,
+    ChatThread,
+    ItemInstance,
+    ItemTemplate,
+    ItemType,
+    MessageSeverity,
+    Rarity,
+    SystemMessage,
+)
+from storage.codecs import CODECS, get_codec  # noqa: E402
+from storage.durability import DURABILITY_NONE, Durability  # noqa: E402
+from storage.json_repo import JsonCampaignRepository, create_default_campaign_state  # noqa: E402
+
+
+def build_campaign(items: int, messages: int) -> CampaignState:
+    state = create_default_campaign_state()
+    rarities = list(Rarity)
+    for index in range(items):
+        template = ItemTemplate(
+            id=f"tpl_{index}",
+            name=f"Клинок эфира №{index}",
+            item_type=ItemType.weapon if index % 2 else ItemType.misc,
+            rarity=rarities[index % len(rarities)],
+            description="Холодный металл, покрытый рунами. " * 3,
+            stat_mods={"str": index % 7, "agi": index % 5},
+            tags=["forged", f"tier-{index % 4}"],
+        )
+        state.item_templates[template.id] = template
+        state.character.inventory.add(
+            ItemInstance(id=new_id("inst"), template_id=template.id, qty=1 + index % 3)
+        )
+    for index in range(messages):
+        state.system_messages.append(
+            SystemMessage(
+                id=new_id("msg"),
+                created_at=utcnow(),
+                severity=MessageSeverity.info,
+                title=f"Событие {index}",
+                body="Система фиксирует изменение состояния персонажа. " * 2,
+            )
+        )
+    for contact_index in range(max(1, messages // 100)):
+        contact = ChatContact(id=f"contact_{contact_index}", display_name=f"Собеседник {contact_index}")
+        thread = ChatThread(id=f"chat_{contact_index}", contact_id=contact.id, opened=True)
+        for index in range(100):
+            thread.messages.append(
+                ChatMessage(
+                    id=new_id("chat_msg"),
+                    chat_id=thread.id,
+                    sender_contact_id=contact.id,
+                    text=f"Сообщение {index}: встретимся у врат на закате.",
+                )
+            )
+        state.contacts[contact.id] = contact
+        state.chats[thread.id] = thread
+    return state
+
+
+def bench_codec(name: str, state: CampaignState, directory: Path, rounds: int) -> dict:
+    codec = get_codec(name)
+    path = directory / f"campaign-{name}.json"
+    durability = Durability(DURABILITY_NONE)
+    writer = JsonCampaignRepository(path, durability=durability, codec=codec)
+    writer.save(state)
+    write_s = _best_of(rounds, lambda: writer.save(state))
+    raw = path.read_bytes()
+    decode_s = _best_of(rounds, lambda: codec.decode(raw))
+
+    def cold_load() -> None:
+        JsonCampaignRepository(path, durability=durability, codec=codec).load()
+
+    def first_section() -> None:
+        JsonCampaignRepository(path, durability=durability, codec=codec)._read_sections(
+            ("character", "settings")
+        )
+
+    load_s = _best_of(rounds, cold_load)
+    section_s = _best_of(rounds, first_section)
+    return {
+        "codec": name,
+        "bytes": len(raw),
+        "write": write_s,
+        "decode": decode_s,
+        "load": load_s,
+        "section": section_s,
+    }
+
+
+def _best_of(rounds: int, func) -> float:
+    best = float("inf")
+    for _ in range(max(1, rounds)):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    state = build_campaign(args.items, args.messages)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in CODECS:
+            try:
+                results.append(bench_codec(name, state, Path(tmp), args.rounds))
+            except ValueError as exc:
+                print(f"skip {name}: {exc}")
+
+    baseline = next((row for row in results if row["codec"] == "json-pretty"), results[0])
+    print(
+        f"{'codec':<12}{'bytes':>12}{'size':>8}{'write ms':>11}{'decode ms':>11}{'load ms':>10}"
+        f"{'section ms':>12}"
+    )
+    for row in results:
+        print(
+            f"{row['codec']:<12}{row['bytes']:>12}{row['bytes'] / baseline['bytes']:>8.2f}"
+            f"{row['write'] * 1000:>11.1f}{row['decode'] * 1000:>11.1f}{row['load'] * 1000:>10.1f}"
+            f"{row['section'] * 1000:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
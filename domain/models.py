@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from copy import deepcopy
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
@@ -225,6 +226,27 @@ class CampaignState:
     settings: CampaignSettings = field(default_factory=CampaignSettings)
 
 
+# Groups of CampaignState fields that are persisted (and invalidated) together.
+SECTION_CHARACTER = "character"
+SECTION_CLASSES = "classes"
+SECTION_TEMPLATES = "templates"
+SECTION_ABILITIES = "abilities"
+SECTION_QUESTS = "quests"
+SECTION_MESSAGES = "messages"
+SECTION_CHATS = "chats"
+SECTION_SETTINGS = "settings"
+STATE_SECTIONS = (
+    SECTION_CHARACTER,
+    SECTION_CLASSES,
+    SECTION_TEMPLATES,
+    SECTION_ABILITIES,
+    SECTION_QUESTS,
+    SECTION_MESSAGES,
+    SECTION_CHATS,
+    SECTION_SETTINGS,
+)
+
+
 @dataclass
 class Objective:
     id: str
@@ -308,7 +330,7 @@ def choice_to_dict(choice: ChoiceOption) -> Dict[str, Any]:
     return {
         "id": choice.id,
         "label": choice.label,
-        "payload": choice.payload,
+        "payload": deepcopy(choice.payload),
     }
 
 
@@ -440,7 +462,7 @@ def chat_link_to_dict(link: ChatLink) -> Dict[str, Any]:
     if link.id:
         data["id"] = link.id
     if link.payload:
-        data["payload"] = link.payload
+        data["payload"] = deepcopy(link.payload)
     return data
 
 
@@ -471,5 +493,5 @@ class ChatThread:
     messages: List[ChatMessage] = field(default_factory=list)
 
 
-from .helpers import utcnow  # noqa: E402
+from .helpers import new_id, utcnow  # noqa: E402
 from .rules import ClassPerLevelBonus, StatPointRule, XPCurveExponential  # noqa: E402
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.permissions import HOST_ROLE, PLAYER_ROLE
@@ -13,6 +16,7 @@ from domain.events import EventLogEntry
 from domain.helpers import new_id
 from domain.models import (
     Ability,
+    CampaignState,
     ChatLink,
     EquipmentSlot,
     ItemType,
@@ -22,9 +26,22 @@ from domain.models import (
     chat_link_to_dict,
     objective_to_dict,
 )
+from storage.compaction import StoreCompaction
+from storage.event_query import DEFAULT_EVENT_PAGE, MAX_EVENT_PAGE, EventQuery, entity_fields
 from storage.json_repo import serialize_campaign_state
+from storage.repo import AsyncCampaignRepository
+from storage.streaming import (
+    EXPORT_FORMAT_JSON,
+    EXPORT_MEDIA_TYPES,
+    ImportProgress,
+    NdjsonImporter,
+    export_header,
+    iter_export_body,
+)
 
 from .auth import PairingManager
+from .persistence import PersistenceQueue
+from .snapshot_cache import SnapshotFragmentCache, player_template_ids, project_events
 from .ws import WebSocketHub
 
 
@@ -211,14 +228,35 @@ class ApiContext:
     pairing: PairingManager
     hub: WebSocketHub
     repo: Any
+    async_repo: AsyncCampaignRepository
+    persistence: PersistenceQueue
+    import_progress: Optional[ImportProgress] = None
+    compaction: Optional[StoreCompaction] = None
+    compaction_task: Optional[asyncio.Task] = None
+    # Snapshot ETags change with ``last_seq`` and whenever the state is
+    # replaced wholesale (imports do that without new events) or the server restarts.
+    state_revision: int = 0
+    boot_id: str = field(default_factory=lambda: new_id("boot"))
+    snapshot_cache: SnapshotFragmentCache = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.snapshot_cache = SnapshotFragmentCache(self.service)
+
+    def replace_state(self, state: CampaignState) -> None:
+        self.service.state = state
+        self.state_revision += 1
 
 
 def get_api_context(request: Request) -> ApiContext:
     return request.app.state.context
 
 
-def build_linkable_catalog(service: CampaignService) -> Dict[str, List[Dict[str, str]]]:
+def build_linkable_catalog(
+    service: CampaignService, role: str = HOST_ROLE
+) -> Dict[str, List[Dict[str, str]]]:
+    """What a chat message may link to; players only get the templates their snapshot has."""
     state = service.state
+    item_ids, quest_ids = _linkable_template_ids(state, role)
     return {
         "npcs": [
             {"type": "npc", "id": contact.id, "label": contact.display_name}
@@ -227,18 +265,30 @@ def build_linkable_catalog(service: CampaignService) -> Dict[str, List[Dict[str,
         "quests": [
             {"type": "quest", "id": template.id, "label": template.name}
             for template in state.quest_templates.values()
+            if quest_ids is None or template.id in quest_ids
         ],
         "items": [
             {"type": "item", "id": template.id, "label": template.name}
             for template in state.item_templates.values()
+            if item_ids is None or template.id in item_ids
         ],
     }
 
 
+def _linkable_template_ids(
+    state: CampaignState, role: str
+) -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+    if role == PLAYER_ROLE:
+        return player_template_ids(state)
+    return None, None
+
+
 def resolve_chat_links(
-    links: List[ChatLinkPayload], service: CampaignService
+    links: List[ChatLinkPayload], service: CampaignService, role: str = HOST_ROLE
 ) -> List[Dict[str, Any]]:
     state = service.state
+    # A player may only link what ``build_linkable_catalog`` offers them.
+    item_ids, quest_ids = _linkable_template_ids(state, role)
     resolved: List[Dict[str, str]] = []
     for link in links:
         if link.type == "npc":
@@ -254,7 +304,7 @@ def resolve_chat_links(
             }
         elif link.type == "quest":
             quest = state.quest_templates.get(link.id)
-            if not quest:
+            if not quest or (quest_ids is not None and link.id not in quest_ids):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST, detail="Quest not found"
                 )
@@ -267,7 +317,7 @@ def resolve_chat_links(
             }
         elif link.type == "item":
             item = state.item_templates.get(link.id)
-            if not item:
+            if not item or (item_ids is not None and link.id not in item_ids):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST, detail="Item not found"
                 )
@@ -334,31 +384,106 @@ def create_player_pairing(
 
 
 @router.get("/snapshot")
-def get_snapshot(
+async def get_snapshot(
     context: ApiContext = Depends(get_api_context),
     authorization: str = Header(..., alias="Authorization"),
-) -> Dict[str, Any]:
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+) -> Response:
     token = authorization.replace("Bearer", "").strip()
-    if context.pairing.get_role(token) is None:
+    role = context.pairing.get_role(token)
+    if role is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token")
-    last_seq = context.repo.get_last_seq()
-    return {
-        "snapshot": serialize_campaign_state(context.service.state),
-        "last_seq": last_seq,
-    }
+    last_seq = await context.persistence.get_last_seq()
+    etag = snapshot_etag(context, last_seq, role)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # Players get a projection without host-only templates and hidden entities.
+    return Response(
+        content=context.snapshot_cache.encode(last_seq, role),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def snapshot_etag(context: ApiContext, last_seq: int, role: str = HOST_ROLE) -> str:
+    state_id = context.service.state.id
+    key = f"{state_id}:{last_seq}:{context.state_revision}:{context.boot_id}:{role}"
+    return '"%s"' % hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
 
 
 @router.get("/events")
-def list_events(
+async def list_events(
     after_seq: int = 0,
+    before_seq: Optional[int] = Query(None, ge=1),
+    limit: int = Query(DEFAULT_EVENT_PAGE, ge=1, le=MAX_EVENT_PAGE),
+    kinds: Optional[str] = None,
+    actor: Optional[str] = None,
+    order: str = Query("asc"),
+    cursor: Optional[str] = None,
     context: ApiContext = Depends(get_api_context),
     authorization: str = Header(..., alias="Authorization"),
 ) -> Dict[str, Any]:
+    """One page of the log; ``next_cursor`` (which carries the filters) fetches the next one."""
     token = authorization.replace("Bearer", "").strip()
-    if context.pairing.get_role(token) is None:
+    role = context.pairing.get_role(token)
+    if role is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token")
-    events = context.repo.list_events(after_seq=after_seq)
-    return {"events": [event.to_dict() for event in events]}
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown order")
+    if cursor is not None:
+        try:
+            query = EventQuery.from_cursor(cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    else:
+        query = EventQuery(
+            after_seq=after_seq,
+            before_seq=before_seq,
+            kinds=frozenset(kind.strip() for kind in (kinds or "").split(",") if kind.strip()),
+            actor=actor or None,
+            reverse=order == "desc",
+        )
+    events = await context.async_repo.query_events(query, limit + 1)
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = query.following(events[-1].seq).to_cursor()
+    return {
+        "events": project_events(events, role, context.service.state),
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get(
+    "/history/{entity_type}/{entity_id}",
+    dependencies=[Depends(require_token_role(HOST_ROLE))],
+)
+async def entity_history(
+    entity_type: str, entity_id: str, context: ApiContext = Depends(get_api_context)
+) -> Dict[str, Any]:
+    """Every event naming one quest, item instance, chat, contact, message or ability.
+
+    Host only: the history of a hidden quest or ability is host-only data.
+    """
+    try:
+        entity_fields(entity_type)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    events = await context.async_repo.entity_events(entity_type, entity_id)
+    return {
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "events": [event.to_dict() for event in events],
+    }
 
 
 @router.post("/host/grant-xp", dependencies=[Depends(require_token_role(HOST_ROLE))])
@@ -733,7 +858,7 @@ async def accept_friend_request(
 
 @router.get("/player/linkables", dependencies=[Depends(require_token_role(PLAYER_ROLE))])
 def list_player_linkables(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
-    return build_linkable_catalog(context.service)
+    return build_linkable_catalog(context.service, PLAYER_ROLE)
 
 
 @router.post("/host/chats/{chat_id}/messages", dependencies=[Depends(require_token_role(HOST_ROLE))])
@@ -764,73 +889,157 @@ async def send_player_chat_message(
         lambda: context.service.send_chat_message(
             chat_id=chat_id,
             text=payload.text,
-            links=resolve_chat_links(payload.links, context.service),
+            links=resolve_chat_links(payload.links, context.service, PLAYER_ROLE),
             actor_role=PLAYER_ROLE,
         ),
     )
 
 
+@router.get("/host/storage", dependencies=[Depends(require_token_role(HOST_ROLE))])
+async def get_storage_stats(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
+    stats = await context.async_repo.get_storage_stats()
+    return {
+        **stats,
+        "write_behind": context.persistence.stats(),
+        "snapshot_cache": context.snapshot_cache.stats(),
+    }
+
+
+@router.post(
+    "/host/storage/compact",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(require_token_role(HOST_ROLE))],
+)
+async def start_storage_compaction(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
+    if context.compaction is not None and not context.compaction.report.done:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Compaction in progress")
+    if context.import_progress is not None and not context.import_progress.done:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Import in progress")
+    context.compaction = context.repo.start_compaction()
+    context.compaction_task = asyncio.create_task(_run_compaction(context, context.compaction))
+    return {"active": True, **context.compaction.report.to_dict()}
+
+
+@router.get("/host/storage/compact", dependencies=[Depends(require_token_role(HOST_ROLE))])
+def get_storage_compaction(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
+    if context.compaction is None:
+        return {"active": False}
+    report = context.compaction.report
+    return {"active": not report.done, **report.to_dict()}
+
+
+@router.get("/host/state-at/{seq}", dependencies=[Depends(require_token_role(HOST_ROLE))])
+async def get_state_at(
+    seq: int, context: ApiContext = Depends(get_api_context)
+) -> Dict[str, Any]:
+    try:
+        state = await context.async_repo.state_at(seq)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    return {
+        "snapshot": serialize_campaign_state(state),
+        "seq": min(seq, await context.async_repo.get_last_seq()),
+    }
+
+
 @router.get("/host/export", dependencies=[Depends(require_token_role(HOST_ROLE))])
-def export_campaign(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
-    return context.repo.export_data()
+async def export_campaign(
+    format: str = Query(EXPORT_FORMAT_JSON),
+    context: ApiContext = Depends(get_api_context),
+) -> StreamingResponse:
+    return await _stream_export(context, format, include_snapshot=True)
 
 
 @router.post("/host/import", dependencies=[Depends(require_token_role(HOST_ROLE))])
-def import_campaign(
+async def import_campaign(
     payload: ImportRequest, context: ApiContext = Depends(get_api_context)
 ) -> Dict[str, Any]:
-    _apply_import(lambda: context.repo.import_data(payload.dict()))
-    context.service.state = context.repo.load()
+    context.replace_state(
+        await _apply_import(context, context.repo.import_data, payload.dict())
+    )
     return {"status": "ok"}
 
 
+@router.post("/host/import/stream", dependencies=[Depends(require_token_role(HOST_ROLE))])
+async def import_campaign_stream(
+    request: Request,
+    resume_after: Optional[int] = Query(None, ge=0),
+    context: ApiContext = Depends(get_api_context),
+) -> Dict[str, Any]:
+    progress = await _stream_import(request, context, True, resume_after)
+    return {"status": "ok", **progress.to_dict()}
+
+
+@router.get("/host/import/progress", dependencies=[Depends(require_token_role(HOST_ROLE))])
+def get_import_progress(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
+    if context.import_progress is None:
+        return {"active": False}
+    return {"active": not context.import_progress.done, **context.import_progress.to_dict()}
+
+
 @router.get("/export/templates", dependencies=[Depends(require_token_role(HOST_ROLE))])
-def export_templates(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
-    return context.repo.export_templates()
+async def export_templates(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
+    return await context.async_repo.export_templates()
 
 
 @router.post("/import/templates", dependencies=[Depends(require_token_role(HOST_ROLE))])
-def import_templates(
+async def import_templates(
     payload: TemplatesImportRequest, context: ApiContext = Depends(get_api_context)
 ) -> Dict[str, Any]:
-    _apply_import(lambda: context.repo.import_templates(payload.dict()))
-    context.service.state = context.repo.load()
+    context.replace_state(
+        await _apply_import(context, context.repo.import_templates, payload.dict())
+    )
     return {"status": "ok"}
 
 
 @router.get("/export/log", dependencies=[Depends(require_token_role(HOST_ROLE))])
-def export_log(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
-    return context.repo.export_log()
+async def export_log(
+    format: str = Query(EXPORT_FORMAT_JSON),
+    context: ApiContext = Depends(get_api_context),
+) -> StreamingResponse:
+    return await _stream_export(context, format, include_snapshot=False)
 
 
 @router.post("/import/log", dependencies=[Depends(require_token_role(HOST_ROLE))])
-def import_log(
+async def import_log(
     payload: LogImportRequest, context: ApiContext = Depends(get_api_context)
 ) -> Dict[str, Any]:
-    _apply_import(lambda: context.repo.import_log(payload.dict()))
+    await _apply_import(context, context.repo.import_log, payload.dict())
     return {"status": "ok"}
 
 
+@router.post("/import/log/stream", dependencies=[Depends(require_token_role(HOST_ROLE))])
+async def import_log_stream(
+    request: Request,
+    resume_after: Optional[int] = Query(None, ge=0),
+    context: ApiContext = Depends(get_api_context),
+) -> Dict[str, Any]:
+    progress = await _stream_import(request, context, False, resume_after)
+    return {"status": "ok", **progress.to_dict()}
+
+
 @router.get("/export/chats", dependencies=[Depends(require_token_role(HOST_ROLE))])
-def export_chats(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
-    return context.repo.export_chats()
+async def export_chats(context: ApiContext = Depends(get_api_context)) -> Dict[str, Any]:
+    return await context.async_repo.export_chats()
 
 
 @router.post("/import/chats", dependencies=[Depends(require_token_role(HOST_ROLE))])
-def import_chats(
+async def import_chats(
     payload: ChatsImportRequest, context: ApiContext = Depends(get_api_context)
 ) -> Dict[str, Any]:
-    _apply_import(lambda: context.repo.import_chats(payload.dict()))
-    context.service.state = context.repo.load()
+    context.replace_state(
+        await _apply_import(context, context.repo.import_chats, payload.dict())
+    )
     return {"status": "ok"}
 
 
 async def _persist_and_broadcast(
     context: ApiContext, events: List[EventLogEntry]
 ) -> Dict[str, Any]:
-    persisted = context.repo.append_events(events)
-    context.repo.save(context.service.state)
-    await context.hub.broadcast_events(persisted)
+    persisted = await context.persistence.commit(
+        events, context.service.state, context.service.take_dirty_sections()
+    )
+    await context.hub.broadcast_events(persisted, context.service.state)
     return {"events": [event.to_dict() for event in persisted]}
 
 
@@ -842,8 +1051,83 @@ async def _apply_service(context: ApiContext, call) -> Dict[str, Any]:
     return await _persist_and_broadcast(context, events)
 
 
-def _apply_import(call) -> None:
+async def _stream_export(
+    context: ApiContext, fmt: str, include_snapshot: bool
+) -> StreamingResponse:
+    """Stream an export cut at the commits accepted so far.
+
+    The header is read on the persistence thread after pending commits are
+    written, so its snapshot matches its ``last_seq``; the events streamed
+    after it stop at that ``last_seq``.
+    """
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown export format: {fmt}"
+        )
+    header = await context.persistence.run(export_header, context.repo, include_snapshot)
+    return StreamingResponse(
+        iter_export_body(context.repo, header, fmt), media_type=EXPORT_MEDIA_TYPES[fmt]
+    )
+
+
+async def _stream_import(
+    request: Request,
+    context: ApiContext,
+    include_snapshot: bool,
+    resume_after: Optional[int],
+) -> ImportProgress:
+    """Feed the body to the repository batch by batch on the persistence thread.
+
+    Commits are held back until the import (and, with the snapshot, the
+    reload of the state) is done, so none lands between two batches.
+    """
+    if context.import_progress is not None and not context.import_progress.done:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Import in progress")
+    async with context.persistence.exclusive() as run:
+        stored_seq = await run(context.repo.get_last_seq)
+        if resume_after is not None and resume_after > stored_seq:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"error": "Resume cursor is ahead of storage", "cursor": stored_seq},
+            )
+        importer = NdjsonImporter(context.repo, include_snapshot, resume_after)
+        context.import_progress = importer.progress
+        try:
+            async for chunk in request.stream():
+                await run(importer.feed, chunk)
+            progress = await run(importer.finish)
+        except ValueError as exc:
+            importer.progress.error = str(exc)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": str(exc), "cursor": importer.progress.cursor},
+            ) from exc
+        finally:
+            importer.progress.done = True
+        if include_snapshot:
+            context.replace_state(await run(context.repo.load))
+    return progress
+
+
+async def _run_compaction(context: ApiContext, compaction: StoreCompaction) -> None:
+    """Build on a thread of its own while commits go on, then switch behind them."""
+    try:
+        await asyncio.to_thread(compaction.build)
+        await context.persistence.run(compaction.switch)
+    except Exception as exc:
+        compaction.report.error = str(exc)
+    finally:
+        compaction.report.done = True
+
+
+async def _apply_import(context: ApiContext, call, payload: Dict[str, Any]) -> CampaignState:
+    """Run an import behind pending commits and return the state it produced."""
+
+    def _import_and_load() -> CampaignState:
+        call(payload)
+        return context.repo.load()
+
     try:
-        call()
+        return await context.persistence.run(_import_and_load)
     except ValueError as exc:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
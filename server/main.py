@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,13 +13,20 @@ from fastapi.staticfiles import StaticFiles
 
 from app.services import CampaignService
 from domain.models import CampaignState
-from storage.json_repo import JsonCampaignRepository
+from storage.async_repo import ThreadedCampaignRepository, read_threads_from_env
+from storage.factory import repository_from_env
+from storage.repo import CampaignRepository
 
 from .api import ApiContext, router
 from .auth import PairingManager
+from .memory import SectionReleaser, state_soft_limit_from_env
+from .persistence import PersistenceQueue, commit_wait_from_env
+from .snapshot_cache import project_events
 from .ui import router as ui_router
 from .ws import WebSocketHub
 
+BACKLOG_BATCH_SIZE = 500
+
 
 def _is_truthy(value: str | None) -> bool:
     if value is None:
@@ -39,7 +49,7 @@ def _is_campaign_empty(state: CampaignState | None) -> bool:
 
 
 def _load_demo_data_if_empty(
-    repo: JsonCampaignRepository,
+    repo: CampaignRepository,
     state: CampaignState,
     base_dir: Path,
 ) -> CampaignState:
@@ -57,8 +67,27 @@ def _load_demo_data_if_empty(
     return repo.load()
 
 
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
+    context = app.state.context
+    releaser = None
+    soft_limit = state_soft_limit_from_env()
+    if soft_limit is not None:
+        releaser = SectionReleaser(context.service, context.persistence, soft_limit)
+        releaser.start()
+    yield
+    if releaser is not None:
+        await releaser.close()
+    if context.compaction_task is not None:
+        # An unfinished build is discarded; its staging files are cleared by the next run.
+        context.compaction_task.cancel()
+        await asyncio.gather(context.compaction_task, return_exceptions=True)
+    await context.persistence.close()
+    context.async_repo.close()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="Aether Journal Host")
+    app = FastAPI(title="Aether Journal Host", lifespan=_lifespan)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -68,15 +97,26 @@ def create_app() -> FastAPI:
     )
 
     base_dir = Path(__file__).resolve().parent.parent
-    repo_path = os.getenv("AETHER_CAMPAIGN_PATH", "data/campaign.json")
-    repo = JsonCampaignRepository(repo_path)
+    repo = repository_from_env()
     state = repo.load()
     state = _load_demo_data_if_empty(repo, state, base_dir)
     service = CampaignService(state)
     pairing = PairingManager()
     hub = WebSocketHub()
 
-    app.state.context = ApiContext(service=service, pairing=pairing, hub=hub, repo=repo)
+    persistence = PersistenceQueue(repo, wait=commit_wait_from_env())
+    async_repo = ThreadedCampaignRepository(
+        repo, max_workers=read_threads_from_env(), batch_size=BACKLOG_BATCH_SIZE
+    )
+
+    app.state.context = ApiContext(
+        service=service,
+        pairing=pairing,
+        hub=hub,
+        repo=repo,
+        async_repo=async_repo,
+        persistence=persistence,
+    )
 
     app.include_router(router)
     app.include_router(ui_router)
@@ -104,13 +144,11 @@ def create_app() -> FastAPI:
         if role is None:
             await websocket.close(code=1008)
             return
-        await hub.connect(websocket)
+        await hub.connect(websocket, role)
         try:
-            backlog = repo.list_events(after_seq=after_seq)
-            if backlog:
-                await websocket.send_json(
-                    {"type": "events", "items": [event.to_dict() for event in backlog]}
-                )
+            async for batch in async_repo.iter_event_batches(after_seq=after_seq):
+                items = project_events(batch, role, app.state.context.service.state)
+                await websocket.send_json({"type": "events", "items": items})
             while True:
                 await websocket.receive_text()
         except WebSocketDisconnect:
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import List, Optional
+
+from app.services import CampaignService
+
+from .persistence import PersistenceQueue
+
+DEFAULT_CHECK_INTERVAL = 30.0
+
+
+class SectionReleaser:
+    """Give back lazily loaded state sections once the process grows past a soft limit.
+
+    Every ``interval`` seconds the resident set size is compared with
+    ``soft_limit_mb``; above it, every materialized section already on disk is
+    dropped from ``service.state`` and read again on its next access.
+    """
+
+    def __init__(
+        self,
+        service: CampaignService,
+        persistence: PersistenceQueue,
+        soft_limit_mb: float,
+        interval: float = DEFAULT_CHECK_INTERVAL,
+    ) -> None:
+        self.service = service
+        self.persistence = persistence
+        self.soft_limit_mb = float(soft_limit_mb)
+        self.interval = max(0.1, float(interval))
+        self.releases = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def check(self) -> List[str]:
+        """Release clean sections if memory is over the limit; returns what was released."""
+        rss = resident_memory_mb()
+        if rss is None or rss <= self.soft_limit_mb:
+            return []
+        released = await self.persistence.release_clean_sections(
+            self.service.state, self.service.dirty_sections
+        )
+        if released:
+            self.releases += 1
+        return released
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+
+def resident_memory_mb() -> Optional[float]:
+    """Resident set size of this process, or ``None`` where ``/proc`` is unavailable."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as handle:
+            pages = int(handle.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def state_soft_limit_from_env() -> Optional[float]:
+    value = os.getenv("AETHER_STATE_SOFT_LIMIT_MB", "").strip()
+    return float(value) if value else None
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from domain.events import EventLogEntry
+from domain.models import CampaignState
+from storage.json_repo import (
+    LazyCampaignState,
+    serialize_campaign_sections,
+    serialize_campaign_state,
+    snapshot_keys,
+)
+from storage.repo import CampaignRepository
+
+COMMIT_WAIT_DURABLE = "durable"
+COMMIT_WAIT_ACCEPTED = "accepted"
+COMMIT_WAIT_MODES = (COMMIT_WAIT_DURABLE, COMMIT_WAIT_ACCEPTED)
+DEFAULT_MAX_PENDING = 256
+DEFAULT_MAX_COALESCED = 64
+
+
+@dataclass
+class PendingCommit:
+    events: List[EventLogEntry]
+    snapshot: Dict[str, Any]
+    partial: bool
+    written: asyncio.Future
+
+
+class PersistenceQueue:
+    """Write-behind commits for the async routes.
+
+    ``submit`` serializes the dirty sections on the event loop, numbers the
+    events and queues them. A single worker takes everything queued behind the
+    first commit and writes it with one ``repo.commit_snapshot`` call on its
+    own thread, so the loop never waits on disk and bursts of commits cost one
+    write. ``commit`` waits for that write (``durable``) or only until the
+    commit is queued (``accepted``); in the latter case the returned ``seq``
+    values are provisional until the write lands, since a failed write
+    renumbers whatever follows it. The sections a failed write carried are
+    no longer marked dirty in the service, so until a full snapshot has been
+    written again every commit sends the whole state.
+    """
+
+    def __init__(
+        self,
+        repo: CampaignRepository,
+        wait: str = COMMIT_WAIT_DURABLE,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        max_coalesced: int = DEFAULT_MAX_COALESCED,
+    ) -> None:
+        if wait not in COMMIT_WAIT_MODES:
+            raise ValueError(f"Unknown commit wait mode: {wait}")
+        self.repo = repo
+        self.wait = wait
+        self.max_pending = max(1, int(max_pending))
+        self.max_coalesced = max(1, int(max_coalesced))
+        self.writes = 0
+        self.commits = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aether-persist")
+        self._queue: Optional[asyncio.Queue[PendingCommit]] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._submit_lock: Optional[asyncio.Lock] = None
+        self._last_seq: Optional[int] = None
+        self._queued_events = 0
+        self._pending = 0
+        self._resync = False
+
+    async def commit(
+        self,
+        events: List[EventLogEntry],
+        state: CampaignState,
+        sections: Optional[Iterable[str]] = None,
+        wait: Optional[str] = None,
+    ) -> List[EventLogEntry]:
+        pending = await self.submit(events, state, sections)
+        if (wait or self.wait) == COMMIT_WAIT_ACCEPTED:
+            pending.written.add_done_callback(_consume_result)
+            return pending.events
+        # Shielded so a cancelled request does not cancel the shared write.
+        return await asyncio.shield(pending.written)
+
+    async def submit(
+        self,
+        events: List[EventLogEntry],
+        state: CampaignState,
+        sections: Optional[Iterable[str]] = None,
+    ) -> PendingCommit:
+        """Queue a commit; ``await pending.written`` to wait for the write."""
+        self._start()
+        if sections is None or self._resync:
+            snapshot, partial = serialize_campaign_state(state), False
+        else:
+            snapshot, partial = serialize_campaign_sections(state, snapshot_keys(sections)), True
+        # The serializers copy every container they take from the state, so
+        # the loop can keep mutating it while the worker thread encodes this.
+        # Each dirty section is still serialized whole: a chat message costs
+        # as much as that chat section (see ``benchmarks/commit_snapshot.py``).
+        pending = PendingCommit(
+            events=events,
+            snapshot=snapshot,
+            partial=partial,
+            written=asyncio.get_running_loop().create_future(),
+        )
+        async with self._submit_lock:
+            last_seq = await self.get_last_seq()
+            for event in events:
+                last_seq += 1
+                event.seq = last_seq
+            self._last_seq = last_seq
+            self._queued_events += len(events)
+            self._pending += 1
+            await self._queue.put(pending)
+        return pending
+
+    async def get_last_seq(self) -> int:
+        """The highest ``seq`` handed out, including commits not written yet."""
+        if self._last_seq is None:
+            stored = await self._in_executor(self.repo.get_last_seq)
+            self._last_seq = stored + self._queued_events
+        return self._last_seq
+
+    async def flush(self) -> None:
+        """Wait until every commit queued so far has been written."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a direct repository call on the persistence thread after pending commits."""
+        async with self.exclusive() as run:
+            return await run(func, *args)
+
+    @asynccontextmanager
+    async def exclusive(self) -> AsyncIterator[Callable[..., Awaitable[Any]]]:
+        """Hold new commits back while the caller writes to the repository directly.
+
+        Pending commits are written first. The yielded ``run`` executes a
+        repository call on the persistence thread; commits submitted
+        meanwhile wait until the block exits and are numbered after what it
+        wrote.
+        """
+        self._start()
+        assert self._submit_lock is not None
+        async with self._submit_lock:
+            await self.flush()
+            try:
+                yield self._in_executor
+            finally:
+                self.reset()
+
+    async def release_clean_sections(self, state: CampaignState, dirty: Iterable[str]) -> List[str]:
+        """Drop the materialized sections of a lazy ``state`` that are safely on disk.
+
+        ``dirty`` are the state sections changed but not submitted yet; they
+        and anything still queued are kept. Returns the released snapshot keys.
+        """
+        await self.flush()
+        # No await from here on: a commit slipping in would make the check stale.
+        if self._pending or self._resync or not isinstance(state, LazyCampaignState):
+            return []
+        keep = set(snapshot_keys(dirty))
+        return state.release(key for key in state.materialized() if key not in keep)
+
+    def reset(self) -> None:
+        """Forget the cached ``seq`` after the repository was written to directly."""
+        self._last_seq = None
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "commit_wait": self.wait,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "commits": self.commits,
+            "writes": self.writes,
+        }
+
+    def _start(self) -> None:
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue(self.max_pending)
+        self._submit_lock = asyncio.Lock()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_coalesced and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            events = [event for pending in batch for event in pending.events]
+            self._queued_events -= len(events)
+            snapshot, partial = _merge_snapshots(batch)
+            try:
+                await self._in_executor(self.repo.commit_snapshot, events, snapshot, partial)
+            except Exception as exc:
+                self._last_seq = None
+                self._resync = True
+                for pending in batch:
+                    if not pending.written.done():
+                        pending.written.set_exception(exc)
+            else:
+                if not partial:
+                    self._resync = False
+                self.writes += 1
+                self.commits += len(batch)
+                for pending in batch:
+                    if not pending.written.done():
+                        pending.written.set_result(pending.events)
+            finally:
+                self._pending -= len(batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _in_executor(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+
+def commit_wait_from_env() -> str:
+    return os.getenv("AETHER_COMMIT_WAIT", COMMIT_WAIT_DURABLE).strip().lower()
+
+
+def _merge_snapshots(batch: List[PendingCommit]) -> Tuple[Dict[str, Any], bool]:
+    """Fold queued snapshots in order: later keys win, a full snapshot drops earlier ones."""
+    snapshot: Dict[str, Any] = {}
+    partial = True
+    for pending in batch:
+        if not pending.partial:
+            snapshot = {}
+            partial = False
+        snapshot.update(pending.snapshot)
+    return snapshot, partial
+
+
+def _consume_result(future: asyncio.Future) -> None:
+    # Nobody awaits an accepted commit; read the exception so asyncio does not log it.
+    if not future.cancelled():
+        future.exception()
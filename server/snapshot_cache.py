@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.permissions import HOST_ROLE, PLAYER_ROLE
+from app.services import CampaignService
+from domain.events import EventKind, EventLogEntry
+from domain.models import (
+    SECTION_ABILITIES,
+    SECTION_CHARACTER,
+    SECTION_CLASSES,
+    SECTION_QUESTS,
+    SECTION_TEMPLATES,
+    CampaignState,
+    QuestStatus,
+)
+from storage.json_repo import SECTION_KEYS, serialize_campaign_sections
+
+
+class SnapshotFragmentCache:
+    """Encoded ``/api/snapshot`` bodies assembled from per-section JSON fragments.
+
+    Each state section is encoded once per role and reused until
+    ``CampaignService.section_versions`` shows that it (or, for the player
+    projection, a section it is filtered by) changed, so a snapshot costs as
+    much as the sections edited since the previous one rather than the whole
+    campaign. Replacing ``service.state`` drops every fragment.
+    """
+
+    def __init__(self, service: CampaignService) -> None:
+        self.service = service
+        self.hits = 0
+        self.misses = 0
+        self._state: Optional[CampaignState] = None
+        self._fragments: Dict[Tuple[str, str], Tuple[Tuple[int, ...], bytes]] = {}
+
+    def encode(self, last_seq: int, role: str = HOST_ROLE) -> bytes:
+        """The JSON of ``{"snapshot": ..., "last_seq": last_seq}`` as ``role`` sees it."""
+        state = self.service.state
+        if state is not self._state:
+            self._state = state
+            self._fragments = {}
+        parts = [b'{"snapshot":{"id":', _dumps(state.id)]
+        for section in SECTION_KEYS:
+            parts.append(b",")
+            parts.append(self._fragment(state, role, section))
+        parts.append(b'},"last_seq":%d}' % last_seq)
+        return b"".join(parts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sections": len(self._fragments), "hits": self.hits, "misses": self.misses}
+
+    def _fragment(self, state: CampaignState, role: str, section: str) -> bytes:
+        projected = _PLAYER_SECTIONS.get(section) if role == PLAYER_ROLE else None
+        build, depends_on = projected or (None, ())
+        versions = tuple(
+            self.service.section_versions.get(name, 0) for name in (section, *depends_on)
+        )
+        cached = self._fragments.get((role, section))
+        if cached is not None and cached[0] == versions:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        if build is None:
+            data = serialize_campaign_sections(state, SECTION_KEYS[section])
+        else:
+            data = build(state)
+        # The members of an object without its braces, ready to splice into the body.
+        fragment = _dumps(data)[1:-1]
+        self._fragments[(role, section)] = (versions, fragment)
+        return fragment
+
+
+def _player_character(state: CampaignState) -> Dict[str, Any]:
+    character = serialize_campaign_sections(state, ("character",))["character"]
+    character["abilities"] = _visible(character.get("abilities", {}))
+    return {"character": character}
+
+
+def _player_classes(state: CampaignState) -> Dict[str, Any]:
+    classes = serialize_campaign_sections(state, ("classes",))["classes"]
+    class_id = state.character.class_id
+    return {"classes": {class_id: classes[class_id]} if class_id in classes else {}}
+
+
+def _player_templates(state: CampaignState) -> Dict[str, Any]:
+    # Templates the player has not come across yet stay on the server; the
+    # client asks again when an event names one it does not have.
+    item_ids, quest_ids = player_template_ids(state)
+    data = serialize_campaign_sections(state, ("item_templates", "quest_templates"))
+    return {
+        "item_templates": {
+            tid: tpl for tid, tpl in data["item_templates"].items() if tid in item_ids
+        },
+        "quest_templates": {
+            qid: tpl for qid, tpl in data["quest_templates"].items() if qid in quest_ids
+        },
+        "message_templates": {},
+    }
+
+
+def _player_abilities(state: CampaignState) -> Dict[str, Any]:
+    data = serialize_campaign_sections(state, SECTION_KEYS[SECTION_ABILITIES])
+    return {key: _visible(entries) for key, entries in data.items()}
+
+
+def _player_quests(state: CampaignState) -> Dict[str, Any]:
+    quests = serialize_campaign_sections(state, ("active_quests",))["active_quests"]
+    return {
+        "active_quests": [
+            quest for quest in quests if quest.get("status") != QuestStatus.hidden.value
+        ]
+    }
+
+
+def player_template_ids(state: CampaignState) -> Tuple[Set[str], Set[str]]:
+    """Ids of the item and quest templates the player has come across."""
+    item_ids = {item.template_id for item in state.character.inventory.items.values()}
+    quest_ids = {
+        quest.template_id
+        for quest in state.active_quests
+        if quest.status != QuestStatus.hidden
+    }
+    return item_ids, quest_ids
+
+
+def project_events(
+    events: Iterable[EventLogEntry], role: str, state: CampaignState
+) -> List[Dict[str, Any]]:
+    """``event.to_dict()`` of each event as ``role`` sees it, matching the player snapshot.
+
+    Events about quests and abilities that are hidden now, or were hidden when
+    the event was written, still reach the player so that sequence numbers
+    stay contiguous, but carry only the ids and the hidden marker the client
+    needs to drop the entity. Upserts of message templates, and of item
+    templates the player does not own, arrive with an empty payload.
+    """
+    if role != PLAYER_ROLE:
+        return [event.to_dict() for event in events]
+    item_ids, _ = player_template_ids(state)
+    hidden_quests = {
+        quest.id for quest in state.active_quests if quest.status == QuestStatus.hidden
+    }
+    hidden_abilities = {
+        (scope, ability_id)
+        for scope, abilities in (
+            ("character", state.character.abilities or {}),
+            ("library", state.abilities),
+        )
+        for ability_id, ability in abilities.items()
+        if ability.hidden
+    }
+    projected = []
+    for event in events:
+        data = event.to_dict()
+        payload = event.payload
+        if event.kind in _QUEST_EVENTS:
+            quest_id = payload.get("quest_id")
+            status = (payload.get("quest") or {}).get("status", payload.get("status"))
+            if quest_id in hidden_quests or status == QuestStatus.hidden.value:
+                hidden = QuestStatus.hidden.value
+                data["payload"] = {
+                    "character_id": payload.get("character_id"),
+                    "quest_id": quest_id,
+                    "status": hidden,
+                    "quest": {"id": quest_id, "status": hidden},
+                }
+        elif event.kind in _ABILITY_EVENTS:
+            key = (payload.get("scope"), payload.get("ability_id"))
+            if key in hidden_abilities or (payload.get("ability") or {}).get("hidden"):
+                data["payload"] = {
+                    "character_id": payload.get("character_id"),
+                    "scope": key[0],
+                    "ability_id": key[1],
+                    "hidden": True,
+                }
+        elif event.kind == EventKind.message_template_upserted.value:
+            data["payload"] = {}
+        elif event.kind == EventKind.item_template_upserted.value:
+            if (payload.get("template") or {}).get("id") not in item_ids:
+                data["payload"] = {}
+        projected.append(data)
+    return projected
+
+
+_QUEST_EVENTS = (EventKind.quest_assigned.value, EventKind.quest_status.value)
+_ABILITY_EVENTS = (EventKind.ability_added.value, EventKind.ability_updated.value)
+
+
+def _visible(entries: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {key: entry for key, entry in entries.items() if not entry.get("hidden")}
+
+
+_SectionBuilder = Callable[[CampaignState], Dict[str, Any]]
+
+# How the player's snapshot differs from the host's: the builder of each
+# projected section and the other sections its filtering reads. Sections not
+# listed here are sent to the player unchanged.
+_PLAYER_SECTIONS: Dict[str, Tuple[_SectionBuilder, Tuple[str, ...]]] = {
+    SECTION_CHARACTER: (_player_character, ()),
+    SECTION_CLASSES: (_player_classes, (SECTION_CHARACTER,)),
+    SECTION_TEMPLATES: (_player_templates, (SECTION_CHARACTER, SECTION_QUESTS)),
+    SECTION_ABILITIES: (_player_abilities, ()),
+    SECTION_QUESTS: (_player_quests, ()),
+}
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -2,35 +2,50 @@ from __future__ import annotations
 
 import asyncio
 from dataclasses import dataclass, field
-from typing import Iterable, Set
+from typing import Dict, Iterable, List
 
 from fastapi import WebSocket
 
+from app.permissions import HOST_ROLE
 from domain.events import EventLogEntry
+from domain.models import CampaignState
+
+from .snapshot_cache import project_events
 
 
 @dataclass
 class WebSocketHub:
-    connections: Set[WebSocket] = field(default_factory=set)
+    # Each connection with the role of its token, which picks its event projection.
+    connections: Dict[WebSocket, str] = field(default_factory=dict)
     lock: asyncio.Lock = field(default_factory=asyncio.Lock)
 
-    async def connect(self, websocket: WebSocket) -> None:
+    async def connect(self, websocket: WebSocket, role: str = HOST_ROLE) -> None:
         await websocket.accept()
         async with self.lock:
-            self.connections.add(websocket)
+            self.connections[websocket] = role
 
     async def disconnect(self, websocket: WebSocket) -> None:
         async with self.lock:
-            self.connections.discard(websocket)
-
-    async def broadcast_events(self, events: Iterable[EventLogEntry]) -> None:
-        payloads = [event.to_dict() for event in events]
-        if not payloads:
+            self.connections.pop(websocket, None)
+
+    async def broadcast_events(
+        self, events: Iterable[EventLogEntry], state: CampaignState
+    ) -> None:
+        """Send ``events`` to every connection, projected for its role against ``state``."""
+        events = list(events)
+        if not events:
             return
         async with self.lock:
-            connections = list(self.connections)
+            connections = list(self.connections.items())
+        payloads: Dict[str, List[dict]] = {}
+        for _, role in connections:
+            if role not in payloads:
+                payloads[role] = project_events(events, role, state)
         await asyncio.gather(
-            *[self._safe_send_json(ws, {"type": "events", "items": payloads}) for ws in connections]
+            *[
+                self._safe_send_json(ws, {"type": "events", "items": payloads[role]})
+                for ws, role in connections
+            ]
         )
 
     async def _safe_send_json(self, websocket: WebSocket, payload: dict) -> None:
@@ -29,6 +29,8 @@ const messagesList = document.getElementById("system-messages");
 const messagesCountEl = document.getElementById("messages-count");
 const logList = document.getElementById("event-log");
 const logCountEl = document.getElementById("log-count");
+const logMoreBtn = document.getElementById("log-more");
+const LOG_PAGE_SIZE = 100;
 const rulesBaseXpInput = document.getElementById("rules-base-xp");
 const rulesGrowthRateInput = document.getElementById("rules-growth-rate");
 const rulesBasePerLevelInput = document.getElementById("rules-base-per-level");
@@ -171,6 +173,8 @@ const ICON_PACKS = {
 const state = {
   token: "",
   snapshot: null,
+  snapshotEtag: "",
+  snapshotBody: "",
   settings: null,
   character: null,
   classes: {},
@@ -205,6 +209,7 @@ const state = {
   audioSettings: { ...DEFAULT_AUDIO_SETTINGS },
   iconPack: DEFAULT_ICON_PACK,
   eventLog: [],
+  logCursor: null,
   eventSeqs: new Set(),
   classOptionsKey: "",
   itemTemplateClassOptionsKey: "",
@@ -876,6 +881,9 @@ function renderLog() {
     return;
   }
   logList.innerHTML = "";
+  if (logMoreBtn) {
+    logMoreBtn.hidden = !state.logCursor;
+  }
   const events = [...state.eventLog].sort((a, b) => (b.seq ?? 0) - (a.seq ?? 0));
   if (logCountEl) {
     logCountEl.textContent = `${events.length}`;
@@ -1428,6 +1436,7 @@ function applySnapshot(snapshot) {
   state.selectedChatId = null;
   state.pendingChatLinks = [];
   state.eventLog = [];
+  state.logCursor = null;
   state.eventSeqs = new Set();
   state.classOptionsKey = "";
   state.sheetSectionsKey = "";
@@ -1474,13 +1483,17 @@ function connectEventStream(token, afterSeq = 0) {
   state.socket = socket;
 }
 
-async function fetchEventLog(afterSeq = 0) {
+async function fetchEventLog(cursor = null) {
   const token = getToken();
   if (!token) {
     return;
   }
   try {
-    const response = await fetch(`/api/events?after_seq=${afterSeq}`, {
+    // Newest events first, one page at a time; the cursor continues with older ones.
+    const query = cursor
+      ? `cursor=${encodeURIComponent(cursor)}&limit=${LOG_PAGE_SIZE}`
+      : `order=desc&limit=${LOG_PAGE_SIZE}`;
+    const response = await fetch(`/api/events?${query}`, {
       headers: { Authorization: `Bearer ${token}` },
     });
     if (!response.ok) {
@@ -1488,6 +1501,7 @@ async function fetchEventLog(afterSeq = 0) {
     }
     const payload = await response.json();
     appendLogEvents(payload.events || []);
+    state.logCursor = payload.next_cursor || null;
     renderLog();
   } catch (error) {
     console.error(error);
@@ -1502,23 +1516,36 @@ async function fetchSnapshot() {
   }
   setStatus("Подключение...");
   try {
-    const response = await fetch("/api/snapshot", {
-      headers: { Authorization: `Bearer ${token}` },
-    });
-    if (!response.ok) {
-      throw new Error("Не удалось загрузить snapshot");
-    }
-    const payload = await response.json();
+    const payload = await requestSnapshot(token);
     saveToken(token);
     applySnapshot(payload.snapshot || {});
     await fetchLinkables();
-    await fetchEventLog(0);
+    await fetchEventLog();
     connectEventStream(token, payload.last_seq ?? 0);
   } catch (error) {
     setStatus(error.message, "error");
   }
 }
 
+async function requestSnapshot(token) {
+  const headers = { Authorization: `Bearer ${token}` };
+  if (state.snapshotEtag) {
+    headers["If-None-Match"] = state.snapshotEtag;
+  }
+  const response = await fetch("/api/snapshot", { headers });
+  if (response.status === 304 && state.snapshotBody) {
+    // Nothing changed since the last copy: reuse it instead of downloading it again.
+    return JSON.parse(state.snapshotBody);
+  }
+  if (!response.ok) {
+    throw new Error("Не удалось загрузить snapshot");
+  }
+  const body = await response.text();
+  state.snapshotEtag = response.headers.get("ETag") || "";
+  state.snapshotBody = state.snapshotEtag ? body : "";
+  return JSON.parse(body);
+}
+
 async function fetchLinkables() {
   const token = getToken();
   if (!token) {
@@ -3742,6 +3769,7 @@ const debouncedUpdateMessageTemplateFilters = debounce(updateMessageTemplateFilt
 
 connectBtn.addEventListener("click", fetchSnapshot);
 refreshBtn.addEventListener("click", fetchSnapshot);
+logMoreBtn?.addEventListener("click", () => fetchEventLog(state.logCursor));
 
 xpSubmitBtn.addEventListener("click", () => {
   grantXp(Number(xpInput.value));
@@ -26,6 +26,8 @@ const messagesList = document.getElementById("system-messages");
 const messagesCountEl = document.getElementById("messages-count");
 const logList = document.getElementById("event-log");
 const logCountEl = document.getElementById("log-count");
+const logMoreBtn = document.getElementById("log-more");
+const LOG_PAGE_SIZE = 100;
 const questSearchInput = document.getElementById("quest-search");
 const chatSummaryEl = document.getElementById("chat-summary");
 const chatThreadsList = document.getElementById("chat-threads-list");
@@ -103,6 +105,9 @@ const state = {
   friendRequests: {},
   token: "",
   snapshot: null,
+  snapshotEtag: "",
+  snapshotBody: "",
+  templateRefresh: null,
   settings: null,
   character: null,
   classes: {},
@@ -122,6 +127,7 @@ const state = {
   audioSettings: { ...DEFAULT_AUDIO_SETTINGS },
   iconPack: DEFAULT_ICON_PACK,
   eventLog: [],
+  logCursor: null,
   eventSeqs: new Set(),
   sheetSectionsKey: "",
   sheetSectionNodes: {},
@@ -526,6 +532,9 @@ function renderLog() {
     return;
   }
   logList.innerHTML = "";
+  if (logMoreBtn) {
+    logMoreBtn.hidden = !state.logCursor;
+  }
   const events = [...state.eventLog].sort((a, b) => (b.seq ?? 0) - (a.seq ?? 0));
   if (logCountEl) {
     logCountEl.textContent = `${events.length}`;
@@ -694,6 +703,11 @@ function upsertQuest(quest) {
   if (!quest) {
     return;
   }
+  if (quest.status === "hidden") {
+    // The server leaves hidden quests out of the player snapshot; keep it that way.
+    state.activeQuests = state.activeQuests.filter((item) => item.id !== quest.id);
+    return;
+  }
   const existing = state.activeQuests.find((item) => item.id === quest.id);
   if (existing) {
     Object.assign(existing, quest);
@@ -768,7 +782,15 @@ function applyAbilityAdded(payload) {
     return;
   }
   if (payload.ability) {
-    target[payload.ability.id] = payload.ability;
+    if (payload.ability.hidden) {
+      delete target[payload.ability.id];
+    } else {
+      target[payload.ability.id] = payload.ability;
+    }
+    return;
+  }
+  if (payload.ability_id && payload.hidden) {
+    delete target[payload.ability_id];
     return;
   }
   if (payload.ability_id) {
@@ -1060,6 +1082,44 @@ function applyEvents(events) {
   appendLogEvents(events);
   events.forEach(applyEvent);
   render();
+  refreshMissingTemplates(events);
+}
+
+function refreshMissingTemplates(events) {
+  // The snapshot only carries templates of what the player already has, so a
+  // newly granted item or quest, or a quest the host unhides, may name one we
+  // have not received yet.
+  const missing = events.some(
+    (event) =>
+      (event.kind === "inventory.added" && !state.templates?.[event.payload?.template_id]) ||
+      (isVisibleQuestEvent(event) && !state.questTemplates?.[questTemplateId(event.payload)]),
+  );
+  const token = getToken();
+  if (!missing || !token || state.templateRefresh) {
+    return;
+  }
+  state.templateRefresh = requestSnapshot(token)
+    .then((payload) => {
+      Object.assign(state.templates, payload.snapshot?.item_templates || {});
+      Object.assign(state.questTemplates, payload.snapshot?.quest_templates || {});
+      render();
+    })
+    .catch((error) => console.error(error))
+    .finally(() => {
+      state.templateRefresh = null;
+    });
+}
+
+function isVisibleQuestEvent(event) {
+  if (event.kind !== "quest.assigned" && event.kind !== "quest.status") {
+    return false;
+  }
+  const status = event.payload?.quest?.status || event.payload?.status;
+  return status !== "hidden" && Boolean(questTemplateId(event.payload));
+}
+
+function questTemplateId(payload) {
+  return payload?.template_id || payload?.quest?.template_id;
 }
 
 function applySnapshot(snapshot) {
@@ -1080,6 +1140,7 @@ function applySnapshot(snapshot) {
   state.selectedChatId = null;
   state.pendingChatLinks = [];
   state.eventLog = [];
+  state.logCursor = null;
   state.eventSeqs = new Set();
   state.sheetSectionsKey = "";
   state.sheetSectionNodes = {};
@@ -1124,13 +1185,17 @@ function connectEventStream(token, afterSeq = 0) {
   state.socket = socket;
 }
 
-async function fetchEventLog(afterSeq = 0) {
+async function fetchEventLog(cursor = null) {
   const token = getToken();
   if (!token) {
     return;
   }
   try {
-    const response = await fetch(`/api/events?after_seq=${afterSeq}`, {
+    // Newest events first, one page at a time; the cursor continues with older ones.
+    const query = cursor
+      ? `cursor=${encodeURIComponent(cursor)}&limit=${LOG_PAGE_SIZE}`
+      : `order=desc&limit=${LOG_PAGE_SIZE}`;
+    const response = await fetch(`/api/events?${query}`, {
       headers: { Authorization: `Bearer ${token}` },
     });
     if (!response.ok) {
@@ -1138,6 +1203,7 @@ async function fetchEventLog(afterSeq = 0) {
     }
     const payload = await response.json();
     appendLogEvents(payload.events || []);
+    state.logCursor = payload.next_cursor || null;
     renderLog();
   } catch (error) {
     console.error(error);
@@ -1152,25 +1218,36 @@ async function fetchSnapshot() {
   }
   setStatus("Подключение…");
   try {
-    const response = await fetch("/api/snapshot", {
-      headers: {
-        Authorization: `Bearer ${token}`,
-      },
-    });
-    if (!response.ok) {
-      throw new Error("Не удалось загрузить snapshot");
-    }
-    const payload = await response.json();
+    const payload = await requestSnapshot(token);
     applySnapshot(payload.snapshot || {});
     saveToken(token);
     await fetchLinkables();
-    await fetchEventLog(0);
+    await fetchEventLog();
     connectEventStream(token, payload.last_seq ?? 0);
   } catch (error) {
     setStatus(error.message, "error");
   }
 }
 
+async function requestSnapshot(token) {
+  const headers = { Authorization: `Bearer ${token}` };
+  if (state.snapshotEtag) {
+    headers["If-None-Match"] = state.snapshotEtag;
+  }
+  const response = await fetch("/api/snapshot", { headers });
+  if (response.status === 304 && state.snapshotBody) {
+    // Nothing changed since the last copy: reuse it instead of downloading it again.
+    return JSON.parse(state.snapshotBody);
+  }
+  if (!response.ok) {
+    throw new Error("Не удалось загрузить snapshot");
+  }
+  const body = await response.text();
+  state.snapshotEtag = response.headers.get("ETag") || "";
+  state.snapshotBody = state.snapshotEtag ? body : "";
+  return JSON.parse(body);
+}
+
 async function fetchLinkables() {
   const token = getToken();
   if (!token) {
@@ -1577,7 +1654,6 @@ function getQuestStatusLabel(status) {
     active: "Активные",
     completed: "Завершённые",
     failed: "Проваленные",
-    hidden: "Скрытые",
   };
   return labels[status] || status;
 }
@@ -1633,7 +1709,7 @@ function renderQuestGroups() {
     acc[status].push(quest);
     return acc;
   }, {});
-  const statuses = ["active", "completed", "failed", "hidden"];
+  const statuses = ["active", "completed", "failed"];
   statuses.forEach((status) => {
     const group = document.createElement("div");
     group.className = "quest-group";
@@ -2463,6 +2539,7 @@ async function allocateStatPoints(statId, amount) {
 
 connectBtn.addEventListener("click", fetchSnapshot);
 refreshBtn.addEventListener("click", fetchSnapshot);
+logMoreBtn?.addEventListener("click", () => fetchEventLog(state.logCursor));
 
 if (chatLinkTypeSelect) {
   chatLinkTypeSelect.addEventListener("change", renderChatLinkables);
@@ -1,6 +1,16 @@
 """Persistence layer."""
 
+from .async_repo import ThreadedCampaignRepository
 from .json_repo import JsonCampaignRepository
-from .repo import CampaignRepository
+from .jsonl_repo import JsonlCampaignRepository
+from .repo import AsyncCampaignRepository, CampaignRepository
+from .sqlite_repo import SqliteCampaignRepository
 
-__all__ = ["JsonCampaignRepository", "CampaignRepository"]
+__all__ = [
+    "AsyncCampaignRepository",
+    "JsonCampaignRepository",
+    "JsonlCampaignRepository",
+    "CampaignRepository",
+    "SqliteCampaignRepository",
+    "ThreadedCampaignRepository",
+]
@@ -0,0 +1,29 @@
+"""Storage maintenance for the campaign store configured by the AETHER_* variables.
+
+Run it while the server is stopped; during a session use ``POST /api/host/storage/compact``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+
+from .factory import repository_from_env
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m storage", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact = commands.add_parser(
+        "compact", help="merge small segments, rebuild indexes, drop superseded checkpoints"
+    )
+    compact.add_argument("path", nargs="?", help="campaign store (default: AETHER_CAMPAIGN_PATH)")
+    args = parser.parse_args()
+
+    repo = repository_from_env(args.path)
+    report = repo.start_compaction().run()
+    print(json.dumps(report.to_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
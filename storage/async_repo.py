@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from domain.events import EventLogEntry
+from domain.models import CampaignState
+
+from .event_query import EventQuery
+from .repo import CampaignRepository
+
+DEFAULT_READ_THREADS = 4
+DEFAULT_READ_BATCH = 500
+
+
+class ThreadedCampaignRepository:
+    """``AsyncCampaignRepository`` over a blocking repository.
+
+    Every read runs on a pool of ``max_workers`` threads. Event history is
+    pulled ``batch_size`` events per pool task, so a long scan gives the
+    thread back between batches instead of holding it until the end and
+    other readers keep getting turns.
+    """
+
+    def __init__(
+        self,
+        repo: CampaignRepository,
+        max_workers: int = DEFAULT_READ_THREADS,
+        batch_size: int = DEFAULT_READ_BATCH,
+    ) -> None:
+        self.repo = repo
+        self.batch_size = max(1, int(batch_size))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, int(max_workers)), thread_name_prefix="aether-read"
+        )
+
+    async def load(self) -> CampaignState:
+        return await self._run(self.repo.load)
+
+    async def state_at(self, seq: int) -> CampaignState:
+        return await self._run(self.repo.state_at, seq)
+
+    async def get_last_seq(self) -> int:
+        return await self._run(self.repo.get_last_seq)
+
+    async def get_storage_stats(self) -> Dict[str, Any]:
+        return await self._run(self.repo.get_storage_stats)
+
+    async def export_snapshot(self) -> Dict[str, Any]:
+        return await self._run(self.repo.export_snapshot)
+
+    async def export_templates(self) -> Dict[str, Any]:
+        return await self._run(self.repo.export_templates)
+
+    async def export_chats(self) -> Dict[str, Any]:
+        return await self._run(self.repo.export_chats)
+
+    async def list_events(
+        self, after_seq: int = 0, limit: Optional[int] = None
+    ) -> List[EventLogEntry]:
+        events: List[EventLogEntry] = []
+        async for batch in self.iter_event_batches(after_seq, limit):
+            events.extend(batch)
+        return events
+
+    async def query_events(self, query: EventQuery, limit: int) -> List[EventLogEntry]:
+        return await self._run(self.repo.query_events, query, limit)
+
+    async def entity_events(self, entity_type: str, entity_id: str) -> List[EventLogEntry]:
+        return await self._run(self.repo.entity_events, entity_type, entity_id)
+
+    async def iter_events(
+        self, after_seq: int = 0, limit: Optional[int] = None
+    ) -> AsyncIterator[EventLogEntry]:
+        async for batch in self.iter_event_batches(after_seq, limit):
+            for event in batch:
+                yield event
+
+    async def iter_event_batches(
+        self,
+        after_seq: int = 0,
+        limit: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> AsyncIterator[List[EventLogEntry]]:
+        """Stream ``seq > after_seq`` in lists of at most ``batch_size`` events."""
+        size = max(1, int(batch_size or self.batch_size))
+        events: Iterator[EventLogEntry] = await self._run(self.repo.iter_events, after_seq, limit)
+        try:
+            while True:
+                batch = await self._run(_take, events, size)
+                if not batch:
+                    return
+                yield batch
+        finally:
+            close = getattr(events, "close", None)
+            if close is not None:
+                # Closes the segment file of an abandoned jsonl scan.
+                await self._run(close)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+
+def read_threads_from_env() -> int:
+    return int(os.getenv("AETHER_READ_THREADS", str(DEFAULT_READ_THREADS)))
+
+
+def _take(events: Iterator[EventLogEntry], size: int) -> List[EventLogEntry]:
+    return list(islice(events, size))
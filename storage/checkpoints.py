@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import os
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from domain.helpers import utcnow
+
+from .codecs import CodecError, JsonCodec, decode_any
+from .durability import Durability
+
+CHECKPOINT_PREFIX = "checkpoint-"
+CHECKPOINT_SUFFIX = ".json"
+DEFAULT_CHECKPOINT_EVERY = 1000
+DEFAULT_KEEP_CHECKPOINTS = 3
+
+
+@dataclass
+class Checkpoint:
+    seq: int
+    created_at: datetime
+    snapshot: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "created_at": self.created_at.isoformat(),
+            "snapshot": self.snapshot,
+        }
+
+
+@dataclass
+class RetentionPolicy:
+    """How much of the event log stays hot and how often state is checkpointed.
+
+    An event stays hot while it is among the last ``keep_events`` events or
+    younger than ``keep_days``; with neither set nothing is archived. Events
+    newer than the latest checkpoint are always kept hot.
+    ``archive_compression`` (``zlib`` or ``lzma``) compresses archived
+    segments; ``None`` keeps them as plain JSON Lines.
+    """
+
+    keep_events: Optional[int] = None
+    keep_days: Optional[float] = None
+    checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY
+    keep_checkpoints: int = DEFAULT_KEEP_CHECKPOINTS
+    archive_compression: Optional[str] = None
+
+    @property
+    def archives(self) -> bool:
+        return self.keep_events is not None or self.keep_days is not None
+
+    def hot_after_seq(self, last_seq: int) -> Optional[int]:
+        if self.keep_events is None:
+            return None
+        return last_seq - max(0, self.keep_events)
+
+    def hot_since(self) -> Optional[datetime]:
+        if self.keep_days is None:
+            return None
+        return utcnow() - timedelta(days=self.keep_days)
+
+
+def retention_from_env() -> RetentionPolicy:
+    keep_events = os.getenv("AETHER_RETENTION_EVENTS")
+    keep_days = os.getenv("AETHER_RETENTION_DAYS")
+    compression = os.getenv("AETHER_ARCHIVE_COMPRESSION", "").strip().lower()
+    return RetentionPolicy(
+        keep_events=int(keep_events) if keep_events else None,
+        keep_days=float(keep_days) if keep_days else None,
+        checkpoint_every=int(os.getenv("AETHER_CHECKPOINT_EVERY", str(DEFAULT_CHECKPOINT_EVERY))),
+        keep_checkpoints=int(
+            os.getenv("AETHER_KEEP_CHECKPOINTS", str(DEFAULT_KEEP_CHECKPOINTS))
+        ),
+        archive_compression=None if compression in ("", "none") else compression,
+    )
+
+
+class CheckpointStore:
+    """Snapshot copies named after the last ``seq`` they include."""
+
+    def __init__(
+        self,
+        directory: str | Path,
+        keep: int = DEFAULT_KEEP_CHECKPOINTS,
+        durability: Optional[Durability] = None,
+        codec: Optional[Any] = None,
+    ) -> None:
+        self.directory = Path(directory)
+        self.keep = max(1, int(keep))
+        self.durability = durability or Durability()
+        self.codec = codec or JsonCodec()
+        self._latest_seq: Optional[int] = None
+
+    def seqs(self) -> List[int]:
+        if not self.directory.exists():
+            return []
+        seqs: List[int] = []
+        for path in self.directory.glob(f"{CHECKPOINT_PREFIX}*{CHECKPOINT_SUFFIX}"):
+            try:
+                seqs.append(int(path.name[len(CHECKPOINT_PREFIX):-len(CHECKPOINT_SUFFIX)]))
+            except ValueError:
+                continue
+        return sorted(seqs)
+
+    def latest_seq(self) -> int:
+        if self._latest_seq is None:
+            seqs = self.seqs()
+            self._latest_seq = seqs[-1] if seqs else 0
+        return self._latest_seq
+
+    def write(self, seq: int, snapshot: Dict[str, Any]) -> Checkpoint:
+        checkpoint = Checkpoint(seq=int(seq), created_at=utcnow(), snapshot=snapshot)
+        self.durability.write_atomic(
+            self._path(checkpoint.seq), self.codec.encode(checkpoint.to_dict())
+        )
+        self._latest_seq = max(self.latest_seq(), checkpoint.seq)
+        self.prune()
+        return checkpoint
+
+    def nearest(self, seq: int) -> Optional[Checkpoint]:
+        """Load the newest checkpoint that covers no event after ``seq``."""
+        seqs = self.seqs()
+        for candidate in reversed(seqs[:bisect_right(seqs, seq)]):
+            checkpoint = self.read(candidate)
+            if checkpoint is not None:
+                return checkpoint
+        return None
+
+    def latest(self) -> Optional[Checkpoint]:
+        """Load the newest checkpoint that is still readable."""
+        seqs = self.seqs()
+        return self.nearest(seqs[-1]) if seqs else None
+
+    def read(self, seq: int) -> Optional[Checkpoint]:
+        try:
+            raw = decode_any(self._path(seq).read_bytes())
+        except (FileNotFoundError, CodecError):
+            return None
+        if not isinstance(raw, dict) or not isinstance(raw.get("snapshot"), dict):
+            return None
+        try:
+            created_at = datetime.fromisoformat(raw["created_at"])
+        except (KeyError, TypeError, ValueError):
+            created_at = utcnow()
+        return Checkpoint(seq=int(seq), created_at=created_at, snapshot=raw["snapshot"])
+
+    def clear(self) -> None:
+        """Drop every checkpoint, e.g. after the log they describe was replaced."""
+        for seq in self.seqs():
+            self._path(seq).unlink(missing_ok=True)
+        self._latest_seq = 0
+
+    def discard_after(self, seq: int) -> None:
+        """Drop checkpoints newer than ``seq``, e.g. unreadable ones skipped by recovery."""
+        for candidate in self.seqs():
+            if candidate > seq:
+                self._path(candidate).unlink(missing_ok=True)
+        self._latest_seq = None
+
+    def prune(self) -> List[int]:
+        """Drop all but the ``keep`` newest checkpoints; returns the dropped seqs."""
+        dropped = self.seqs()[:-self.keep]
+        for seq in dropped:
+            self._path(seq).unlink(missing_ok=True)
+        return dropped
+
+    def _path(self, seq: int) -> Path:
+        return self.directory / f"{CHECKPOINT_PREFIX}{int(seq):012d}{CHECKPOINT_SUFFIX}"
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import json
+import marshal
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Binary codecs prefix their output with MAGIC + a one-byte codec id so a store
+# stays readable after AETHER_STORAGE_CODEC changes; JSON is stored bare.
+MAGIC = b"AEJ\x01"
+DEFAULT_CODEC = "json"
+
+
+class CodecError(ValueError):
+    """Raised when stored bytes cannot be decoded."""
+
+
+class JsonCodec:
+    name = "json"
+
+    def __init__(self, indent: Optional[int] = None) -> None:
+        self.indent = indent
+
+    def encode(self, data: Any) -> bytes:
+        if self.indent is None:
+            text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        else:
+            text = json.dumps(data, ensure_ascii=False, indent=self.indent)
+        return text.encode("utf-8")
+
+    def decode(self, raw: bytes) -> Any:
+        try:
+            return json.loads(raw)
+        except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+            raise CodecError(str(exc)) from exc
+
+
+class PrettyJsonCodec(JsonCodec):
+    """The historical ``indent=2`` layout, meant for human-readable exports."""
+
+    name = "json-pretty"
+
+    def __init__(self) -> None:
+        super().__init__(indent=2)
+
+
+class MarshalCodec:
+    """CPython ``marshal``; fastest to load, but tied to the interpreter version."""
+
+    name = "marshal"
+    codec_id = b"m"
+
+    def encode(self, data: Any) -> bytes:
+        return MAGIC + self.codec_id + marshal.dumps(data)
+
+    def decode(self, raw: bytes) -> Any:
+        try:
+            return marshal.loads(raw[len(MAGIC) + 1:])
+        except (EOFError, ValueError, TypeError) as exc:
+            raise CodecError(str(exc)) from exc
+
+
+class MsgpackCodec:
+    """MessagePack via the optional ``msgpack`` package."""
+
+    name = "msgpack"
+    codec_id = b"p"
+
+    def __init__(self) -> None:
+        try:
+            import msgpack
+        except ImportError as exc:
+            raise ValueError("msgpack codec requires the 'msgpack' package") from exc
+        self._msgpack = msgpack
+
+    def encode(self, data: Any) -> bytes:
+        return MAGIC + self.codec_id + self._msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, raw: bytes) -> Any:
+        try:
+            return self._msgpack.unpackb(raw[len(MAGIC) + 1:], raw=False, strict_map_key=False)
+        except Exception as exc:
+            raise CodecError(str(exc)) from exc
+
+
+class ContainerCodec:
+    """A store split into sections behind an offset table.
+
+    Layout: ``MAGIC`` + ``b"c"``, a 4-byte big-endian header length, a JSON
+    header and the section bodies. The header holds the scalar top-level
+    keys under ``meta``, the snapshot's key order under ``snapshot`` and
+    ``[offset, length]`` per section (relative to the end of the header).
+    Each snapshot key and every other top-level list or dict is its own
+    section, encoded with ``inner``, so ``SnapshotContainer`` decodes one
+    section without touching the rest.
+    """
+
+    name = "container"
+    codec_id = b"c"
+
+    def __init__(self, inner: Optional[Any] = None) -> None:
+        self.inner = inner or JsonCodec()
+
+    def encode(self, data: Any) -> bytes:
+        if not isinstance(data, dict):
+            # Nothing to split; ``decode_any`` reads the bare inner encoding.
+            return self.inner.encode(data)
+        meta: Dict[str, Any] = {}
+        snapshot = data.get("snapshot") if isinstance(data.get("snapshot"), dict) else None
+        bodies: List[Tuple[str, bytes]] = []
+        for key, value in data.items():
+            if key == "snapshot" and snapshot is not None:
+                bodies.extend(
+                    (SNAPSHOT_SECTION_PREFIX + name, self.inner.encode(section))
+                    for name, section in snapshot.items()
+                )
+            elif isinstance(value, (dict, list)):
+                bodies.append((key, self.inner.encode(value)))
+            else:
+                meta[key] = value
+        sections: Dict[str, List[int]] = {}
+        offset = 0
+        for name, body in bodies:
+            sections[name] = [offset, len(body)]
+            offset += len(body)
+        header = {
+            "meta": meta,
+            "snapshot": None if snapshot is None else list(snapshot),
+            "sections": sections,
+        }
+        encoded = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return b"".join(
+            [MAGIC, self.codec_id, _CONTAINER_HEADER.pack(len(encoded)), encoded]
+            + [body for _, body in bodies]
+        )
+
+    def decode(self, raw: bytes) -> Any:
+        return SnapshotContainer(raw).decode()
+
+
+SNAPSHOT_SECTION_PREFIX = "snapshot/"
+_CONTAINER_HEADER = struct.Struct(">I")
+
+
+class SnapshotContainer:
+    """Random access to the sections of a ``ContainerCodec`` store.
+
+    Only the header is parsed up front; ``snapshot_sections`` and
+    ``section`` decode just the bodies asked for. ``open`` maps the file, so
+    the reader keeps seeing the version it opened even after the store is
+    replaced, and slices of the map are safe to take from several threads.
+    """
+
+    def __init__(self, buffer: Any) -> None:
+        self._buffer = buffer
+        prefix = len(MAGIC) + len(ContainerCodec.codec_id)
+        if bytes(buffer[:prefix]) != MAGIC + ContainerCodec.codec_id:
+            raise CodecError("Not a snapshot container")
+        try:
+            (length,) = _CONTAINER_HEADER.unpack(
+                bytes(buffer[prefix:prefix + _CONTAINER_HEADER.size])
+            )
+            start = prefix + _CONTAINER_HEADER.size
+            header = json.loads(bytes(buffer[start:start + length]))
+            self.meta: Dict[str, Any] = dict(header["meta"])
+            self.snapshot_keys: Optional[List[str]] = header["snapshot"]
+            self._sections: Dict[str, List[int]] = dict(header["sections"])
+        except (struct.error, ValueError, KeyError, TypeError) as exc:
+            raise CodecError(f"Invalid snapshot container header: {exc}") from exc
+        self._base = start + length
+
+    @classmethod
+    def open(cls, path: Path) -> Optional["SnapshotContainer"]:
+        """Map ``path``; ``None`` when it holds some other format."""
+        with path.open("rb") as handle:
+            if handle.read(len(MAGIC) + 1) != MAGIC + ContainerCodec.codec_id:
+                return None
+            return cls(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def section(self, name: str) -> Any:
+        try:
+            offset, length = self._sections[name]
+        except KeyError:
+            raise KeyError(name) from None
+        start = self._base + offset
+        if start + length > len(self._buffer):
+            raise CodecError(f"Truncated container section: {name}")
+        return decode_any(bytes(self._buffer[start:start + length]))
+
+    def snapshot_sections(self, names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        if self.snapshot_keys is None:
+            raise CodecError("Container holds no snapshot")
+        wanted = self.snapshot_keys if names is None else [
+            name for name in names if name in self.snapshot_keys
+        ]
+        return {name: self.section(SNAPSHOT_SECTION_PREFIX + name) for name in wanted}
+
+    def decode(self) -> Dict[str, Any]:
+        data = dict(self.meta)
+        for name in self._sections:
+            if not name.startswith(SNAPSHOT_SECTION_PREFIX):
+                data[name] = self.section(name)
+        if self.snapshot_keys is not None:
+            data["snapshot"] = self.snapshot_sections()
+        return data
+
+
+CODECS: Dict[str, Any] = {
+    JsonCodec.name: JsonCodec,
+    PrettyJsonCodec.name: PrettyJsonCodec,
+    MarshalCodec.name: MarshalCodec,
+    MsgpackCodec.name: MsgpackCodec,
+    ContainerCodec.name: ContainerCodec,
+}
+_BINARY_CODECS = {
+    MarshalCodec.codec_id: MarshalCodec,
+    MsgpackCodec.codec_id: MsgpackCodec,
+    ContainerCodec.codec_id: ContainerCodec,
+}
+
+
+def get_codec(name: str = DEFAULT_CODEC) -> Any:
+    codec_cls = CODECS.get(str(name).strip().lower())
+    if codec_cls is None:
+        raise ValueError(f"Unknown storage codec: {name}")
+    return codec_cls()
+
+
+def codec_from_env() -> Any:
+    return get_codec(os.getenv("AETHER_STORAGE_CODEC", DEFAULT_CODEC))
+
+
+def decode_any(raw: bytes) -> Any:
+    """Decode bytes written by any codec, whichever one is configured now."""
+    if raw.startswith(MAGIC):
+        codec_cls = _BINARY_CODECS.get(raw[len(MAGIC):len(MAGIC) + 1])
+        if codec_cls is None:
+            raise CodecError("Unknown codec id")
+        try:
+            codec = codec_cls()
+        except ValueError as exc:
+            raise CodecError(str(exc)) from exc
+        return codec.decode(raw)
+    return JsonCodec().decode(raw)
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Protocol
+
+from domain.helpers import utcnow
+
+
+@dataclass
+class CompactionReport:
+    """What a compaction did; ``segments_skipped`` and ``superseded`` count work
+    dropped because a commit changed its input while it was being rewritten."""
+
+    backend: str
+    started_at: datetime = field(default_factory=utcnow)
+    finished_at: Optional[datetime] = None
+    bytes_before: int = 0
+    bytes_after: int = 0
+    checkpoints_dropped: List[int] = field(default_factory=list)
+    segments_merged: int = 0
+    segments_skipped: int = 0
+    indexes_rebuilt: int = 0
+    files_removed: List[str] = field(default_factory=list)
+    superseded: bool = False
+    done: bool = False
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["started_at"] = self.started_at.isoformat()
+        data["finished_at"] = self.finished_at.isoformat() if self.finished_at else None
+        return data
+
+
+class CompactableStore(Protocol):
+    """What ``StoreCompaction`` needs from a repository.
+
+    ``build_compaction`` stages the rewrite and returns a plan for
+    ``switch_compaction`` to install; a store with nothing to stage returns
+    ``None`` and does all its work in the switch.
+    """
+
+    def storage_bytes(self) -> int:
+        ...
+
+    def build_compaction(self, report: CompactionReport) -> Any:
+        ...
+
+    def switch_compaction(self, plan: Any, report: CompactionReport) -> None:
+        ...
+
+
+class StoreCompaction:
+    """A store rewrite split in two so that commits keep flowing while it runs.
+
+    ``build`` does the heavy work into staging files next to the store and may
+    run on any thread alongside commits. ``switch`` swaps the staged files in
+    and must run wherever commits run (the write-behind thread in the server);
+    it only renames files and catches up with what was committed since
+    ``build`` started, so commits wait for it about as long as for one write.
+    """
+
+    def __init__(self, repo: CompactableStore, backend: str) -> None:
+        self.repo = repo
+        self.report = CompactionReport(backend=backend, bytes_before=repo.storage_bytes())
+        self._plan: Any = None
+        self._built = False
+
+    def build(self) -> None:
+        self._plan = self.repo.build_compaction(self.report)
+        self._built = True
+
+    def switch(self) -> CompactionReport:
+        if not self._built:
+            raise RuntimeError("Compaction switched before it was built")
+        self.repo.switch_compaction(self._plan, self.report)
+        self.report.bytes_after = self.repo.storage_bytes()
+        self.report.finished_at = utcnow()
+        self.report.done = True
+        return self.report
+
+    def run(self) -> CompactionReport:
+        """Build and switch in one go, for a store nothing else is writing to."""
+        self.build()
+        return self.switch()
+
+
+def stale_temp_files(directory: Path, prefixes: Iterable[str] = ("",)) -> List[Path]:
+    """Temp files ``Durability.write_atomic`` left behind in ``directory`` when a write died."""
+    if not directory.is_dir():
+        return []
+    return sorted(
+        path
+        for prefix in prefixes
+        for path in directory.glob(f".{prefix}*.tmp")
+        if path.is_file()
+    )
+
+
+def files_bytes(paths: Iterable[Path]) -> int:
+    """Total size of ``paths``, descending into directories."""
+    total = 0
+    for path in paths:
+        for child in path.rglob("*") if path.is_dir() else [path]:
+            try:
+                if child.is_file():
+                    total += child.stat().st_size
+            except FileNotFoundError:
+                continue  # Replaced by a commit while being counted.
+    return total
+
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import IO, Any, Deque, Dict, Iterator, Optional, Set
+
+DURABILITY_ALWAYS = "always"
+DURABILITY_BATCH = "batch"
+DURABILITY_NONE = "none"
+DURABILITY_MODES = (DURABILITY_ALWAYS, DURABILITY_BATCH, DURABILITY_NONE)
+DEFAULT_BATCH_WINDOW_MS = 50
+COMMIT_HISTORY_SIZE = 100
+
+
+@dataclass
+class CommitStats:
+    durability: str
+    fsync_ms: float = 0.0
+    fsync_calls: int = 0
+    bytes_written: int = 0
+    deferred: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class Durability:
+    """How hard writes are pushed to stable storage.
+
+    ``always`` fsyncs the data and its directory before a commit returns.
+    ``batch`` fsyncs a replacement file before renaming it into place, but
+    leaves the directory, and the files appended to, to one group fsync
+    per ``window_ms``, so at most one window of commits is exposed to a
+    power loss. ``none`` leaves flushing to the OS.
+    Every mode replaces files through a temp file and ``os.replace``, so a
+    crash of the process never leaves a truncated store behind; with
+    ``always`` and ``batch`` neither does a power loss.
+    Commit stats are kept per thread: only writes made on the thread that
+    opened ``commit`` are counted in it.
+    """
+
+    def __init__(self, mode: str = DURABILITY_ALWAYS, window_ms: int = DEFAULT_BATCH_WINDOW_MS) -> None:
+        mode = str(mode).strip().lower()
+        if mode not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {mode}")
+        self.mode = mode
+        self.window_s = max(0, int(window_ms)) / 1000
+        self.last_commit: Optional[CommitStats] = None
+        self.history: Deque[CommitStats] = deque(maxlen=COMMIT_HISTORY_SIZE)
+        self.last_group_fsync_ms = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending: Set[Path] = set()
+        self._pending_directories: Set[Path] = set()
+        self._timer: Optional[threading.Timer] = None
+
+    @contextmanager
+    def commit(self) -> Iterator[CommitStats]:
+        stats = CommitStats(durability=self.mode, deferred=self.mode == DURABILITY_BATCH)
+        self._local.current = stats
+        try:
+            yield stats
+        finally:
+            self._local.current = None
+            with self._lock:
+                self.last_commit = stats
+                self.history.append(stats)
+
+    def write_atomic(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+                handle.flush()
+                if self.mode != DURABILITY_NONE:
+                    # The rename may reach the disk before the data does.
+                    self._timed_fsync(handle.fileno())
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+        self._record_bytes(len(data))
+        self._after_write(path, synced=True)
+
+    def sync_handle(self, handle: IO[Any], path: Path, written: int = 0) -> None:
+        """Apply the durability mode to data just appended through ``handle``."""
+        handle.flush()
+        self._record_bytes(written)
+        if self.mode == DURABILITY_ALWAYS:
+            self._timed_fsync(handle.fileno())
+        self._after_write(path)
+
+    def flush(self) -> None:
+        """Fsync everything a ``batch`` window is still holding."""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            directories, self._pending_directories = self._pending_directories, set()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending and not directories:
+            return
+        started = time.perf_counter()
+        for directory in directories | {path.parent for path in pending}:
+            _fsync_directory(directory)
+        for path in pending:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self.last_group_fsync_ms = (time.perf_counter() - started) * 1000
+
+    def record_fsync(self, elapsed_ms: float) -> None:
+        current = getattr(self._local, "current", None)
+        if current is not None:
+            current.fsync_ms += elapsed_ms
+            current.fsync_calls += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            fsync_times = [stats.fsync_ms for stats in self.history]
+            last_commit = self.last_commit
+        return {
+            "durability": self.mode,
+            "batch_window_ms": int(self.window_s * 1000),
+            "last_commit": last_commit.to_dict() if last_commit else None,
+            "commits_sampled": len(fsync_times),
+            "fsync_ms_avg": sum(fsync_times) / len(fsync_times) if fsync_times else 0.0,
+            "fsync_ms_max": max(fsync_times, default=0.0),
+            "last_group_fsync_ms": self.last_group_fsync_ms,
+        }
+
+    def _after_write(self, path: Path, synced: bool = False) -> None:
+        """``synced``: the data of ``path`` is on disk already, only its directory entry is not."""
+        if self.mode == DURABILITY_ALWAYS:
+            started = time.perf_counter()
+            _fsync_directory(path.parent)
+            self.record_fsync((time.perf_counter() - started) * 1000)
+        elif self.mode == DURABILITY_BATCH:
+            with self._lock:
+                if synced:
+                    self._pending_directories.add(path.parent)
+                else:
+                    self._pending.add(path)
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window_s, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def _timed_fsync(self, fd: int) -> None:
+        started = time.perf_counter()
+        os.fsync(fd)
+        self.record_fsync((time.perf_counter() - started) * 1000)
+
+    def _record_bytes(self, written: int) -> None:
+        current = getattr(self._local, "current", None)
+        if current is not None:
+            current.bytes_written += written
+
+
+def durability_from_env() -> Durability:
+    return Durability(
+        mode=os.getenv("AETHER_DURABILITY", DURABILITY_ALWAYS),
+        window_ms=int(os.getenv("AETHER_DURABILITY_WINDOW_MS", str(DEFAULT_BATCH_WINDOW_MS))),
+    )
+
+
+def _fsync_directory(directory: Path) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
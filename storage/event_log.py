@@ -0,0 +1,1120 @@
+from __future__ import annotations
+
+import json
+import lzma
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from domain.events import EventLogEntry
+
+from .durability import Durability
+from .event_query import EntityIndex, EventLabelIndex, EventQuery
+from .json_repo import _safe_event_from_dict
+
+SEGMENT_SUFFIX = ".jsonl"
+DEFAULT_SEGMENT_EVENTS = 5000
+ARCHIVE_DIRNAME = "archive"
+COMPACTION_SUFFIX = ".compact"
+_COMPACTION_MARKER = "switch.json"
+DEFAULT_ARCHIVE_BLOCK_BYTES = 64 * 1024
+# Compressed archive segments: ``<first seq>.jsonl.<suffix>`` holding the
+# compressed blocks, a JSON footer indexing them, the footer length and magic.
+ARCHIVE_COMPRESSION_SUFFIXES = {"zlib": ".z", "lzma": ".xz"}
+_ARCHIVE_MAGIC = b"AEZ1"
+_ARCHIVE_TRAILER = struct.Struct(">Q4s")
+_COMPRESSORS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+_LEADING_SEQ = re.compile(rb'^\{"seq":(-?\d+)[,}]')
+# The fixed key order of ``EventLogEntry.to_dict`` puts actor and kind right after seq and ts.
+_LEADING_LABELS = re.compile(
+    rb'^\{"seq":-?\d+,"ts":"[^"\\]*","actor":"([^"\\]*)","kind":"([^"\\]*)"'
+)
+# Every record ends with its CRC32 as a last JSON field, so a line stays a
+# plain JSON object: ``{"seq":1,...,"crc":"0a1b2c3d"}``. The checksum covers
+# the line with that field left out.
+_CRC_MARK = b',"crc":"'
+_CRC_TAIL = len(_CRC_MARK) + 10
+# The checksum field at the end of each line of a chunk, for exports to drop.
+_CRC_FIELDS = re.compile(rb',"crc":"[0-9a-f]{8}"\}(?=\r?\n|\Z)')
+
+
+@dataclass
+class DamagedRecord:
+    """A stored line that failed its checksum or could not be parsed."""
+
+    segment: str
+    offset: int
+    length: int
+    seq: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "segment": self.segment,
+            "offset": self.offset,
+            "length": self.length,
+            "seq": self.seq,
+        }
+
+
+@dataclass
+class SegmentIndex:
+    """Parallel arrays mapping each intact record's ``seq`` to its byte range.
+
+    ``labels`` holds the kind and actor of the same records, so filtered
+    queries pick their records without decoding the others. Damaged lines are left out of the arrays and listed in ``damaged`` as
+    ``(offset, length, seq)``, ``seq`` being ``None`` when unreadable.
+    """
+
+    seqs: array = field(default_factory=lambda: array("q"))
+    offsets: array = field(default_factory=lambda: array("q"))
+    ends: array = field(default_factory=lambda: array("q"))
+    damaged: List[Tuple[int, int, Optional[int]]] = field(default_factory=list)
+    labels: EventLabelIndex = field(default_factory=EventLabelIndex)
+    size: int = 0
+
+    def add(self, seq: int, offset: int, length: int, kind: str, actor: str) -> None:
+        # ``seqs`` grows last: readers bound their positions by it, so they
+        # never see a record whose other columns are not filled in yet.
+        self.labels.add(kind, actor)
+        self.offsets.append(offset)
+        self.ends.append(offset + length)
+        self.seqs.append(seq)
+        self.size = offset + length
+
+    def skip(self, offset: int, line: bytes) -> None:
+        if line.strip():
+            self.damaged.append((offset, len(line), _leading_seq(line)))
+        self.size = offset + len(line)
+
+    def scan(self, offset: int, line: bytes) -> None:
+        seq = _line_seq(line)
+        if seq is None or _check_line(line) is False:
+            self.skip(offset, line)
+        else:
+            self.add(seq, offset, len(line), *_line_labels(line))
+
+    @property
+    def count(self) -> int:
+        return len(self.seqs) + len(self.damaged)
+
+    @property
+    def max_seq(self) -> int:
+        seqs = [seq for _, _, seq in self.damaged if seq is not None]
+        if self.seqs:
+            seqs.append(self.seqs[-1])
+        return max(seqs, default=0)
+
+    def runs(self, first: int, last: int) -> Iterator[Tuple[int, int]]:
+        """Byte ranges covering records ``first:last`` without the damaged lines between them."""
+        if not self.damaged:
+            yield self.offsets[first], self.ends[last - 1]
+            return
+        begin, end = self.offsets[first], self.ends[first]
+        for position in range(first + 1, last):
+            if self.offsets[position] != end:
+                yield begin, end
+                begin = self.offsets[position]
+            end = self.ends[position]
+        yield begin, end
+
+
+@dataclass
+class SegmentMerge:
+    """Adjacent sealed segments rewritten as one staged file."""
+
+    sources: List[Tuple[Path, Tuple[int, int, int]]]
+    staged: Path
+    target: Path
+    index: Optional[SegmentIndex] = None
+
+    def is_current(self) -> bool:
+        """Whether every source is still where and what it was when staged."""
+        return all(_file_stamp(path) == stamp for path, stamp in self.sources)
+
+
+@dataclass
+class LogCompaction:
+    """Output of ``EventLog.stage_compaction`` waiting for ``switch_compaction``."""
+
+    merges: List[SegmentMerge] = field(default_factory=list)
+    indexes: Dict[str, Tuple[Path, Tuple[int, int, int], SegmentIndex]] = field(
+        default_factory=dict
+    )
+    merged: int = 0
+    skipped: int = 0
+    reindexed: int = 0
+
+
+class CompressedSegment:
+    """A sealed segment stored as independently compressed blocks of whole records.
+
+    The footer lists each block's ``seq`` range and byte range, so a read
+    decompresses only the blocks that overlap what it asks for.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        footer = _read_archive_footer(path)
+        self.codec = str(footer["codec"])
+        self._decompress = _COMPRESSORS[self.codec][1]
+        self.blocks: List[Tuple[int, int, int, int]] = [
+            (int(first), int(last), int(offset), int(length))
+            for first, last, offset, length in footer["blocks"]
+            if first is not None
+        ]
+        self.damaged: List[Tuple[int, int, Optional[int]]] = [
+            (int(offset), int(length), seq) for offset, length, seq in footer.get("damaged", [])
+        ]
+        self._first_seqs = [block[0] for block in self.blocks]
+        self._last_seqs = [block[1] for block in self.blocks]
+
+    def iter_blocks(
+        self, after_seq: int = 0, max_seq: Optional[int] = None, reverse: bool = False
+    ) -> Iterator[Tuple[bytes, SegmentIndex]]:
+        """Decompress and index the blocks holding ``after_seq < seq <= max_seq``."""
+        start = bisect_right(self._last_seqs, after_seq)
+        stop = len(self.blocks) if max_seq is None else bisect_right(self._first_seqs, max_seq)
+        if start >= stop:
+            return
+        blocks = self.blocks[start:stop]
+        with self.path.open("rb") as handle:
+            for _, _, offset, length in reversed(blocks) if reverse else blocks:
+                handle.seek(offset)
+                try:
+                    data = self._decompress(handle.read(length))
+                except (zlib.error, lzma.LZMAError):
+                    # The whole block is lost, but the blocks around it still read.
+                    if (offset, length, None) not in self.damaged:
+                        self.damaged.append((offset, length, None))
+                    continue
+                yield data, _index_bytes(data)
+
+    def iter(self, after_seq: int = 0) -> Iterator[EventLogEntry]:
+        for data, index in self.iter_blocks(after_seq):
+            position = bisect_right(index.seqs, after_seq)
+            for begin, end in zip(index.offsets[position:], index.ends[position:]):
+                event = _decode_event(data[begin:end])
+                if event is not None:
+                    yield event
+
+    def read_seqs(self, seqs: Sequence[int]) -> List[EventLogEntry]:
+        """The events with the ascending ``seqs``, decompressing only the blocks holding them."""
+        events: List[EventLogEntry] = []
+        position = 0
+        while position < len(seqs):
+            block = bisect_left(self._last_seqs, seqs[position])
+            if block >= len(self.blocks):
+                break
+            stop = bisect_right(seqs, self._last_seqs[block], position)
+            for data, index in self.iter_blocks(seqs[position] - 1, self._last_seqs[block]):
+                events.extend(_decode_seqs(data, index, seqs[position:stop]))
+            position = stop
+        return events
+
+    def records(self) -> List[Dict[str, Any]]:
+        records: List[Dict[str, Any]] = []
+        for data, _ in self.iter_blocks():
+            records.extend(_read_records(data.splitlines(keepends=True)))
+        return records
+
+
+class EventLog:
+    """Append-only event log stored as JSON Lines segment files.
+
+    Each segment is named after the first ``seq`` it may contain and holds at
+    most ``segment_events`` records. Only the newest segment is ever written to.
+    Reads go through a per-segment seq -> byte offset index, so a reader
+    seeks straight to the first event it needs. Sealed segments can be moved
+    to ``archive/``; they stay readable but no longer count as the hot log.
+    Archived segments never change again, so they are read through ``mmap``
+    and only the pages a scan touches are loaded.
+    With ``compression`` set, archived segments are rewritten as compressed
+    blocks instead (see ``CompressedSegment``).
+    Every record carries a CRC32. A record that fails it is skipped by every
+    read and reported by ``damaged_records``; the records around it stay
+    readable, so damage costs only the records it hit.
+    Indexes are extended both by the writer and by readers catching up with
+    the tail, so both do it under ``_index_lock``; records are written and
+    indexed under the lock together, so a reader never indexes them twice.
+    ``entity_events`` looks events up through an in-memory entity -> seqs
+    index, built from the whole log on first use and kept up by appends.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        segment_events: int = DEFAULT_SEGMENT_EVENTS,
+        durability: Optional[Durability] = None,
+        compression: Optional[str] = None,
+        block_bytes: int = DEFAULT_ARCHIVE_BLOCK_BYTES,
+    ) -> None:
+        if compression is not None and compression not in _COMPRESSORS:
+            raise ValueError(f"Unknown archive compression: {compression}")
+        self.directory = Path(directory)
+        self.segment_events = max(1, int(segment_events))
+        self.durability = durability or Durability()
+        self.compression = compression
+        self.block_bytes = max(1, int(block_bytes))
+        self._last_seq: Optional[int] = None
+        self._tail_count = 0
+        self._min_last_seq = 0
+        self._indexes: Dict[str, SegmentIndex] = {}
+        self._index_lock = threading.RLock()
+        self._compressed: Dict[str, CompressedSegment] = {}
+        self._entities: Optional[EntityIndex] = None
+
+    @property
+    def last_seq(self) -> int:
+        if self._last_seq is None:
+            self._open_tail()
+        return max(int(self._last_seq or 0), self._min_last_seq)
+
+    def raise_last_seq(self, last_seq: int) -> None:
+        """Keep ``last_seq`` at least at ``last_seq`` even without matching events."""
+        self._min_last_seq = max(self._min_last_seq, int(last_seq))
+
+    def is_empty(self) -> bool:
+        return not self.segment_paths()
+
+    def append(self, events: List[EventLogEntry]) -> List[EventLogEntry]:
+        if not events:
+            return []
+        last_seq = self.last_seq
+        for event in events:
+            last_seq += 1
+            event.seq = last_seq
+        self._write_records([event.to_dict() for event in events])
+        return events
+
+    def append_records(self, records: List[Dict[str, Any]]) -> None:
+        """Append already-numbered records in ``seq`` order, skipping any at or below ``last_seq``."""
+        last_seq = self.last_seq
+        self._write_records([record for record in records if _record_seq(record) > last_seq])
+
+    def read(self, after_seq: int = 0) -> List[EventLogEntry]:
+        return list(self.iter(after_seq))
+
+    def iter(self, after_seq: int = 0, limit: Optional[int] = None) -> Iterator[EventLogEntry]:
+        """Stream events with ``seq > after_seq`` in order, at most ``limit`` of them."""
+        remaining = limit
+        if remaining is not None and remaining <= 0:
+            return
+        segments = self._segments_from(after_seq)
+        while segments:
+            segment = segments.pop(0)
+            try:
+                for event in self._iter_segment(segment, after_seq):
+                    yield event
+                    after_seq = event.seq
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining <= 0:
+                            return
+            except FileNotFoundError:
+                # Merged into an earlier segment by a compaction; list again from here.
+                segments = self._segments_from(after_seq)
+
+    def query(self, query: EventQuery, limit: int) -> List[EventLogEntry]:
+        """At most ``limit`` events matching ``query``, decoding only those records."""
+        events: List[EventLogEntry] = []
+        while len(events) < limit:
+            try:
+                for segment in self._segments_for(query):
+                    for event in self._query_segment(segment, query):
+                        events.append(event)
+                        query = query.following(event.seq)
+                        if len(events) >= limit:
+                            return events
+                return events
+            except FileNotFoundError:
+                continue  # Merged by a compaction; list again from the last event returned.
+        return events
+
+    def entity_events(self, entity_type: str, entity_id: str) -> List[EventLogEntry]:
+        """Every event naming the entity in its payload, oldest first."""
+        if self._entities is None:
+            entities = EntityIndex()
+            last = 0
+            for event in self.iter():
+                entities.add(event.seq, event.payload)
+                last = event.seq
+            # Appends made during the scan were not indexed: catch up with the
+            # writer held off, so that from here on it adds to the index itself.
+            with self._index_lock:
+                if self._entities is None:
+                    for event in self.iter(last):
+                        entities.add(event.seq, event.payload)
+                    self._entities = entities
+        return self.read_seqs(self._entities.seqs(entity_type, entity_id))
+
+    def read_seqs(self, seqs: Sequence[int]) -> List[EventLogEntry]:
+        """The events with the ascending ``seqs``, reading only their records."""
+        events: List[EventLogEntry] = []
+        wanted = list(seqs)
+        while wanted:
+            try:
+                segments = self._segments_from(wanted[0] - 1)
+                for number, segment in enumerate(segments):
+                    if number + 1 < len(segments):
+                        stop = bisect_left(wanted, _segment_first_seq(segments[number + 1]))
+                    else:
+                        stop = len(wanted)
+                    if stop:
+                        events.extend(self._read_segment_seqs(segment, wanted[:stop]))
+                        wanted = wanted[stop:]
+                return events
+            except FileNotFoundError:
+                continue  # Merged by a compaction; list again from the first seq still wanted.
+        return events
+
+    def segment_index(self, segment: Path) -> SegmentIndex:
+        """Return the offset index for ``segment``, scanning only bytes not yet indexed."""
+        with self._index_lock:
+            index = self._indexes.get(segment.name)
+            if index is None:
+                index = self._indexes[segment.name] = SegmentIndex()
+            size = segment.stat().st_size
+            if index.size > size:
+                index = self._indexes[segment.name] = SegmentIndex()
+            if index.size == size:
+                return index
+            if self._is_archived(segment):
+                _index_mapped(segment, index)
+                return index
+            with segment.open("rb") as handle:
+                handle.seek(index.size)
+                offset = index.size
+                for line in handle:
+                    if not line.endswith(b"\n"):
+                        break
+                    index.scan(offset, line)
+                    offset += len(line)
+            return index
+
+    def damaged_records(self) -> List[DamagedRecord]:
+        """Damaged lines found so far in the segments that have been indexed."""
+        damaged: List[DamagedRecord] = []
+        for segment in self.archive_paths() + self.segment_paths():
+            if _is_compressed(segment):
+                index = self.compressed_segment(segment)
+            else:
+                index = self._indexes.get(segment.name)
+            if index is None:
+                continue
+            for offset, length, seq in index.damaged:
+                damaged.append(DamagedRecord(segment.name, offset, length, seq))
+        return damaged
+
+    def compressed_segment(self, segment: Path) -> CompressedSegment:
+        compressed = self._compressed.get(segment.name)
+        if compressed is None:
+            compressed = self._compressed[segment.name] = CompressedSegment(segment)
+        return compressed
+
+    def iter_lines(self, after_seq: int = 0, max_seq: Optional[int] = None) -> Iterator[Any]:
+        """Yield the stored JSON Lines for ``after_seq < seq <= max_seq`` as-is.
+
+        Each chunk covers a run of whole, intact records from one segment.
+        Chunks from archived segments are ``memoryview`` slices of the mapped file
+        (or of a decompressed block), so nothing is copied until the caller
+        writes them out.
+        """
+        segments = self._segments_from(after_seq)
+        while segments:
+            segment = segments.pop(0)
+            if max_seq is not None and _segment_first_seq(segment) > max_seq:
+                return
+            try:
+                for chunk, last_seq in self._segment_lines(segment, after_seq, max_seq):
+                    yield chunk
+                    after_seq = last_seq
+            except FileNotFoundError:
+                # Merged into an earlier segment by a compaction; list again from here.
+                segments = self._segments_from(after_seq)
+
+    def iter_event_lines(
+        self, after_seq: int = 0, max_seq: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """``iter_lines`` without the checksum field, so lines match ``EventLogEntry.to_dict``.
+
+        The checksum is a storage detail: exports must not depend on the backend.
+        """
+        for chunk in self.iter_lines(after_seq, max_seq):
+            yield _CRC_FIELDS.sub(b"}", chunk)
+
+    def read_raw(self) -> List[Dict[str, Any]]:
+        records: List[Dict[str, Any]] = []
+        for segment in self.archive_paths() + self.segment_paths():
+            if _is_compressed(segment):
+                records.extend(self.compressed_segment(segment).records())
+            else:
+                records.extend(_read_segment(segment))
+        return records
+
+    def archive(self, max_seq: int, before: Optional[datetime] = None) -> List[Path]:
+        """Move sealed segments whose events all have ``seq <= max_seq`` (and
+        ``ts < before`` when given) out of the hot log, oldest first, compressing
+        them when ``compression`` is set."""
+        moved: List[Path] = []
+        for segment in self.segment_paths()[:-1]:
+            index = self.segment_index(segment)
+            if index.seqs and index.seqs[-1] > max_seq:
+                break
+            if before is not None and index.seqs:
+                last_ts = self._last_ts(segment, index)
+                if last_ts is None or last_ts >= before:
+                    break
+            self.archive_directory.mkdir(parents=True, exist_ok=True)
+            target = self.archive_directory / segment.name
+            segment.rename(target)
+            moved.append(target)
+        if self.compression is not None:
+            # Also picks up segments archived before compression was turned on.
+            moved = [self._compressed_path(path) for path in moved]
+            self.compress_archive()
+        return moved
+
+    def compress_archive(self) -> List[Path]:
+        """Rewrite every uncompressed archived segment as compressed blocks."""
+        if self.compression is None:
+            return []
+        compressed: List[Path] = []
+        for segment in self.archive_paths():
+            if _is_compressed(segment):
+                continue
+            target = self._compressed_path(segment)
+            _compress_segment(segment, target, self.compression, self.block_bytes, self.durability)
+            segment.unlink()
+            self._indexes.pop(segment.name, None)
+            compressed.append(target)
+        return compressed
+
+    def stage_compaction(self) -> LogCompaction:
+        """Merge runs of small sealed segments into staged files and reindex the rest.
+
+        Adjacent sealed segments (hot, or archived and uncompressed) are merged
+        while they hold no more than ``segment_events`` records together;
+        archived merges are compressed when ``compression`` is set. Only sealed
+        files are read and everything is written under ``<directory>.compact/``,
+        so commits keep appending to the tail meanwhile.
+        """
+        self._finish_compaction()
+        shutil.rmtree(self._compaction_directory, ignore_errors=True)
+        plan = LogCompaction()
+        archived = [path for path in self.archive_paths() if not _is_compressed(path)]
+        for segments in (self.segment_paths()[:-1], archived):
+            for group in self._merge_groups(segments, plan):
+                plan.merges.append(self._stage_merge(group))
+        return plan
+
+    def switch_compaction(self, plan: LogCompaction) -> None:
+        """Install what ``stage_compaction`` built; merges whose sources changed are dropped.
+
+        A marker listing the merges is written first, so a crash part way
+        through is completed (or discarded) the next time the log opens.
+        """
+        ready = [merge for merge in plan.merges if merge.is_current()]
+        plan.skipped = sum(len(merge.sources) for merge in plan.merges if merge not in ready)
+        if ready:
+            marker = [
+                {
+                    "target": self._relative(merge.target),
+                    "size": merge.staged.stat().st_size,
+                    "retired": [
+                        self._relative(path) for path, _ in merge.sources if path != merge.target
+                    ],
+                }
+                for merge in ready
+            ]
+            self.durability.write_atomic(
+                self._compaction_directory / _COMPACTION_MARKER,
+                json.dumps({"merges": marker}).encode("utf-8"),
+            )
+            for merge in ready:
+                os.replace(merge.staged, merge.target)
+                self._compressed.pop(merge.target.name, None)
+                if merge.index is not None:
+                    self._indexes[merge.target.name] = merge.index
+                    plan.reindexed += 1
+                else:
+                    self._indexes.pop(merge.target.name, None)
+                plan.merged += len(merge.sources)
+            self._finish_compaction()
+        shutil.rmtree(self._compaction_directory, ignore_errors=True)
+        for name, (path, stamp, index) in plan.indexes.items():
+            if _file_stamp(path) == stamp:
+                self._indexes[name] = index
+                plan.reindexed += 1
+
+    @property
+    def archive_directory(self) -> Path:
+        return self.directory / ARCHIVE_DIRNAME
+
+    def archive_paths(self) -> List[Path]:
+        if not self.archive_directory.exists():
+            return []
+        segments: Dict[int, Path] = {}
+        for path in self.archive_directory.iterdir():
+            if not _is_segment_name(path.name):
+                continue
+            first_seq = _segment_first_seq(path)
+            # A crash mid-compression leaves both files; the compressed one is complete.
+            if first_seq not in segments or _is_compressed(path):
+                segments[first_seq] = path
+        return [segments[first_seq] for first_seq in sorted(segments)]
+
+    def archive_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.archive_paths())
+
+    def replace(self, records: List[Dict[str, Any]], last_seq: int = 0) -> None:
+        """Atomically swap the whole log for ``records`` (used by imports and migration)."""
+        staging = self.directory.with_name(self.directory.name + ".new")
+        if staging.exists():
+            shutil.rmtree(staging)
+        staging.mkdir(parents=True)
+        target = EventLog(staging, self.segment_events, self.durability)
+        target._last_seq = 0
+        target._write_records(
+            sorted((record for record in records if isinstance(record, dict)), key=_record_seq)
+        )
+        retired = self.directory.with_name(self.directory.name + ".old")
+        if retired.exists():
+            shutil.rmtree(retired)
+        if self.directory.exists():
+            self.directory.rename(retired)
+        staging.rename(self.directory)
+        if retired.exists():
+            shutil.rmtree(retired)
+        self._last_seq = None
+        self._min_last_seq = int(last_seq or 0)
+        self._indexes = {}
+        self._compressed = {}
+        self._entities = None
+
+    def segment_paths(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def _write_records(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        if self._last_seq is None:
+            self._open_tail()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = self.segment_paths()
+        segment = segments[-1] if segments else None
+        position = 0
+        while position < len(records):
+            if segment is None or self._tail_count >= self.segment_events:
+                segment = self.directory / _segment_name(_record_seq(records[position]))
+                self._tail_count = 0
+            chunk = records[position:position + self.segment_events - self._tail_count]
+            position += len(chunk)
+            self._append_chunk(segment, chunk)
+
+    def _append_chunk(self, segment: Path, records: List[Dict[str, Any]]) -> None:
+        """Append ``records`` to ``segment``; readers see all of them indexed or none."""
+        with segment.open("ab") as handle:
+            written = 0
+            with self._index_lock:
+                index = self._indexes.get(segment.name)
+                if index is not None and index.size != handle.tell():
+                    del self._indexes[segment.name]
+                    index = None
+                for record in records:
+                    offset = handle.tell()
+                    length = handle.write(_encode_record(record))
+                    written += length
+                    if index is not None:
+                        index.add(_record_seq(record), offset, length, *_record_labels(record))
+                    if self._entities is not None:
+                        self._entities.add(_record_seq(record), record.get("payload"))
+                    self._tail_count += 1
+                    self._last_seq = max(int(self._last_seq or 0), _record_seq(record))
+                # A reader scanning the tail once the lock is released must
+                # find on disk every byte the index already covers.
+                handle.flush()
+            self.durability.sync_handle(handle, segment, written)
+
+    @property
+    def _compaction_directory(self) -> Path:
+        return self.directory.with_name(self.directory.name + COMPACTION_SUFFIX)
+
+    def _relative(self, path: Path) -> str:
+        return path.relative_to(self.directory).as_posix()
+
+    def _merge_groups(
+        self, segments: List[Path], plan: LogCompaction
+    ) -> Iterator[List[Tuple[Path, Tuple[int, int, int], bytes]]]:
+        """Runs of adjacent ``segments`` small enough to share one segment."""
+        group: List[Tuple[Path, Tuple[int, int, int], bytes]] = []
+        count = 0
+        for segment in segments:
+            stamp = _file_stamp(segment)
+            if stamp is None:
+                # Archived by a commit since it was listed: the run is broken here.
+                if len(group) > 1:
+                    yield group
+                group, count = [], 0
+                continue
+            data = segment.read_bytes()
+            data = data[: data.rfind(b"\n") + 1]
+            index = _index_bytes(data)
+            plan.indexes[segment.name] = (segment, stamp, index)
+            if group and count + index.count > self.segment_events:
+                if len(group) > 1:
+                    yield group
+                group, count = [], 0
+            group.append((segment, stamp, data))
+            count += index.count
+        if len(group) > 1:
+            yield group
+
+    def _stage_merge(self, group: List[Tuple[Path, Tuple[int, int, int], bytes]]) -> SegmentMerge:
+        first = group[0][0]
+        archived = self._is_archived(first)
+        staged = self._compaction_directory / (ARCHIVE_DIRNAME if archived else "hot") / first.name
+        data = b"".join(data for _, _, data in group)
+        self.durability.write_atomic(staged, data)
+        merge = SegmentMerge(
+            sources=[(segment, stamp) for segment, stamp, _ in group],
+            staged=staged,
+            target=first,
+            index=_index_bytes(data),
+        )
+        if archived and self.compression is not None:
+            compressed = self._compressed_path(staged)
+            _compress_segment(staged, compressed, self.compression, self.block_bytes, self.durability)
+            staged.unlink()
+            merge.staged, merge.target, merge.index = compressed, self._compressed_path(first), None
+        return merge
+
+    def _finish_compaction(self) -> None:
+        """Retire the sources of merges a ``switch_compaction`` marker lists as switched.
+
+        Called on open as well, to complete a switch a crash interrupted; a
+        staged compaction that never reached its switch is left alone.
+        """
+        staging = self._compaction_directory
+        marker = staging / _COMPACTION_MARKER
+        if not marker.exists():
+            return
+        try:
+            merges = json.loads(marker.read_bytes())["merges"]
+        except (ValueError, KeyError, TypeError):
+            merges = []
+        for merge in merges:
+            target = self.directory / merge["target"]
+            # Sources are retired only once the merged file is in place.
+            if _file_stamp(target) is None or target.stat().st_size != merge["size"]:
+                continue
+            for name in merge["retired"]:
+                (self.directory / name).unlink(missing_ok=True)
+                self._indexes.pop(Path(name).name, None)
+                self._compressed.pop(Path(name).name, None)
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def _segment_lines(
+        self, segment: Path, after_seq: int, max_seq: Optional[int]
+    ) -> Iterator[Tuple[Any, int]]:
+        """``iter_lines`` chunks of one segment, each with the last ``seq`` it holds."""
+        if _is_compressed(segment):
+            for data, index in self.compressed_segment(segment).iter_blocks(after_seq, max_seq):
+                first = bisect_right(index.seqs, after_seq)
+                last = len(index.seqs) if max_seq is None else bisect_right(index.seqs, max_seq)
+                if first < last:
+                    for begin, end in index.runs(first, last):
+                        yield memoryview(data)[begin:end], index.seqs[last - 1]
+            return
+        index = self.segment_index(segment)
+        first = bisect_right(index.seqs, after_seq)
+        last = len(index.seqs) if max_seq is None else bisect_right(index.seqs, max_seq)
+        if first >= last:
+            return
+        if self._is_archived(segment):
+            mapped = _map_segment(segment)
+            if mapped is not None:
+                for begin, end in index.runs(first, last):
+                    yield memoryview(mapped)[begin:end], index.seqs[last - 1]
+            return
+        with segment.open("rb") as handle:
+            for begin, end in index.runs(first, last):
+                handle.seek(begin)
+                yield handle.read(end - begin), index.seqs[last - 1]
+
+    def _segments_from(self, after_seq: int) -> List[Path]:
+        """Segments that may hold ``seq > after_seq``, oldest first."""
+        segments = self.archive_paths() + self.segment_paths()
+        first_seqs = [_segment_first_seq(segment) for segment in segments]
+        start = max(0, bisect_right(first_seqs, after_seq + 1) - 1)
+        return segments[start:]
+
+    def _segments_for(self, query: EventQuery) -> List[Path]:
+        """Segments that may hold events in ``query``'s range, in its order."""
+        segments = self._segments_from(query.after_seq)
+        if query.before_seq is not None:
+            segments = [
+                segment for segment in segments if _segment_first_seq(segment) < query.before_seq
+            ]
+        return segments[::-1] if query.reverse else segments
+
+    def _query_segment(self, segment: Path, query: EventQuery) -> Iterator[EventLogEntry]:
+        if _is_compressed(segment):
+            max_seq = None if query.before_seq is None else query.before_seq - 1
+            blocks = self.compressed_segment(segment).iter_blocks(
+                query.after_seq, max_seq, query.reverse
+            )
+            for data, index in blocks:
+                yield from _decode_matches(data, index, query)
+            return
+        index = self.segment_index(segment)
+        if self._is_archived(segment):
+            mapped = _map_segment(segment)
+            if mapped is not None:
+                yield from _decode_matches(mapped, index, query)
+            return
+        with segment.open("rb") as handle:
+            for position in index.labels.matches(query, *query.bounds(index.seqs)):
+                begin, end = index.offsets[position], index.ends[position]
+                handle.seek(begin)
+                event = _decode_event(handle.read(end - begin))
+                if event is not None:
+                    yield event
+
+    def _read_segment_seqs(self, segment: Path, seqs: List[int]) -> List[EventLogEntry]:
+        if _is_compressed(segment):
+            return self.compressed_segment(segment).read_seqs(seqs)
+        index = self.segment_index(segment)
+        if self._is_archived(segment):
+            mapped = _map_segment(segment)
+            return [] if mapped is None else list(_decode_seqs(mapped, index, seqs))
+        events: List[EventLogEntry] = []
+        with segment.open("rb") as handle:
+            for position in _seq_positions(index, seqs):
+                handle.seek(index.offsets[position])
+                event = _decode_event(handle.read(index.ends[position] - index.offsets[position]))
+                if event is not None:
+                    events.append(event)
+        return events
+
+    def _iter_segment(self, segment: Path, after_seq: int) -> Iterator[EventLogEntry]:
+        if _is_compressed(segment):
+            yield from self.compressed_segment(segment).iter(after_seq)
+            return
+        index = self.segment_index(segment)
+        position = bisect_right(index.seqs, after_seq)
+        if position >= len(index.seqs):
+            return
+        if self._is_archived(segment):
+            yield from _iter_mapped(segment, index, position)
+            return
+        with segment.open("rb") as handle:
+            handle.seek(index.offsets[position])
+            while handle.tell() < index.size:
+                event = _decode_event(handle.readline())
+                if event is not None and event.seq > after_seq:
+                    yield event
+
+    def _compressed_path(self, segment: Path) -> Path:
+        assert self.compression is not None
+        return segment.with_name(segment.name + ARCHIVE_COMPRESSION_SUFFIXES[self.compression])
+
+    def _is_archived(self, segment: Path) -> bool:
+        return segment.parent == self.archive_directory
+
+    def _last_ts(self, segment: Path, index: SegmentIndex) -> Optional[datetime]:
+        with segment.open("rb") as handle:
+            handle.seek(index.offsets[-1])
+            event = _decode_event(handle.readline())
+        if event is None:
+            return None
+        if event.ts.tzinfo is None:
+            return event.ts.replace(tzinfo=timezone.utc)
+        return event.ts
+
+    def _open_tail(self) -> None:
+        self._finish_compaction()
+        segments = self.segment_paths()
+        self._last_seq = 0
+        self._tail_count = 0
+        if not segments:
+            return
+        tail = segments[-1]
+        _truncate_partial_record(tail)
+        # Damaged records still count, so their seqs are never handed out twice.
+        index = self.segment_index(tail)
+        self._tail_count = index.count
+        self._last_seq = index.max_seq
+        if not index.count and len(segments) > 1:
+            self._last_seq = self.segment_index(segments[-2]).max_seq
+
+
+def _segment_name(first_seq: int) -> str:
+    return f"{max(0, first_seq):012d}{SEGMENT_SUFFIX}"
+
+
+def _segment_first_seq(path: Path) -> int:
+    try:
+        return int(path.name.split(".", 1)[0])
+    except ValueError:
+        return 0
+
+
+def _file_stamp(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+
+def _is_segment_name(name: str) -> bool:
+    if name.startswith("."):
+        return False
+    if name.endswith(SEGMENT_SUFFIX):
+        return True
+    return any(
+        name.endswith(SEGMENT_SUFFIX + suffix) for suffix in ARCHIVE_COMPRESSION_SUFFIXES.values()
+    )
+
+
+def _is_compressed(path: Path) -> bool:
+    return not path.name.endswith(SEGMENT_SUFFIX)
+
+
+def _compress_segment(
+    source: Path, target: Path, codec: str, block_bytes: int, durability: Durability
+) -> None:
+    compress = _COMPRESSORS[codec][0]
+    chunks: List[bytes] = []
+    blocks: List[List[Any]] = []
+    damaged: List[List[Any]] = []
+    raw_offset = 0
+    offset = 0
+    for block in _split_blocks(source.read_bytes(), block_bytes):
+        index = _index_bytes(block)
+        damaged.extend([raw_offset + start, length, seq] for start, length, seq in index.damaged)
+        packed = compress(block)
+        first_seq = index.seqs[0] if index.seqs else None
+        last_seq = index.seqs[-1] if index.seqs else None
+        blocks.append([first_seq, last_seq, offset, len(packed)])
+        chunks.append(packed)
+        offset += len(packed)
+        raw_offset += len(block)
+    footer = json.dumps(
+        {"codec": codec, "blocks": blocks, "damaged": damaged}, separators=(",", ":")
+    ).encode("utf-8")
+    chunks.append(footer + _ARCHIVE_TRAILER.pack(len(footer), _ARCHIVE_MAGIC))
+    durability.write_atomic(target, b"".join(chunks))
+
+
+def _split_blocks(data: bytes, block_bytes: int) -> Iterator[bytes]:
+    """Cut ``data`` into runs of whole lines of about ``block_bytes`` each."""
+    start = 0
+    while start < len(data):
+        end = data.find(b"\n", start + block_bytes - 1)
+        end = len(data) if end < 0 else end + 1
+        yield data[start:end]
+        start = end
+
+
+def _read_archive_footer(path: Path) -> Dict[str, Any]:
+    with path.open("rb") as handle:
+        handle.seek(0, 2)
+        size = handle.tell()
+        if size < _ARCHIVE_TRAILER.size:
+            raise ValueError(f"Truncated archive segment: {path.name}")
+        handle.seek(size - _ARCHIVE_TRAILER.size)
+        length, magic = _ARCHIVE_TRAILER.unpack(handle.read(_ARCHIVE_TRAILER.size))
+        if magic != _ARCHIVE_MAGIC or length > size - _ARCHIVE_TRAILER.size:
+            raise ValueError(f"Invalid archive segment: {path.name}")
+        handle.seek(size - _ARCHIVE_TRAILER.size - length)
+        footer = json.loads(handle.read(length))
+    if not isinstance(footer, dict) or footer.get("codec") not in _COMPRESSORS:
+        raise ValueError(f"Invalid archive segment: {path.name}")
+    return footer
+
+
+def _index_bytes(data: bytes) -> SegmentIndex:
+    index = SegmentIndex()
+    offset = 0
+    for line in data.splitlines(keepends=True):
+        index.scan(offset, line)
+        offset += len(line)
+    return index
+
+
+def _map_segment(path: Path) -> Optional[mmap.mmap]:
+    """Map a sealed segment read-only; ``None`` for an empty file.
+
+    The map is closed when the last reference (including slices handed to a
+    caller) goes away, so it is never closed explicitly.
+    """
+    with path.open("rb") as handle:
+        if path.stat().st_size == 0:
+            return None
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _index_mapped(path: Path, index: SegmentIndex) -> None:
+    mapped = _map_segment(path)
+    if mapped is None:
+        return
+    offset = index.size
+    while offset < len(mapped):
+        end = mapped.find(b"\n", offset)
+        if end < 0:
+            break
+        index.scan(offset, mapped[offset:end + 1])
+        offset = end + 1
+
+
+def _iter_mapped(path: Path, index: SegmentIndex, position: int) -> Iterator[EventLogEntry]:
+    mapped = _map_segment(path)
+    if mapped is None:
+        return
+    for begin, end in zip(index.offsets[position:], index.ends[position:]):
+        event = _decode_event(mapped[begin:end])
+        if event is not None:
+            yield event
+
+
+def _decode_matches(data: Any, index: SegmentIndex, query: EventQuery) -> Iterator[EventLogEntry]:
+    """Decode the records of ``data`` (indexed by ``index``) that ``query`` selects."""
+    for position in index.labels.matches(query, *query.bounds(index.seqs)):
+        event = _decode_event(data[index.offsets[position]:index.ends[position]])
+        if event is not None:
+            yield event
+
+
+def _decode_seqs(data: Any, index: SegmentIndex, seqs: Sequence[int]) -> Iterator[EventLogEntry]:
+    """Decode the records of ``data`` (indexed by ``index``) with the ascending ``seqs``."""
+    for position in _seq_positions(index, seqs):
+        event = _decode_event(data[index.offsets[position]:index.ends[position]])
+        if event is not None:
+            yield event
+
+
+def _seq_positions(index: SegmentIndex, seqs: Sequence[int]) -> Iterator[int]:
+    position = 0
+    for seq in seqs:
+        position = bisect_left(index.seqs, seq, position)
+        if position < len(index.seqs) and index.seqs[position] == seq:
+            yield position
+
+
+def _encode_record(record: Dict[str, Any]) -> bytes:
+    body = json.dumps(
+        {key: value for key, value in record.items() if key != "crc"},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return b'%s%s%08x"}\n' % (body[:-1], _CRC_MARK, zlib.crc32(body))
+
+
+def _check_line(line: bytes) -> Optional[bool]:
+    """Whether ``line`` matches its checksum; ``None`` for a record written without one."""
+    line = line.rstrip(b"\r\n")
+    tail = line[-_CRC_TAIL:]
+    if not tail.startswith(_CRC_MARK) or not tail.endswith(b'"}'):
+        return None
+    try:
+        expected = int(tail[len(_CRC_MARK):-2], 16)
+    except ValueError:
+        return False
+    return zlib.crc32(line[:-_CRC_TAIL] + b"}") == expected
+
+
+def _decode_event(line: bytes) -> Optional[EventLogEntry]:
+    if _check_line(line) is False:
+        return None
+    return _safe_event_from_dict(_decode_line(line))
+
+
+def _decode_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def _leading_seq(line: bytes) -> Optional[int]:
+    match = _LEADING_SEQ.match(line)
+    return int(match.group(1)) if match else None
+
+
+def _line_seq(line: bytes) -> Optional[int]:
+    seq = _leading_seq(line)
+    if seq is not None:
+        return seq
+    record = _decode_line(line)
+    if not isinstance(record, dict):
+        return None
+    return _record_seq(record)
+
+
+def _line_labels(line: bytes) -> Tuple[str, str]:
+    """``(kind, actor)`` of an intact record line, read off its prefix when possible."""
+    match = _LEADING_LABELS.match(line)
+    if match:
+        return match.group(2).decode("utf-8", "replace"), match.group(1).decode("utf-8", "replace")
+    record = _decode_line(line)
+    return _record_labels(record if isinstance(record, dict) else {})
+
+
+def _record_labels(record: Dict[str, Any]) -> Tuple[str, str]:
+    return str(record.get("kind", "")), str(record.get("actor", ""))
+
+
+def _record_seq(record: Dict[str, Any]) -> int:
+    try:
+        return int(record.get("seq", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _read_segment(path: Path) -> List[Dict[str, Any]]:
+    with path.open("rb") as handle:
+        return _read_records(handle)
+
+
+def _read_records(lines: Iterable[bytes]) -> List[Dict[str, Any]]:
+    records: List[Dict[str, Any]] = []
+    for line in lines:
+        if not line.strip() or _check_line(line) is False:
+            continue
+        record = _decode_line(line)
+        if isinstance(record, dict):
+            record.pop("crc", None)
+            records.append(record)
+    return records
+
+
+def _truncate_partial_record(path: Path) -> None:
+    """Drop a trailing record left half-written by a crash mid-append."""
+    size = path.stat().st_size
+    if size == 0:
+        return
+    with path.open("rb+") as handle:
+        handle.seek(size - 1)
+        if handle.read(1) == b"\n":
+            return
+        handle.seek(0)
+        data = handle.read()
+        handle.seek(0)
+        handle.truncate(data.rfind(b"\n") + 1)
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import heapq
+import json
+import sys
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, replace
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_EVENT_PAGE = 100
+MAX_EVENT_PAGE = 1000
+
+
+@dataclass(frozen=True)
+class EventQuery:
+    """A filtered walk over the event log: ``after_seq < seq < before_seq``.
+
+    ``kinds`` and ``actor`` narrow it down (empty / ``None`` match
+    everything); ``reverse`` walks newest first. A query is also a position:
+    ``following`` gives the query for the events after a page, and
+    ``to_cursor`` packs it into an opaque string for API clients.
+    """
+
+    after_seq: int = 0
+    before_seq: Optional[int] = None
+    kinds: FrozenSet[str] = frozenset()
+    actor: Optional[str] = None
+    reverse: bool = False
+
+    def accepts(self, kind: str, actor: str) -> bool:
+        return (not self.kinds or kind in self.kinds) and (
+            self.actor is None or actor == self.actor
+        )
+
+    def bounds(self, seqs: Sequence[int]) -> Tuple[int, int]:
+        """Positions ``[start, stop)`` of the sorted ``seqs`` inside the seq range."""
+        start = bisect_right(seqs, self.after_seq)
+        stop = len(seqs) if self.before_seq is None else bisect_left(seqs, self.before_seq)
+        return start, max(start, stop)
+
+    def following(self, seq: int) -> "EventQuery":
+        """The rest of this query once the event ``seq`` has been returned."""
+        if self.reverse:
+            return replace(self, before_seq=seq)
+        return replace(self, after_seq=seq)
+
+    def to_cursor(self) -> str:
+        data = {
+            "a": self.after_seq,
+            "b": self.before_seq,
+            "k": sorted(self.kinds),
+            "u": self.actor,
+            "r": self.reverse,
+        }
+        encoded = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(encoded).decode("ascii").rstrip("=")
+
+    @classmethod
+    def from_cursor(cls, cursor: str) -> "EventQuery":
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            before = data["b"]
+            actor = data["u"]
+            return cls(
+                after_seq=int(data["a"]),
+                before_seq=None if before is None else int(before),
+                kinds=frozenset(str(kind) for kind in data["k"]),
+                actor=None if actor is None else str(actor),
+                reverse=bool(data["r"]),
+            )
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError) as exc:
+            raise ValueError("Invalid event cursor") from exc
+
+
+class EventLabelIndex:
+    """Positions of the records in a seq-ordered list, grouped by ``kind`` and ``actor``.
+
+    Filtered queries walk only the positions listed under the kinds or actor
+    they ask for, whichever is shorter, instead of every record in range.
+    """
+
+    def __init__(self) -> None:
+        self.kinds: List[str] = []
+        self.actors: List[str] = []
+        self._by_kind: Dict[str, List[int]] = {}
+        self._by_actor: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def add(self, kind: str, actor: str) -> None:
+        position = len(self.kinds)
+        kind, actor = sys.intern(kind), sys.intern(actor)
+        self.kinds.append(kind)
+        self.actors.append(actor)
+        self._by_kind.setdefault(kind, []).append(position)
+        self._by_actor.setdefault(actor, []).append(position)
+
+    def matches(self, query: EventQuery, start: int, stop: int) -> Iterator[int]:
+        """Positions in ``[start, stop)`` whose labels match ``query``, in its order."""
+        candidates = self._candidates(query, start, stop)
+        if not query.kinds and query.actor is None:
+            return candidates
+        return (
+            position
+            for position in candidates
+            if query.accepts(self.kinds[position], self.actors[position])
+        )
+
+    def _candidates(self, query: EventQuery, start: int, stop: int) -> Iterator[int]:
+        lists: Optional[List[List[int]]] = None
+        if query.actor is not None:
+            lists = [self._by_actor.get(query.actor, [])]
+        if query.kinds:
+            by_kind = [self._by_kind.get(kind, []) for kind in query.kinds]
+            if lists is None or sum(map(len, by_kind)) < len(lists[0]):
+                lists = by_kind
+        if lists is None:
+            span = range(start, stop)
+            return iter(reversed(span) if query.reverse else span)
+        slices = [
+            positions[bisect_left(positions, start):bisect_left(positions, stop)]
+            for positions in lists
+        ]
+        if query.reverse:
+            return heapq.merge(*(reversed(part) for part in slices), reverse=True)
+        return heapq.merge(*slices)
+
+
+# Payload fields naming the entities an event is about, by entity type.
+ENTITY_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "quest": ("quest_id",),
+    "item": ("item_instance_id",),
+    "chat": ("chat_id",),
+    "contact": ("contact_id", "sender_contact_id"),
+    "message": ("message_id",),
+    "ability": ("ability_id",),
+}
+
+
+def entity_fields(entity_type: str) -> Tuple[str, ...]:
+    try:
+        return ENTITY_FIELDS[entity_type]
+    except KeyError:
+        raise ValueError(f"Unknown entity type: {entity_type}") from None
+
+
+class EntityIndex:
+    """Seqs of the events naming each entity in their payload, in log order."""
+
+    def __init__(self) -> None:
+        self._seqs: Dict[Tuple[str, str], List[int]] = {}
+
+    def add(self, seq: int, payload: Any) -> None:
+        if not isinstance(payload, dict):
+            return
+        for entity_type, fields in ENTITY_FIELDS.items():
+            ids = {payload.get(name) for name in fields}
+            for entity_id in ids:
+                if isinstance(entity_id, str) and entity_id:
+                    self._seqs.setdefault((entity_type, entity_id), []).append(seq)
+
+    def seqs(self, entity_type: str, entity_id: str) -> List[int]:
+        entity_fields(entity_type)
+        return list(self._seqs.get((entity_type, entity_id), ()))
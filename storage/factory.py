@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+from .checkpoints import retention_from_env
+from .codecs import codec_from_env
+from .durability import durability_from_env
+from .json_repo import JsonCampaignRepository
+from .jsonl_repo import JsonlCampaignRepository
+from .repo import CampaignRepository
+from .sqlite_repo import SqliteCampaignRepository, sqlite_paths_for
+
+DEFAULT_CAMPAIGN_PATH = "data/campaign.json"
+
+
+def repository_from_env(path: Optional[str] = None) -> CampaignRepository:
+    """The repository ``AETHER_STORAGE`` selects, at ``path`` or ``AETHER_CAMPAIGN_PATH``."""
+    if path is None:
+        path = os.getenv("AETHER_CAMPAIGN_PATH", DEFAULT_CAMPAIGN_PATH)
+    mode = os.getenv("AETHER_STORAGE", "json").strip().lower()
+    durability = durability_from_env()
+    retention = retention_from_env()
+    if mode == "json":
+        return JsonCampaignRepository(
+            path, durability=durability, codec=codec_from_env(), retention=retention
+        )
+    if mode == "jsonl":
+        return JsonlCampaignRepository(
+            path,
+            durability=durability,
+            retention=retention,
+            codec=codec_from_env(),
+        )
+    if mode == "sqlite":
+        db_path, json_path = sqlite_paths_for(path)
+        repo = SqliteCampaignRepository(db_path, durability=durability, retention=retention)
+        if json_path is not None:
+            repo.import_json_store(json_path)
+        return repo
+    raise ValueError(f"Unknown AETHER_STORAGE mode: {mode}")
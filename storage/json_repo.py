@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import json
+import threading
+from bisect import bisect_left, bisect_right
+from copy import deepcopy
 from dataclasses import asdict
 from datetime import datetime
-from json import JSONDecodeError
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from domain.events import EventLogEntry
 from domain.helpers import new_id, utcnow
@@ -32,6 +35,14 @@ from domain.models import (
     QuestInstance,
     QuestTemplate,
     Rarity,
+    SECTION_ABILITIES,
+    SECTION_CHARACTER,
+    SECTION_CHATS,
+    SECTION_CLASSES,
+    SECTION_MESSAGES,
+    SECTION_QUESTS,
+    SECTION_SETTINGS,
+    SECTION_TEMPLATES,
     SystemMessage,
     MessageTemplate,
     chat_link_from_dict,
@@ -41,156 +52,470 @@ from domain.models import (
 )
 from domain.rules import ClassPerLevelBonus, StatPointRule, XPCurveExponential
 
+from .checkpoints import Checkpoint, CheckpointStore, RetentionPolicy
+from .codecs import CodecError, JsonCodec, SnapshotContainer, decode_any
+from .compaction import CompactionReport, StoreCompaction, files_bytes, stale_temp_files
+from .durability import Durability
+from .event_query import EntityIndex, EventLabelIndex, EventQuery
+
 SCHEMA_VERSION = 1
+# Snapshot keys that make up each state section (see ``domain.models.STATE_SECTIONS``).
+SECTION_KEYS: Dict[str, Tuple[str, ...]] = {
+    SECTION_CHARACTER: ("character",),
+    SECTION_CLASSES: ("classes",),
+    SECTION_TEMPLATES: ("item_templates", "quest_templates", "message_templates"),
+    SECTION_ABILITIES: ("ability_categories", "abilities"),
+    SECTION_QUESTS: ("active_quests",),
+    SECTION_MESSAGES: ("system_messages",),
+    SECTION_CHATS: ("chats", "contacts", "friend_requests"),
+    SECTION_SETTINGS: ("settings",),
+}
 
 
 class JsonCampaignRepository:
-    def __init__(self, path: str | Path) -> None:
+    """Single-file JSON store.
+
+    The parsed store is kept in memory as the source of truth and written
+    through on every change; the file is re-read only when its mtime, inode or
+    size no longer match what this instance last saw. Writes replace the file
+    atomically according to ``durability`` and are encoded with ``codec``
+    (compact JSON by default); a file written by any other codec still loads.
+    With the ``container`` codec, reads that need only some snapshot sections
+    (``load`` among them) decode just those until the store is first written.
+    Commits copy the snapshot to ``<path stem>.checkpoints/`` every
+    ``retention.checkpoint_every`` events so ``state_at`` can replay from it;
+    a store that no longer loads is rebuilt from the newest of them and the
+    loss is described in ``<path stem>.recovery.json``.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        durability: Optional[Durability] = None,
+        codec: Optional[Any] = None,
+        retention: Optional[RetentionPolicy] = None,
+    ) -> None:
         self.path = Path(path)
+        self.durability = durability or Durability()
+        self.codec = codec or JsonCodec()
+        self.retention = retention or RetentionPolicy()
+        self.checkpoints = CheckpointStore(
+            self.path.with_suffix(".checkpoints"),
+            self.retention.keep_checkpoints,
+            self.durability,
+            self.codec,
+        )
+        # Reads run on several threads alongside the writer; the parsed store
+        # and the event caches are only read or rebuilt while holding this.
+        self._lock = threading.RLock()
+        self._store: Optional[Dict[str, Any]] = None
+        self._store_stamp: Optional[Tuple[int, int, int]] = None
+        self._events: Optional[List[EventLogEntry]] = None
+        self._event_seqs: List[int] = []
+        self._event_labels = EventLabelIndex()
+        self._entity_index = EntityIndex()
+        self._container: Optional[SnapshotContainer] = None
+        self._container_stamp: Optional[Tuple[int, int, int]] = None
 
     def load(self) -> CampaignState:
-        data = self._read_data()
-        return deserialize_campaign_state(data["snapshot"])
+        return LazyCampaignState(self._read_sections(EAGER_SNAPSHOT_KEYS), self._read_sections)
 
     def save(self, state: CampaignState) -> None:
-        data = self._read_data()
-        data["snapshot"] = serialize_campaign_state(state)
-        self._write_data(data)
+        with self._lock:
+            data = self._read_data()
+            data["snapshot"] = serialize_campaign_state(state)
+            self._write_data(data)
 
     def append_events(self, events: List[EventLogEntry]) -> List[EventLogEntry]:
-        if not events:
-            return []
-        data = self._read_data()
-        last_seq = int(data.get("last_seq", 0))
-        for event in events:
-            last_seq += 1
-            event.seq = last_seq
-            data["events"].append(event.to_dict())
-        data["last_seq"] = last_seq
-        self._write_data(data)
-        return events
+        with self._lock:
+            if not events:
+                return []
+            data = self._read_data()
+            self._append_to_store(data, events)
+            self._write_data(data)
+            return events
+
+    def commit(
+        self,
+        events: List[EventLogEntry],
+        state: CampaignState,
+        sections: Optional[Iterable[str]] = None,
+    ) -> List[EventLogEntry]:
+        """Persist ``events`` and the snapshot; with ``sections`` only those are reserialized."""
+        if sections is None:
+            return self.commit_snapshot(events, serialize_campaign_state(state))
+        snapshot = serialize_campaign_sections(state, snapshot_keys(sections))
+        return self.commit_snapshot(events, snapshot, partial=True)
+
+    def commit_snapshot(
+        self, events: List[EventLogEntry], snapshot: Dict[str, Any], partial: bool = False
+    ) -> List[EventLogEntry]:
+        """Like ``commit`` for a snapshot that is already serialized.
+
+        With ``partial`` the keys of ``snapshot`` replace the stored ones and
+        the rest of the stored snapshot is kept.
+        """
+        with self._lock:
+            with self.durability.commit():
+                data = self._read_data()
+                self._append_to_store(data, events)
+                if partial:
+                    data["snapshot"].update(snapshot)
+                else:
+                    data["snapshot"] = snapshot
+                self._write_data(data)
+            self._checkpoint_if_due(data["snapshot"])
+            return events
+
+    def state_at(self, seq: int) -> CampaignState:
+        """Rebuild the state as it was right after event ``seq``.
+
+        Replays the log from the nearest checkpoint at or before ``seq``;
+        raises ``ValueError`` when no such checkpoint is kept any more.
+        """
+        if seq >= self.get_last_seq():
+            return self.load()
+        checkpoint = self.nearest_checkpoint(seq)
+        if checkpoint is None:
+            raise ValueError(f"No checkpoint at or before seq {seq}")
+        # Imported lazily: the projection module builds on this one.
+        from .projection import replay_checkpoint
+
+        return replay_checkpoint(checkpoint, self.iter_events(checkpoint.seq), seq).state
+
+    def nearest_checkpoint(self, seq: int) -> Optional[Checkpoint]:
+        return self.checkpoints.nearest(seq)
 
     def list_events(self, after_seq: int = 0) -> List[EventLogEntry]:
-        data = self._read_data()
-        events: List[EventLogEntry] = []
-        for raw in data.get("events", []):
-            event = _safe_event_from_dict(raw)
-            if event:
-                events.append(event)
-        return [event for event in events if event.seq > after_seq]
+        with self._lock:
+            events = self._cached_events()
+            return events[bisect_right(self._event_seqs, after_seq):]
+
+    def iter_events(
+        self, after_seq: int = 0, limit: Optional[int] = None
+    ) -> Iterator[EventLogEntry]:
+        with self._lock:
+            events = self._cached_events()
+            start = bisect_right(self._event_seqs, after_seq)
+            stop = len(events) if limit is None else min(len(events), start + max(0, limit))
+            return islice(events, start, stop)
+
+    def query_events(self, query: EventQuery, limit: int) -> List[EventLogEntry]:
+        """At most ``limit`` events matching ``query``, found through the label index."""
+        with self._lock:
+            events = self._cached_events()
+            start, stop = query.bounds(self._event_seqs)
+            positions = self._event_labels.matches(query, start, stop)
+            return [events[position] for position in islice(positions, max(0, limit))]
+
+    def entity_events(self, entity_type: str, entity_id: str) -> List[EventLogEntry]:
+        """Every event naming the entity, oldest first, looked up by seq."""
+        with self._lock:
+            events = self._cached_events()
+            found: List[EventLogEntry] = []
+            for seq in self._entity_index.seqs(entity_type, entity_id):
+                position = bisect_left(self._event_seqs, seq)
+                if position < len(events) and self._event_seqs[position] == seq:
+                    found.append(events[position])
+            return found
+
+    def iter_event_lines(
+        self, after_seq: int = 0, max_seq: Optional[int] = None
+    ) -> Iterator[bytes]:
+        return _encode_event_lines(self.iter_events(after_seq), max_seq)
 
     def get_last_seq(self) -> int:
-        data = self._read_data()
-        try:
-            return int(data.get("last_seq", 0))
-        except (TypeError, ValueError):
-            return 0
+        with self._lock:
+            container = self._current_container()
+            data = container.meta if container is not None else self._read_data()
+            try:
+                return int(data.get("last_seq", 0))
+            except (TypeError, ValueError):
+                return 0
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        stats = self.durability.summary()
+        stats["checkpoints"] = self.checkpoints.seqs()
+        recovery = self.last_recovery()
+        if recovery is not None:
+            stats["recovery"] = recovery
+        return stats
+
+    def start_compaction(self) -> StoreCompaction:
+        """Rewrite the store and drop superseded checkpoints and leftover temp files."""
+        return StoreCompaction(self, "json")
+
+    def storage_bytes(self) -> int:
+        """Bytes the store takes on disk, checkpoints included."""
+        return files_bytes([self.path, self.checkpoints.directory])
+
+    def build_compaction(self, report: CompactionReport) -> Any:
+        """Stage a compaction alongside commits; see ``StoreCompaction``."""
+        # The whole store is one file rewritten by every commit: nothing to stage.
+        return None
+
+    def switch_compaction(self, plan: Any, report: CompactionReport) -> None:
+        """Install what ``build_compaction`` staged; runs where commits run."""
+        with self._lock:
+            data = self._read_data()
+            self._events = None
+            self._write_data(data)
+            report.checkpoints_dropped = self.checkpoints.prune()
+            for path in self._stale_files():
+                path.unlink(missing_ok=True)
+                report.files_removed.append(path.name)
 
     def export_data(self) -> Dict[str, Any]:
-        return self._read_data()
+        with self._lock:
+            return dict(self._read_data())
+
+    def export_snapshot(self) -> Dict[str, Any]:
+        return self._read_sections()
 
     def import_data(self, data: Dict[str, Any]) -> None:
-        if not isinstance(data, dict):
-            raise ValueError("Invalid import payload")
-        if "snapshot" not in data or not isinstance(data.get("snapshot"), dict):
-            raise ValueError("Missing snapshot")
-        normalized = self._ensure_schema(dict(data))
-        self._write_data(normalized)
+        with self._lock:
+            if not isinstance(data, dict):
+                raise ValueError("Invalid import payload")
+            if "snapshot" not in data or not isinstance(data.get("snapshot"), dict):
+                raise ValueError("Missing snapshot")
+            normalized = _ensure_store_schema(dict(data))
+            self._write_data(normalized)
+            self._reset_checkpoints(normalized["snapshot"])
 
     def export_templates(self) -> Dict[str, Any]:
-        data = self._read_data()
-        snapshot = data.get("snapshot", {})
-        if not isinstance(snapshot, dict):
-            snapshot = {}
+        sections = self._read_sections(SECTION_KEYS[SECTION_TEMPLATES])
         return {
-            "schema_version": data.get("schema_version", SCHEMA_VERSION),
-            "item_templates": _ensure_dict(snapshot.get("item_templates")),
-            "quest_templates": _ensure_dict(snapshot.get("quest_templates")),
-            "message_templates": _ensure_dict(snapshot.get("message_templates")),
+            "schema_version": SCHEMA_VERSION,
+            "item_templates": _ensure_dict(sections.get("item_templates")),
+            "quest_templates": _ensure_dict(sections.get("quest_templates")),
+            "message_templates": _ensure_dict(sections.get("message_templates")),
         }
 
     def import_templates(self, data: Dict[str, Any]) -> None:
-        if not isinstance(data, dict):
-            raise ValueError("Invalid templates payload")
-        store = self._read_data()
-        snapshot = store.get("snapshot", {})
-        if not isinstance(snapshot, dict):
-            snapshot = {}
-        snapshot["item_templates"] = _ensure_dict(data.get("item_templates"))
-        snapshot["quest_templates"] = _ensure_dict(data.get("quest_templates"))
-        snapshot["message_templates"] = _ensure_dict(data.get("message_templates"))
-        store["snapshot"] = snapshot
-        self._write_data(store)
+        with self._lock:
+            if not isinstance(data, dict):
+                raise ValueError("Invalid templates payload")
+            store = self._read_data()
+            snapshot = store.get("snapshot", {})
+            if not isinstance(snapshot, dict):
+                snapshot = {}
+            snapshot["item_templates"] = _ensure_dict(data.get("item_templates"))
+            snapshot["quest_templates"] = _ensure_dict(data.get("quest_templates"))
+            snapshot["message_templates"] = _ensure_dict(data.get("message_templates"))
+            store["snapshot"] = snapshot
+            self._write_data(store)
 
     def export_log(self) -> Dict[str, Any]:
-        data = self._read_data()
-        return {
-            "schema_version": data.get("schema_version", SCHEMA_VERSION),
-            "events": _ensure_list(data.get("events")),
-            "last_seq": data.get("last_seq", 0),
-        }
+        with self._lock:
+            data = self._read_data()
+            return {
+                "schema_version": data.get("schema_version", SCHEMA_VERSION),
+                "events": _ensure_list(data.get("events")),
+                "last_seq": data.get("last_seq", 0),
+            }
 
     def import_log(self, data: Dict[str, Any]) -> None:
-        if not isinstance(data, dict):
-            raise ValueError("Invalid log payload")
-        store = self._read_data()
-        events = [event for event in _ensure_list(data.get("events")) if isinstance(event, dict)]
-        last_seq = data.get("last_seq")
-        try:
-            last_seq_value = int(last_seq)
-        except (TypeError, ValueError):
-            last_seq_value = max(
-                (int(event.get("seq", 0)) for event in events if event.get("seq") is not None),
-                default=0,
-            )
-        store["events"] = events
-        store["last_seq"] = last_seq_value
-        self._write_data(store)
+        with self._lock:
+            if not isinstance(data, dict):
+                raise ValueError("Invalid log payload")
+            store = self._read_data()
+            events, last_seq_value = _normalize_log_payload(data)
+            store["events"] = events
+            store["last_seq"] = last_seq_value
+            self._write_data(store)
+            # The kept checkpoints describe the log that was just replaced.
+            self.checkpoints.clear()
+
+    def import_events_batch(self, records: List[Dict[str, Any]], reset: bool = False) -> int:
+        """Append already-numbered event records.
+
+        Each batch rewrites the whole file, as every write to this store does;
+        use the ``jsonl`` or ``sqlite`` backend for very large logs.
+        """
+        with self._lock:
+            data = self._read_data()
+            if reset:
+                data["events"] = []
+                data["last_seq"] = 0
+                self.checkpoints.clear()
+            last_seq = int(data.get("last_seq", 0))
+            fresh = [record for record in records if int(record["seq"]) > last_seq]
+            data["events"].extend(fresh)
+            if fresh:
+                data["last_seq"] = int(fresh[-1]["seq"])
+            self._events = None
+            self._write_data(data)
+            return int(data["last_seq"])
+
+    def finish_import(self, snapshot: Optional[Dict[str, Any]], last_seq: int) -> None:
+        with self._lock:
+            data = self._read_data()
+            if snapshot is not None:
+                data["snapshot"] = snapshot
+            data["last_seq"] = max(int(data.get("last_seq", 0)), int(last_seq))
+            self._write_data(data)
+            if snapshot is not None:
+                self._reset_checkpoints(snapshot)
 
     def export_chats(self) -> Dict[str, Any]:
-        data = self._read_data()
-        snapshot = data.get("snapshot", {})
-        if not isinstance(snapshot, dict):
-            snapshot = {}
+        sections = self._read_sections(SECTION_KEYS[SECTION_CHATS])
         return {
-            "schema_version": data.get("schema_version", SCHEMA_VERSION),
-            "contacts": _ensure_dict(snapshot.get("contacts")),
-            "chats": _ensure_dict(snapshot.get("chats")),
-            "friend_requests": _ensure_dict(snapshot.get("friend_requests")),
+            "schema_version": SCHEMA_VERSION,
+            "contacts": _ensure_dict(sections.get("contacts")),
+            "chats": _ensure_dict(sections.get("chats")),
+            "friend_requests": _ensure_dict(sections.get("friend_requests")),
         }
 
     def import_chats(self, data: Dict[str, Any]) -> None:
-        if not isinstance(data, dict):
-            raise ValueError("Invalid chats payload")
-        store = self._read_data()
-        snapshot = store.get("snapshot", {})
-        if not isinstance(snapshot, dict):
-            snapshot = {}
-        snapshot["contacts"] = _ensure_dict(data.get("contacts"))
-        snapshot["chats"] = _ensure_dict(data.get("chats"))
-        snapshot["friend_requests"] = _ensure_dict(data.get("friend_requests"))
-        store["snapshot"] = snapshot
-        self._write_data(store)
+        with self._lock:
+            if not isinstance(data, dict):
+                raise ValueError("Invalid chats payload")
+            store = self._read_data()
+            snapshot = store.get("snapshot", {})
+            if not isinstance(snapshot, dict):
+                snapshot = {}
+            snapshot["contacts"] = _ensure_dict(data.get("contacts"))
+            snapshot["chats"] = _ensure_dict(data.get("chats"))
+            snapshot["friend_requests"] = _ensure_dict(data.get("friend_requests"))
+            store["snapshot"] = snapshot
+            self._write_data(store)
+
+    def _append_to_store(self, data: Dict[str, Any], events: List[EventLogEntry]) -> None:
+        last_seq = int(data.get("last_seq", 0))
+        for event in events:
+            last_seq += 1
+            event.seq = last_seq
+            data["events"].append(event.to_dict())
+            if self._events is not None:
+                self._events.append(event)
+                self._event_seqs.append(event.seq)
+                self._event_labels.add(event.kind, event.actor)
+                self._entity_index.add(event.seq, event.payload)
+        data["last_seq"] = last_seq
+
+    def _checkpoint_if_due(self, snapshot: Dict[str, Any]) -> None:
+        last_seq = self.get_last_seq()
+        if last_seq - self.checkpoints.latest_seq() >= self.retention.checkpoint_every:
+            self.checkpoints.write(last_seq, snapshot)
+
+    def _reset_checkpoints(self, snapshot: Dict[str, Any]) -> None:
+        """Start the checkpoint history over from ``snapshot`` at the current ``last_seq``."""
+        self.checkpoints.clear()
+        self.checkpoints.write(self.get_last_seq(), snapshot)
+
+    def _cached_events(self) -> List[EventLogEntry]:
+        with self._lock:
+            data = self._read_data()
+            if self._events is None:
+                events: List[EventLogEntry] = []
+                for raw in data.get("events", []):
+                    event = _safe_event_from_dict(raw)
+                    if event:
+                        events.append(event)
+                events.sort(key=lambda event: event.seq)
+                self._events = events
+                self._event_seqs = [event.seq for event in events]
+                self._event_labels = EventLabelIndex()
+                self._entity_index = EntityIndex()
+                for event in events:
+                    self._event_labels.add(event.kind, event.actor)
+                    self._entity_index.add(event.seq, event.payload)
+            return self._events
+
+    def _read_sections(self, names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """The stored snapshot sections ``names`` (all of them for ``None``)."""
+        with self._lock:
+            container = self._current_container()
+            if container is not None:
+                try:
+                    return container.snapshot_sections(names)
+                except CodecError:
+                    pass  # ``_read_data`` below recovers the store.
+            snapshot = self._read_data()["snapshot"]
+            if names is None:
+                return dict(snapshot)
+            return {name: snapshot[name] for name in names if name in snapshot}
+
+    def _current_container(self) -> Optional[SnapshotContainer]:
+        """The store file opened as a container, while no parsed store is cached."""
+        with self._lock:
+            stamp = self._stat_stamp()
+            if stamp is None or (self._store is not None and self._store_stamp == stamp):
+                return None
+            if self._container_stamp != stamp:
+                self._container = None
+                self._container_stamp = stamp
+                try:
+                    self._container = SnapshotContainer.open(self.path)
+                except (OSError, ValueError):
+                    pass
+            return self._container
 
     def _read_data(self) -> Dict[str, Any]:
-        if not self.path.exists():
-            data = self._build_default_store()
-            self._write_data(data)
+        with self._lock:
+            # Stamped before reading: a write landing in between leaves a stale
+            # stamp, which only costs one more decode on the next call.
+            stamp = self._stat_stamp()
+            if self._store is not None and self._store_stamp == stamp:
+                return self._store
+            self._events = None
+            if not self.path.exists():
+                data = self._build_default_store()
+                self._write_data(data)
+                self._reset_checkpoints(data["snapshot"])
+                return data
+            try:
+                raw = self._decode_store()
+            except CodecError:
+                return self._recover_corrupt_store("undecodable store")
+            if not isinstance(raw, dict):
+                return self._recover_corrupt_store("root is not a dict")
+            data = _ensure_store_schema(raw)
+            if "snapshot" not in data or not isinstance(data.get("snapshot"), dict):
+                return self._recover_corrupt_store("missing snapshot")
+            self._store = data
+            self._store_stamp = stamp
             return data
+
+    def _write_data(self, data: Dict[str, Any], keys: Optional[Iterable[str]] = None) -> None:
+        with self._lock:
+            if data is not self._store:
+                self._events = None
+            # Some platforms refuse to replace a file that is still mapped.
+            self._container = None
+            self._container_stamp = None
+            try:
+                self._persist_store(data, keys)
+            except BaseException:
+                self._invalidate_cache()
+                raise
+            self._store = data
+            self._store_stamp = self._stat_stamp()
+
+    def _decode_store(self) -> Any:
+        return decode_any(self.path.read_bytes())
+
+    def _persist_store(self, data: Dict[str, Any], keys: Optional[Iterable[str]]) -> None:
+        # One file holds every section, so ``keys`` cannot narrow the write.
+        self.durability.write_atomic(self.path, self.codec.encode(data))
+
+    def _invalidate_cache(self) -> None:
+        self._store = None
+        self._store_stamp = None
+        self._events = None
+
+    def _stat_stamp(self) -> Optional[Tuple[int, int, int]]:
         try:
-            raw = json.loads(self.path.read_text(encoding="utf-8"))
-        except JSONDecodeError:
-            return self._recover_corrupt_store("invalid json")
-        if not isinstance(raw, dict):
-            return self._recover_corrupt_store("root is not a dict")
-        data = self._ensure_schema(raw)
-        if "snapshot" not in data or not isinstance(data.get("snapshot"), dict):
-            return self._recover_corrupt_store("missing snapshot")
-        return data
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
 
-    def _write_data(self, data: Dict[str, Any]) -> None:
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    def _stale_files(self) -> List[Path]:
+        owned = (self.path.name + ".", self.recovery_path.name + ".")
+        return stale_temp_files(self.path.parent, owned) + stale_temp_files(
+            self.checkpoints.directory
+        )
 
     def _build_default_store(self) -> Dict[str, Any]:
         state = create_default_campaign_state()
@@ -202,48 +527,79 @@ class JsonCampaignRepository:
         }
 
     def _recover_corrupt_store(self, reason: str) -> Dict[str, Any]:
-        if self.path.exists():
-            timestamp = utcnow().strftime("%Y%m%d%H%M%S")
-            backup_path = self.path.with_suffix(self.path.suffix + f".corrupt-{timestamp}")
-            backup_path.write_text(self.path.read_text(encoding="utf-8"), encoding="utf-8")
-        data = self._build_default_store()
+        """Restart from the newest readable checkpoint after the store failed to load.
+
+        The damaged file is copied aside first. Events live inside that file,
+        so the rebuilt store has no history and everything after the
+        checkpoint is lost; without a checkpoint the campaign starts over.
+        """
+        backup = self._backup_corrupt_store()
+        checkpoint = self.checkpoints.latest()
+        if checkpoint is None:
+            data = self._build_default_store()
+        else:
+            data = {
+                "schema_version": SCHEMA_VERSION,
+                "snapshot": checkpoint.snapshot,
+                "events": [],
+                "last_seq": checkpoint.seq,
+            }
         data["recovery_reason"] = reason
         self._write_data(data)
+        self._restart_checkpoints(checkpoint, data["snapshot"])
+        self._write_recovery_report(
+            reason,
+            backup,
+            checkpoint,
+            lost_after_seq=checkpoint.seq if checkpoint else 0,
+        )
         return data
 
-    def _ensure_schema(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        schema_version = data.get("schema_version")
-        try:
-            schema_version_int = int(schema_version)
-        except (TypeError, ValueError):
-            schema_version_int = 0
-        if schema_version_int < SCHEMA_VERSION:
-            data = self._migrate_schema(data, schema_version_int)
-        if "events" not in data or not isinstance(data.get("events"), list):
-            data["events"] = []
-        if "last_seq" not in data:
-            data["last_seq"] = 0
+    @property
+    def recovery_path(self) -> Path:
+        return self.path.with_suffix(".recovery.json")
+
+    def last_recovery(self) -> Optional[Dict[str, Any]]:
+        """The report written by the most recent corrupt-store recovery, if any."""
         try:
-            data["last_seq"] = int(data.get("last_seq", 0))
-        except (TypeError, ValueError):
-            data["last_seq"] = 0
-        data["schema_version"] = SCHEMA_VERSION
-        return data
+            report = decode_any(self.recovery_path.read_bytes())
+        except (FileNotFoundError, CodecError):
+            return None
+        return report if isinstance(report, dict) else None
 
-    def _migrate_schema(self, data: Dict[str, Any], from_version: int) -> Dict[str, Any]:
-        if from_version < 1:
-            if "snapshot" in data and isinstance(data.get("snapshot"), dict):
-                snapshot = data["snapshot"]
-                settings = snapshot.get("settings")
-                if not isinstance(settings, dict):
-                    settings = {}
-                if "sheet_sections" not in settings:
-                    settings["sheet_sections"] = [
-                        asdict(section) for section in default_sheet_sections()
-                    ]
-                snapshot["settings"] = settings
-                data["snapshot"] = snapshot
-        return data
+    def _backup_corrupt_store(self) -> Optional[str]:
+        if not self.path.exists():
+            return None
+        timestamp = utcnow().strftime("%Y%m%d%H%M%S")
+        backup_path = self.path.with_suffix(self.path.suffix + f".corrupt-{timestamp}")
+        backup_path.write_bytes(self.path.read_bytes())
+        return backup_path.name
+
+    def _restart_checkpoints(
+        self, checkpoint: Optional[Checkpoint], snapshot: Dict[str, Any]
+    ) -> None:
+        if checkpoint is None:
+            self._reset_checkpoints(snapshot)
+        else:
+            self.checkpoints.discard_after(checkpoint.seq)
+
+    def _write_recovery_report(
+        self,
+        reason: str,
+        backup: Optional[str],
+        checkpoint: Optional[Checkpoint],
+        **details: Any,
+    ) -> Dict[str, Any]:
+        report = {
+            "reason": reason,
+            "recovered_at": utcnow().isoformat(),
+            "backup": backup,
+            "checkpoint_seq": checkpoint.seq if checkpoint else None,
+            "last_seq": self.get_last_seq(),
+            **details,
+        }
+        self.durability.write_atomic(self.recovery_path, JsonCodec(indent=2).encode(report))
+        return report
 
 
 def create_default_campaign_state() -> CampaignState:
@@ -277,90 +633,138 @@ def create_default_campaign_state() -> CampaignState:
     )
 
 
+_SNAPSHOT_SERIALIZERS = {
+    "id": lambda state: state.id,
+    "character": lambda state: serialize_character(state.character),
+    "classes": lambda state: {
+        cid: serialize_class_def(cd) for cid, cd in state.classes.items()
+    },
+    "item_templates": lambda state: {
+        tid: serialize_item_template(tpl) for tid, tpl in state.item_templates.items()
+    },
+    "quest_templates": lambda state: {
+        qid: serialize_quest_template(tpl) for qid, tpl in state.quest_templates.items()
+    },
+    "message_templates": lambda state: {
+        mid: tpl.to_dict() for mid, tpl in state.message_templates.items()
+    },
+    "ability_categories": lambda state: {
+        cid: serialize_ability_category(cat)
+        for cid, cat in state.ability_categories.items()
+    },
+    "abilities": lambda state: {
+        aid: serialize_ability(ab) for aid, ab in state.abilities.items()
+    },
+    "active_quests": lambda state: [quest.to_dict() for quest in state.active_quests],
+    "system_messages": lambda state: [msg.to_dict() for msg in state.system_messages],
+    "chats": lambda state: {
+        cid: serialize_chat_thread(chat) for cid, chat in state.chats.items()
+    },
+    "contacts": lambda state: {
+        cid: serialize_chat_contact(contact) for cid, contact in state.contacts.items()
+    },
+    "friend_requests": lambda state: {
+        rid: serialize_friend_request(req) for rid, req in state.friend_requests.items()
+    },
+    "settings": lambda state: serialize_campaign_settings(state.settings),
+}
+
+
 def serialize_campaign_state(state: CampaignState) -> Dict[str, Any]:
+    return serialize_campaign_sections(state, _SNAPSHOT_SERIALIZERS)
+
+
+def serialize_campaign_sections(state: CampaignState, keys: Iterable[str]) -> Dict[str, Any]:
+    """Serialize only the snapshot ``keys`` of ``state``."""
+    keys = list(keys)
+    stored = state.stored_sections(keys) if isinstance(state, LazyCampaignState) else {}
     return {
-        "id": state.id,
-        "character": serialize_character(state.character),
-        "classes": {cid: serialize_class_def(cd) for cid, cd in state.classes.items()},
-        "item_templates": {
-            tid: serialize_item_template(tpl) for tid, tpl in state.item_templates.items()
-        },
-        "quest_templates": {
-            qid: serialize_quest_template(tpl) for qid, tpl in state.quest_templates.items()
-        },
-        "message_templates": {
-            mid: tpl.to_dict() for mid, tpl in state.message_templates.items()
-        },
-        "ability_categories": {
-            cid: serialize_ability_category(cat)
-            for cid, cat in state.ability_categories.items()
-        },
-        "abilities": {aid: serialize_ability(ab) for aid, ab in state.abilities.items()},
-        "active_quests": [quest.to_dict() for quest in state.active_quests],
-        "system_messages": [msg.to_dict() for msg in state.system_messages],
-        "chats": {cid: serialize_chat_thread(chat) for cid, chat in state.chats.items()},
-        "contacts": {
-            cid: serialize_chat_contact(contact) for cid, contact in state.contacts.items()
-        },
-        "friend_requests": {
-            rid: serialize_friend_request(req)
-            for rid, req in state.friend_requests.items()
-        },
-        "settings": serialize_campaign_settings(state.settings),
+        key: stored[key] if key in stored else _SNAPSHOT_SERIALIZERS[key](state) for key in keys
     }
 
 
+def snapshot_keys(sections: Iterable[str]) -> List[str]:
+    """Expand state section names into the snapshot keys they cover."""
+    keys: List[str] = []
+    for section in sections:
+        try:
+            keys.extend(SECTION_KEYS[section])
+        except KeyError:
+            raise ValueError(f"Unknown state section: {section}") from None
+    return keys
+
+
 def deserialize_campaign_state(data: Dict[str, Any]) -> CampaignState:
     if not isinstance(data, dict):
         data = {}
     return CampaignState(
         id=str(data.get("id", new_id("campaign"))),
-        character=deserialize_character(data.get("character", {})),
-        classes={
-            cid: deserialize_class_def(cd)
-            for cid, cd in data.get("classes", {}).items()
-        },
-        item_templates={
-            tid: deserialize_item_template(tpl)
-            for tid, tpl in data.get("item_templates", {}).items()
-        },
-        quest_templates={
-            qid: deserialize_quest_template(tpl)
-            for qid, tpl in data.get("quest_templates", {}).items()
-        },
-        message_templates={
-            mid: MessageTemplate.from_dict(tpl)
-            for mid, tpl in data.get("message_templates", {}).items()
-        },
-        ability_categories={
-            cid: deserialize_ability_category(cat)
-            for cid, cat in data.get("ability_categories", {}).items()
-        },
-        abilities={
-            aid: deserialize_ability(ab)
-            for aid, ab in data.get("abilities", {}).items()
-        },
-        active_quests=[
-            QuestInstance.from_dict(quest) for quest in data.get("active_quests", [])
-        ],
-        system_messages=[
-            SystemMessage.from_dict(msg) for msg in data.get("system_messages", [])
-        ],
-        chats={
-            cid: deserialize_chat_thread(chat) for cid, chat in data.get("chats", {}).items()
-        },
-        contacts={
-            cid: deserialize_chat_contact(contact)
-            for cid, contact in data.get("contacts", {}).items()
-        },
-        friend_requests={
-            rid: deserialize_friend_request(req)
-            for rid, req in data.get("friend_requests", {}).items()
-        },
-        settings=deserialize_campaign_settings(data.get("settings", {})),
+        **{key: _deserialize_section(key, data) for key in _SNAPSHOT_DESERIALIZERS},
     )
 
 
+# Built up front by ``LazyCampaignState``; every other snapshot key waits for first access.
+EAGER_SNAPSHOT_KEYS = ("id", "character", "classes", "settings")
+
+
+class LazyCampaignState(CampaignState):
+    """``CampaignState`` whose bulky sections are deserialized on first access.
+
+    ``loader`` returns stored snapshot sections by key (a repository's
+    ``_read_sections``). Until a lazy section is read it holds no objects at
+    all, and serializing it hands back the stored form unchanged. ``release``
+    drops materialized sections again; the caller must make sure their
+    changes were persisted first, since the next access reloads them.
+    """
+
+    def __init__(
+        self,
+        data: Dict[str, Any],
+        loader: Callable[[Tuple[str, ...]], Dict[str, Any]],
+    ) -> None:
+        # The dataclass __init__ would set every field; lazy ones must stay unset.
+        self.__dict__["_loader"] = loader
+        self.id = str(data.get("id", new_id("campaign")))
+        for key in EAGER_SNAPSHOT_KEYS[1:]:
+            setattr(self, key, _deserialize_section(key, data))
+
+    def __getattr__(self, name: str) -> Any:
+        if name not in LAZY_SNAPSHOT_KEYS:
+            raise AttributeError(name)
+        value = _deserialize_section(name, self._loader((name,)))
+        self.__dict__[name] = value
+        return value
+
+    def materialized(self) -> List[str]:
+        return [key for key in LAZY_SNAPSHOT_KEYS if key in self.__dict__]
+
+    def release(self, keys: Optional[Iterable[str]] = None) -> List[str]:
+        """Drop the objects of materialized lazy sections ``keys`` (all by default)."""
+        released: List[str] = []
+        for key in LAZY_SNAPSHOT_KEYS if keys is None else keys:
+            if key in LAZY_SNAPSHOT_KEYS and self.__dict__.pop(key, None) is not None:
+                released.append(key)
+        return released
+
+    def stored_sections(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """The stored form of those ``keys`` that were never materialized."""
+        pending = tuple(
+            key for key in keys if key in LAZY_SNAPSHOT_KEYS and key not in self.__dict__
+        )
+        if not pending:
+            return {}
+        stored = self._loader(pending)
+        return {key: stored.get(key, _empty_section(key)) for key in pending}
+
+
+def _deserialize_section(key: str, data: Dict[str, Any]) -> Any:
+    return _SNAPSHOT_DESERIALIZERS[key](data.get(key, _empty_section(key)))
+
+
+def _empty_section(key: str) -> Any:
+    return [] if key in ("active_quests", "system_messages") else {}
+
+
 def serialize_campaign_settings(settings: CampaignSettings) -> Dict[str, Any]:
     return {
         "xp_curve": {
@@ -403,10 +807,10 @@ def serialize_character(character: Character) -> Dict[str, Any]:
         "level": character.level,
         "xp": character.xp,
         "unspent_stat_points": character.unspent_stat_points,
-        "stats": character.stats,
+        "stats": dict(character.stats),
         "resources": {k: list(v) for k, v in character.resources.items()},
-        "currencies": character.currencies,
-        "reputations": character.reputations,
+        "currencies": dict(character.currencies),
+        "reputations": dict(character.reputations),
         "equipment": serialize_equipment(character.equipment),
         "inventory": serialize_inventory(character.inventory),
         "abilities": {aid: serialize_ability(ab) for aid, ab in character.abilities.items()},
@@ -487,7 +891,7 @@ def serialize_item_instance(inst: ItemInstance) -> Dict[str, Any]:
         "qty": inst.qty,
         "custom_name": inst.custom_name,
         "bound": inst.bound,
-        "meta": inst.meta,
+        "meta": deepcopy(inst.meta),
     }
 
 
@@ -514,7 +918,7 @@ def serialize_item_template(template: ItemTemplate) -> Dict[str, Any]:
         "icon_key": template.icon_key,
         "equip_slots": [slot.value for slot in template.equip_slots],
         "two_handed": template.two_handed,
-        "stat_mods": template.stat_mods,
+        "stat_mods": dict(template.stat_mods),
         "granted_ability_ids": list(template.granted_ability_ids),
         "tags": list(template.tags),
     }
@@ -559,7 +963,7 @@ def serialize_class_def(class_def: ClassDefinition) -> Dict[str, Any]:
         "description": class_def.description,
         "allowed_item_types": [t.value for t in class_def.allowed_item_types],
         "allowed_slots": [s.value for s in class_def.allowed_slots],
-        "per_level_bonus": class_def.per_level_bonus.per_level_stat_delta,
+        "per_level_bonus": dict(class_def.per_level_bonus.per_level_stat_delta),
     }
 
 
@@ -597,7 +1001,7 @@ def serialize_quest_template(template: QuestTemplate) -> Dict[str, Any]:
         "description": template.description,
         "cannot_decline": template.cannot_decline,
         "objectives": [serialize_objective(obj) for obj in template.objectives],
-        "rewards": template.rewards,
+        "rewards": deepcopy(template.rewards),
     }
 
 
@@ -689,7 +1093,7 @@ def serialize_chat_contact(contact: ChatContact) -> Dict[str, Any]:
     return {
         "id": contact.id,
         "display_name": contact.display_name,
-        "link_payload": contact.link_payload,
+        "link_payload": deepcopy(contact.link_payload),
     }
 
 
@@ -787,6 +1191,38 @@ def datetime_from_iso(value: str) -> Any:
     return datetime.fromisoformat(value)
 
 
+_SNAPSHOT_DESERIALIZERS: Dict[str, Callable[[Any], Any]] = {
+    "character": deserialize_character,
+    "classes": lambda raw: {cid: deserialize_class_def(cd) for cid, cd in raw.items()},
+    "item_templates": lambda raw: {
+        tid: deserialize_item_template(tpl) for tid, tpl in raw.items()
+    },
+    "quest_templates": lambda raw: {
+        qid: deserialize_quest_template(tpl) for qid, tpl in raw.items()
+    },
+    "message_templates": lambda raw: {
+        mid: MessageTemplate.from_dict(tpl) for mid, tpl in raw.items()
+    },
+    "ability_categories": lambda raw: {
+        cid: deserialize_ability_category(cat) for cid, cat in raw.items()
+    },
+    "abilities": lambda raw: {aid: deserialize_ability(ab) for aid, ab in raw.items()},
+    "active_quests": lambda raw: [QuestInstance.from_dict(quest) for quest in raw],
+    "system_messages": lambda raw: [SystemMessage.from_dict(msg) for msg in raw],
+    "chats": lambda raw: {cid: deserialize_chat_thread(chat) for cid, chat in raw.items()},
+    "contacts": lambda raw: {
+        cid: deserialize_chat_contact(contact) for cid, contact in raw.items()
+    },
+    "friend_requests": lambda raw: {
+        rid: deserialize_friend_request(req) for rid, req in raw.items()
+    },
+    "settings": deserialize_campaign_settings,
+}
+LAZY_SNAPSHOT_KEYS = tuple(
+    key for key in _SNAPSHOT_DESERIALIZERS if key not in EAGER_SNAPSHOT_KEYS
+)
+
+
 def _safe_event_from_dict(data: Any) -> EventLogEntry | None:
     if not isinstance(data, dict):
         return None
@@ -796,6 +1232,65 @@ def _safe_event_from_dict(data: Any) -> EventLogEntry | None:
         return None
 
 
+def _ensure_store_schema(data: Dict[str, Any]) -> Dict[str, Any]:
+    schema_version = data.get("schema_version")
+    try:
+        schema_version_int = int(schema_version)
+    except (TypeError, ValueError):
+        schema_version_int = 0
+    if schema_version_int < SCHEMA_VERSION:
+        data = _migrate_store_schema(data, schema_version_int)
+    if "events" not in data or not isinstance(data.get("events"), list):
+        data["events"] = []
+    if "last_seq" not in data:
+        data["last_seq"] = 0
+    try:
+        data["last_seq"] = int(data.get("last_seq", 0))
+    except (TypeError, ValueError):
+        data["last_seq"] = 0
+    data["schema_version"] = SCHEMA_VERSION
+    return data
+
+
+def _migrate_store_schema(data: Dict[str, Any], from_version: int) -> Dict[str, Any]:
+    if from_version < 1:
+        if "snapshot" in data and isinstance(data.get("snapshot"), dict):
+            snapshot = data["snapshot"]
+            settings = snapshot.get("settings")
+            if not isinstance(settings, dict):
+                settings = {}
+            if "sheet_sections" not in settings:
+                settings["sheet_sections"] = [
+                    asdict(section) for section in default_sheet_sections()
+                ]
+            snapshot["settings"] = settings
+            data["snapshot"] = snapshot
+    return data
+
+
+def _normalize_log_payload(data: Dict[str, Any]) -> tuple[List[Dict[str, Any]], int]:
+    events = [event for event in _ensure_list(data.get("events")) if isinstance(event, dict)]
+    last_seq = data.get("last_seq")
+    try:
+        last_seq_value = int(last_seq)
+    except (TypeError, ValueError):
+        last_seq_value = max(
+            (int(event.get("seq", 0)) for event in events if event.get("seq") is not None),
+            default=0,
+        )
+    return events, last_seq_value
+
+
+def _encode_event_lines(
+    events: Iterable[EventLogEntry], max_seq: Optional[int] = None
+) -> Iterator[bytes]:
+    for event in events:
+        if max_seq is not None and event.seq > max_seq:
+            return
+        line = json.dumps(event.to_dict(), ensure_ascii=False, separators=(",", ":"))
+        yield line.encode("utf-8") + b"\n"
+
+
 def _ensure_dict(value: Any) -> Dict[str, Any]:
     if isinstance(value, dict):
         return dict(value)
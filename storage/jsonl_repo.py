@@ -0,0 +1,409 @@
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from domain.events import EventLogEntry
+from domain.models import CampaignState
+
+from .checkpoints import RetentionPolicy
+from .codecs import CodecError, decode_any
+from .compaction import CompactionReport, StoreCompaction, files_bytes, stale_temp_files
+from .durability import Durability
+from .event_log import DEFAULT_SEGMENT_EVENTS, EventLog, LogCompaction
+from .event_query import EventQuery
+from .json_repo import (
+    SCHEMA_VERSION,
+    JsonCampaignRepository,
+    LazyCampaignState,
+    _ensure_list,
+    _ensure_store_schema,
+    _normalize_log_payload,
+    create_default_campaign_state,
+    deserialize_campaign_state,
+    serialize_campaign_sections,
+    serialize_campaign_state,
+    snapshot_keys,
+)
+
+SHARD_SUFFIX = ".json"
+_SHARD_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+
+
+class JsonlCampaignRepository(JsonCampaignRepository):
+    """Sharded snapshot plus an append-only JSON Lines event log.
+
+    Each top-level snapshot key is its own file in ``<path stem>.sections/``
+    and ``path`` is a small manifest listing them with ``last_seq``; events
+    live in ``<path stem>.events/``. Appending an event never rewrites the
+    snapshot, and a commit that names its dirty sections rewrites only their
+    shards and the manifest. Shards are written before the manifest, so after
+    a crash a shard may be ahead of the manifest's ``last_seq`` but never
+    half-written; ``load`` then replays the missing events onto the stale
+    shards and keeps the ones that were already written.
+    Commits write a checkpoint to ``<path stem>.checkpoints/`` every
+    ``retention.checkpoint_every`` events and archive sealed segments that
+    fall outside the retention window, compressed per
+    ``retention.archive_compression``. A manifest or shard that no longer
+    decodes is rebuilt from the newest checkpoint and the intact events.
+    A store written by ``JsonCampaignRepository`` is migrated on first access.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        segment_events: int = DEFAULT_SEGMENT_EVENTS,
+        durability: Optional[Durability] = None,
+        retention: Optional[RetentionPolicy] = None,
+        codec: Optional[Any] = None,
+    ) -> None:
+        super().__init__(path, durability, codec, retention)
+        self.log = EventLog(
+            self.path.with_suffix(".events"),
+            segment_events,
+            self.durability,
+            compression=self.retention.archive_compression,
+        )
+        self.shards = self.path.with_suffix(".sections")
+        self._shard_seqs: Dict[str, int] = {}
+        self._layout_checked = False
+
+    def load(self) -> CampaignState:
+        with self._lock:
+            data = self._read_data()
+            snapshot_seq = int(data.get("last_seq", 0))
+            if snapshot_seq >= self.log.last_seq:
+                return LazyCampaignState(data["snapshot"], self._read_sections)
+            state = deserialize_campaign_state(data["snapshot"])
+            return self._recover_snapshot(state, snapshot_seq)
+
+    def append_events(self, events: List[EventLogEntry]) -> List[EventLogEntry]:
+        self._ensure_layout()
+        return self.log.append(events)
+
+    def save(self, state: CampaignState) -> None:
+        with self._lock:
+            self._ensure_layout()
+            self._write_data(self._build_snapshot_store(state))
+
+    def commit(
+        self,
+        events: List[EventLogEntry],
+        state: CampaignState,
+        sections: Optional[Iterable[str]] = None,
+    ) -> List[EventLogEntry]:
+        """Append ``events`` to the log, then write the snapshot tagged with their ``last_seq``.
+
+        With ``sections`` only those shards are reserialized and rewritten.
+        A crash between the two steps leaves a snapshot whose ``last_seq`` lags
+        the log, which ``load`` repairs on the next start.
+        """
+        if sections is None:
+            return self.commit_snapshot(events, serialize_campaign_state(state))
+        snapshot = serialize_campaign_sections(state, snapshot_keys(sections))
+        return self.commit_snapshot(events, snapshot, partial=True)
+
+    def commit_snapshot(
+        self, events: List[EventLogEntry], snapshot: Dict[str, Any], partial: bool = False
+    ) -> List[EventLogEntry]:
+        with self._lock:
+            self._ensure_layout()
+            with self.durability.commit():
+                persisted = self.log.append(events)
+                if partial:
+                    keys: Optional[List[str]] = list(snapshot)
+                    store = dict(self._read_data())
+                    store["snapshot"] = {**store["snapshot"], **snapshot}
+                else:
+                    keys = None
+                    store = {"schema_version": SCHEMA_VERSION, "snapshot": snapshot}
+                self._write_data(store, keys)
+            self._maintain_log(store["snapshot"])
+            return persisted
+
+    def list_events(self, after_seq: int = 0) -> List[EventLogEntry]:
+        self._ensure_layout()
+        return self.log.read(after_seq)
+
+    def iter_events(
+        self, after_seq: int = 0, limit: Optional[int] = None
+    ) -> Iterator[EventLogEntry]:
+        self._ensure_layout()
+        return self.log.iter(after_seq, limit)
+
+    def query_events(self, query: EventQuery, limit: int) -> List[EventLogEntry]:
+        self._ensure_layout()
+        return self.log.query(query, limit)
+
+    def entity_events(self, entity_type: str, entity_id: str) -> List[EventLogEntry]:
+        self._ensure_layout()
+        return self.log.entity_events(entity_type, entity_id)
+
+    def iter_event_lines(
+        self, after_seq: int = 0, max_seq: Optional[int] = None
+    ) -> Iterator[Any]:
+        self._ensure_layout()
+        return self.log.iter_event_lines(after_seq, max_seq)
+
+    def get_last_seq(self) -> int:
+        self._ensure_layout()
+        return self.log.last_seq
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        stats = super().get_storage_stats()
+        stats["backend"] = "jsonl"
+        stats["hot_segments"] = len(self.log.segment_paths())
+        stats["archived_segments"] = len(self.log.archive_paths())
+        stats["archive_bytes"] = self.log.archive_bytes()
+        stats["archive_compression"] = self.log.compression
+        return stats
+
+    def start_compaction(self) -> StoreCompaction:
+        """Also merge small sealed segments, rebuild their indexes and drop orphaned shards."""
+        return StoreCompaction(self, "jsonl")
+
+    def storage_bytes(self) -> int:
+        return super().storage_bytes() + files_bytes([self.shards, self.log.directory])
+
+    def build_compaction(self, report: CompactionReport) -> LogCompaction:
+        self._ensure_layout()
+        return self.log.stage_compaction()
+
+    def switch_compaction(self, plan: LogCompaction, report: CompactionReport) -> None:
+        self.log.switch_compaction(plan)
+        report.segments_merged = plan.merged
+        report.segments_skipped = plan.skipped
+        super().switch_compaction(plan, report)
+        report.indexes_rebuilt += plan.reindexed
+
+    def export_data(self) -> Dict[str, Any]:
+        with self._lock:
+            data = dict(self._read_data())
+            data["events"] = self.log.read_raw()
+            data["last_seq"] = self.log.last_seq
+            return data
+
+    def import_data(self, data: Dict[str, Any]) -> None:
+        with self._lock:
+            if not isinstance(data, dict):
+                raise ValueError("Invalid import payload")
+            if "snapshot" not in data or not isinstance(data.get("snapshot"), dict):
+                raise ValueError("Missing snapshot")
+            self._ensure_layout()
+            normalized = _ensure_store_schema(dict(data))
+            events, last_seq = _normalize_log_payload(normalized)
+            self._replace_log(events, last_seq)
+            self._write_data(normalized)
+            self._reset_checkpoints(normalized["snapshot"])
+
+    def export_log(self) -> Dict[str, Any]:
+        self._ensure_layout()
+        return {
+            "schema_version": SCHEMA_VERSION,
+            "events": self.log.read_raw(),
+            "last_seq": self.log.last_seq,
+        }
+
+    def import_log(self, data: Dict[str, Any]) -> None:
+        with self._lock:
+            if not isinstance(data, dict):
+                raise ValueError("Invalid log payload")
+            self._ensure_layout()
+            events, last_seq = _normalize_log_payload(data)
+            self._replace_log(events, last_seq)
+            self._write_data(self._read_data())
+
+    def import_events_batch(self, records: List[Dict[str, Any]], reset: bool = False) -> int:
+        """Append already-numbered event records straight to the log."""
+        with self._lock:
+            self._ensure_layout()
+            if reset:
+                self._replace_log([], 0)
+            self.log.append_records(records)
+            return self.log.last_seq
+
+    def finish_import(self, snapshot: Optional[Dict[str, Any]], last_seq: int) -> None:
+        with self._lock:
+            self._ensure_layout()
+            self.log.raise_last_seq(last_seq)
+            if snapshot is None:
+                self._write_data(self._read_data())
+            else:
+                self._write_data({"schema_version": SCHEMA_VERSION, "snapshot": snapshot})
+                self._reset_checkpoints(snapshot)
+
+    def _recover_snapshot(self, state: CampaignState, snapshot_seq: int) -> CampaignState:
+        """Bring a snapshot left behind by an interrupted commit up to the log.
+
+        Shards tagged past the manifest were written by that commit and are
+        kept as they are; every other section is rebuilt by replaying the
+        events the manifest has not seen.
+        """
+        from .projection import replay_events
+
+        result = replay_events(state, self.log.iter(snapshot_seq), base_seq=snapshot_seq)
+        written = self._read_data()["snapshot"]
+        snapshot = serialize_campaign_state(result.state)
+        for key, seq in self._shard_seqs.items():
+            if seq > snapshot_seq and key in written:
+                snapshot[key] = written[key]
+        self._write_data({"schema_version": SCHEMA_VERSION, "snapshot": snapshot})
+        return deserialize_campaign_state(snapshot)
+
+    def _recover_corrupt_store(self, reason: str) -> Dict[str, Any]:
+        """Rebuild the snapshot from what survived instead of starting over.
+
+        The newest readable checkpoint is brought up to the log by replaying
+        the intact events after it, then every shard that still decodes is
+        laid over the result unless the last commit stopped before writing
+        its shards. Records failing their checksum are skipped and
+        listed in the report, so both the work and the loss follow the
+        damage rather than the size of the campaign.
+        """
+        from .projection import replay_checkpoint, replay_events
+
+        backup = self._backup_corrupt_store()
+        checkpoint = self.checkpoints.latest()
+        if checkpoint is None:
+            result = replay_events(create_default_campaign_state(), self.log.iter())
+        else:
+            result = replay_checkpoint(checkpoint, self.log.iter(checkpoint.seq))
+        snapshot = serialize_campaign_state(result.state)
+        shards = self._intact_shards(snapshot)
+        if max((int(shard.get("last_seq", 0)) for shard in shards.values()), default=0) < (
+            self.log.last_seq
+        ):
+            # The last commit never wrote its shards, so which ones are stale is unknown.
+            shards = {}
+        for key, shard in shards.items():
+            snapshot[key] = shard["data"]
+        store = {"schema_version": SCHEMA_VERSION, "snapshot": snapshot, "recovery_reason": reason}
+        self._write_data(store)
+        self._restart_checkpoints(checkpoint, snapshot)
+        damaged = self.log.damaged_records()
+        self._write_recovery_report(
+            reason,
+            backup,
+            checkpoint,
+            replayed=result.applied,
+            skipped_seqs=result.skipped,
+            sections_from_shards=sorted(shards),
+            damaged_records=[record.to_dict() for record in damaged],
+            lost_seqs=sorted({record.seq for record in damaged if record.seq is not None}),
+        )
+        return store
+
+    def _intact_shards(self, snapshot: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        shards: Dict[str, Dict[str, Any]] = {}
+        for key in snapshot:
+            try:
+                shard = decode_any(self._shard_path(key).read_bytes())
+            except (FileNotFoundError, ValueError):
+                continue
+            if isinstance(shard, dict) and "data" in shard:
+                shards[key] = shard
+        return shards
+
+    def _replace_log(self, records: List[Dict[str, Any]], last_seq: int) -> None:
+        self.log.replace(records, last_seq)
+        self.checkpoints.clear()
+
+    def _maintain_log(self, snapshot: Dict[str, Any]) -> None:
+        self._checkpoint_if_due(snapshot)
+        if not self.retention.archives:
+            return
+        max_seq = self.checkpoints.latest_seq()
+        hot_after = self.retention.hot_after_seq(self.log.last_seq)
+        if hot_after is not None:
+            max_seq = min(max_seq, hot_after)
+        self.log.archive(max_seq, self.retention.hot_since())
+
+    def _stale_files(self) -> List[Path]:
+        stale = super()._stale_files()
+        for directory in (self.shards, self.log.directory, self.log.archive_directory):
+            stale.extend(stale_temp_files(directory))
+        if self.shards.is_dir():
+            sections = set(self._read_data()["snapshot"])
+            stale.extend(
+                path
+                for path in sorted(self.shards.glob(f"*{SHARD_SUFFIX}"))
+                if path.name[: -len(SHARD_SUFFIX)] not in sections
+            )
+        return stale
+
+    def _build_snapshot_store(self, state: CampaignState) -> Dict[str, Any]:
+        return {
+            "schema_version": SCHEMA_VERSION,
+            "snapshot": serialize_campaign_state(state),
+        }
+
+    def _read_data(self) -> Dict[str, Any]:
+        self._ensure_layout()
+        data = super()._read_data()
+        data.pop("events", None)
+        return data
+
+    def _write_data(self, data: Dict[str, Any], keys: Optional[Iterable[str]] = None) -> None:
+        data = {key: value for key, value in data.items() if key != "events"}
+        data["last_seq"] = self.log.last_seq
+        super()._write_data(data, keys)
+
+    def _persist_store(self, data: Dict[str, Any], keys: Optional[Iterable[str]]) -> None:
+        snapshot = data.get("snapshot") or {}
+        for key in snapshot if keys is None else keys:
+            if key in snapshot:
+                shard = {"last_seq": data["last_seq"], "data": snapshot[key]}
+                self.durability.write_atomic(self._shard_path(key), self.codec.encode(shard))
+                self._shard_seqs[key] = data["last_seq"]
+        manifest = {key: value for key, value in data.items() if key != "snapshot"}
+        manifest["sections"] = list(snapshot)
+        super()._persist_store(manifest, None)
+
+    def _decode_store(self) -> Any:
+        raw = super()._decode_store()
+        if not isinstance(raw, dict) or "sections" not in raw:
+            # A whole-snapshot file from before sharding; the next write splits it.
+            return raw
+        snapshot: Dict[str, Any] = {}
+        self._shard_seqs = {}
+        for key in _ensure_list(raw.pop("sections")):
+            try:
+                shard = decode_any(self._shard_path(key).read_bytes())
+            except (FileNotFoundError, ValueError) as exc:
+                raise CodecError(f"Unreadable snapshot section: {key}") from exc
+            if not isinstance(shard, dict) or "data" not in shard:
+                raise CodecError(f"Invalid snapshot section: {key}")
+            snapshot[key] = shard["data"]
+            self._shard_seqs[key] = int(shard.get("last_seq", 0))
+        raw["snapshot"] = snapshot
+        return raw
+
+    def _shard_path(self, key: str) -> Path:
+        if not _SHARD_NAME.match(str(key)):
+            raise ValueError(f"Invalid snapshot section name: {key}")
+        return self.shards / f"{key}{SHARD_SUFFIX}"
+
+    def _ensure_layout(self) -> None:
+        """Move events out of a single-file store into the log, once."""
+        with self._lock:
+            if self._layout_checked:
+                return
+            self._layout_checked = True
+            if not self.path.exists():
+                return
+            try:
+                raw = decode_any(self.path.read_bytes())
+            except CodecError:
+                return
+            if not isinstance(raw, dict):
+                return
+            events, last_seq = _normalize_log_payload(raw)
+            if "events" not in raw:
+                self.log.raise_last_seq(last_seq)
+                return
+            if self.log.is_empty():
+                self.log.replace(events, last_seq)
+            else:
+                self.log.raise_last_seq(last_seq)
+            self._write_data(raw)
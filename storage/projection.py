@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from domain.errors import DomainError
+from domain.events import EventKind, EventLogEntry
+from domain.models import (
+    CampaignState,
+    ChatContact,
+    ChatMessage,
+    ChatThread,
+    ClassDefinition,
+    EquipmentSlot,
+    FriendRequest,
+    ItemInstance,
+    MessageTemplate,
+    QuestInstance,
+    SystemMessage,
+    chat_link_from_dict,
+    normalize_sheet_sections,
+)
+from domain.rules import StatPointRule, XPCurveExponential
+from domain.services import equip_item, grant_levels, grant_xp_and_level
+
+from .checkpoints import Checkpoint
+from .json_repo import deserialize_ability, deserialize_campaign_state, deserialize_item_template
+
+
+@dataclass
+class ReplayResult:
+    state: CampaignState
+    last_seq: int
+    applied: int = 0
+    skipped: List[int] = field(default_factory=list)
+
+
+def replay_events(
+    state: CampaignState,
+    events: Iterable[EventLogEntry],
+    until_seq: Optional[int] = None,
+    base_seq: int = 0,
+) -> ReplayResult:
+    """Apply ``events`` to ``state`` in order, stopping after ``until_seq``.
+
+    ``state`` is modified in place. Events whose kind is unknown or whose
+    payload no longer fits the state are recorded in ``skipped`` rather than
+    aborting the replay.
+    """
+    result = ReplayResult(state=state, last_seq=base_seq)
+    for event in events:
+        if until_seq is not None and event.seq > until_seq:
+            break
+        if apply_event(state, event):
+            result.applied += 1
+        else:
+            result.skipped.append(event.seq)
+        result.last_seq = event.seq
+    return result
+
+
+def replay_checkpoint(
+    checkpoint: Checkpoint,
+    events: Iterable[EventLogEntry],
+    until_seq: Optional[int] = None,
+) -> ReplayResult:
+    """Materialize the state as of ``until_seq`` starting from ``checkpoint``.
+
+    ``events`` must start after ``checkpoint.seq``.
+    """
+    state = deserialize_campaign_state(checkpoint.snapshot)
+    return replay_events(state, events, until_seq, base_seq=checkpoint.seq)
+
+
+def apply_event(state: CampaignState, event: EventLogEntry) -> bool:
+    handler = _HANDLERS.get(event.kind)
+    if handler is None:
+        return False
+    try:
+        handler(state, event.payload, event)
+    except (DomainError, KeyError, TypeError, ValueError):
+        return False
+    return True
+
+
+def _class_def(state: CampaignState) -> ClassDefinition:
+    class_id = state.character.class_id
+    return state.classes.get(class_id) or ClassDefinition(id=class_id, name=class_id)
+
+
+def _xp_granted(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    grant_xp_and_level(
+        state.character,
+        int(payload["amount"]),
+        state.settings.xp_curve,
+        state.settings.stat_rule,
+        _class_def(state),
+    )
+
+
+def _level_up(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    # Levels reached through ``xp.granted`` were already applied by that event.
+    levels = int(payload["new_level"]) - state.character.level
+    if levels > 0:
+        grant_levels(state.character, levels, state.settings.stat_rule, _class_def(state))
+
+
+def _inventory_added(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    inst_id = str(payload["item_instance_id"])
+    if state.character.inventory.get(inst_id) is None:
+        state.character.inventory.add(
+            ItemInstance(
+                id=inst_id,
+                template_id=str(payload["template_id"]),
+                qty=int(payload.get("qty", 1)),
+                custom_name=payload.get("custom_name"),
+            )
+        )
+
+
+def _inventory_removed(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    inst_id = str(payload["item_instance_id"])
+    slots = state.character.equipment.slots
+    for slot, equipped_id in list(slots.items()):
+        if equipped_id == inst_id:
+            slots[slot] = None
+    state.character.inventory.remove(inst_id)
+
+
+def _equipment_equipped(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    inst_id = str(payload["item_instance_id"])
+    slot = EquipmentSlot(payload["slot"])
+    try:
+        equip_item(state.character, _class_def(state), state.item_templates, inst_id, slot)
+    except DomainError:
+        # The rules may have changed since; the event records what happened.
+        state.character.equipment.slots[slot] = inst_id
+
+
+def _equipment_unequipped(
+    state: CampaignState, payload: Dict[str, Any], event: EventLogEntry
+) -> None:
+    slot = EquipmentSlot(payload["slot"])
+    slots = state.character.equipment.slots
+    if slots.get(slot) == payload.get("item_instance_id"):
+        slots[slot] = None
+
+
+def _quest_changed(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    quest = QuestInstance.from_dict(payload["quest"])
+    _upsert_by_id(state.active_quests, quest)
+
+
+def _message_changed(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    message = SystemMessage.from_dict(payload["message"])
+    _upsert_by_id(state.system_messages, message)
+
+
+def _player_frozen(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    state.character.frozen = bool(payload["frozen"])
+
+
+def _currency_updated(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    state.character.currencies[str(payload["currency_id"])] = int(payload["new_value"])
+
+
+def _resource_updated(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    state.character.resources[str(payload["resource_id"])] = (
+        int(payload["current"]),
+        int(payload["max"]),
+    )
+
+
+def _reputation_updated(
+    state: CampaignState, payload: Dict[str, Any], event: EventLogEntry
+) -> None:
+    state.character.reputations[str(payload["reputation_id"])] = int(payload["new_value"])
+
+
+def _ability_target(state: CampaignState, scope: str) -> dict:
+    if scope == "library":
+        return state.abilities
+    if scope == "character":
+        if not state.character.abilities:
+            state.character.abilities = {}
+        return state.character.abilities
+    raise ValueError(f"Unknown ability scope: {scope}")
+
+
+def _ability_upserted(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    ability = deserialize_ability(payload["ability"])
+    _ability_target(state, payload.get("scope", "character"))[ability.id] = ability
+
+
+def _ability_removed(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    _ability_target(state, payload.get("scope", "character")).pop(payload["ability_id"], None)
+
+
+def _settings_updated(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    if "xp_curve" in payload:
+        state.settings.xp_curve = XPCurveExponential(**payload["xp_curve"])
+    if "stat_rule" in payload:
+        state.settings.stat_rule = StatPointRule(**payload["stat_rule"])
+    if "sheet_sections" in payload:
+        state.settings.sheet_sections = normalize_sheet_sections(payload["sheet_sections"])
+
+
+def _class_bonus_updated(
+    state: CampaignState, payload: Dict[str, Any], event: EventLogEntry
+) -> None:
+    class_def = state.classes[payload["class_id"]]
+    class_def.per_level_bonus.per_level_stat_delta = {
+        str(key): int(value) for key, value in payload["per_level_bonus"].items()
+    }
+
+
+def _item_template_upserted(
+    state: CampaignState, payload: Dict[str, Any], event: EventLogEntry
+) -> None:
+    template = deserialize_item_template(payload["template"])
+    state.item_templates[template.id] = template
+
+
+def _message_template_upserted(
+    state: CampaignState, payload: Dict[str, Any], event: EventLogEntry
+) -> None:
+    template = MessageTemplate.from_dict(payload["template"])
+    state.message_templates[template.id] = template
+
+
+def _stat_allocated(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    state.character.stats[str(payload["stat_id"])] = int(payload["new_value"])
+    state.character.unspent_stat_points = int(payload["remaining_points"])
+
+
+def _chat_contact_added(
+    state: CampaignState, payload: Dict[str, Any], event: EventLogEntry
+) -> None:
+    contact_id = str(payload["contact_id"])
+    state.contacts[contact_id] = ChatContact(
+        id=contact_id,
+        display_name=str(payload.get("display_name", "")),
+        link_payload=dict(payload.get("link_payload") or {}),
+    )
+
+
+def _friend_request_sent(
+    state: CampaignState, payload: Dict[str, Any], event: EventLogEntry
+) -> None:
+    request_id = str(payload["request_id"])
+    if request_id not in state.friend_requests:
+        state.friend_requests[request_id] = FriendRequest(
+            id=request_id, contact_id=str(payload["contact_id"]), created_at=event.ts
+        )
+
+
+def _friend_request_accepted(
+    state: CampaignState, payload: Dict[str, Any], event: EventLogEntry
+) -> None:
+    request = state.friend_requests[payload["request_id"]]
+    request.accepted = True
+    request.accepted_at = event.ts
+    chat_id = str(payload["chat_id"])
+    chat = state.chats.get(chat_id)
+    if chat is None:
+        chat = state.chats[chat_id] = ChatThread(id=chat_id, contact_id=request.contact_id)
+    chat.opened = True
+
+
+def _chat_message(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    chat = state.chats[payload["chat_id"]]
+    message_id = str(payload["message_id"])
+    if any(message.id == message_id for message in chat.messages):
+        return
+    chat.messages.append(
+        ChatMessage(
+            id=message_id,
+            chat_id=chat.id,
+            sender_contact_id=str(payload["sender_contact_id"]),
+            text=str(payload.get("text", "")),
+            created_at=event.ts,
+            links=[chat_link_from_dict(link) for link in payload.get("links", [])],
+        )
+    )
+
+
+def _ignore(state: CampaignState, payload: Dict[str, Any], event: EventLogEntry) -> None:
+    return None
+
+
+def _upsert_by_id(items: List[Any], item: Any) -> None:
+    for index, existing in enumerate(items):
+        if existing.id == item.id:
+            items[index] = item
+            return
+    items.append(item)
+
+
+_HANDLERS: Dict[str, Callable[[CampaignState, Dict[str, Any], EventLogEntry], None]] = {
+    EventKind.xp_granted.value: _xp_granted,
+    EventKind.level_up.value: _level_up,
+    EventKind.inventory_added.value: _inventory_added,
+    EventKind.inventory_removed.value: _inventory_removed,
+    EventKind.equipment_equipped.value: _equipment_equipped,
+    EventKind.equipment_unequipped.value: _equipment_unequipped,
+    EventKind.equipment_requested.value: _ignore,
+    EventKind.quest_assigned.value: _quest_changed,
+    EventKind.quest_status.value: _quest_changed,
+    EventKind.message_sent.value: _message_changed,
+    EventKind.message_choice.value: _message_changed,
+    EventKind.player_frozen.value: _player_frozen,
+    EventKind.currency_updated.value: _currency_updated,
+    EventKind.resource_updated.value: _resource_updated,
+    EventKind.reputation_updated.value: _reputation_updated,
+    EventKind.ability_added.value: _ability_upserted,
+    EventKind.ability_updated.value: _ability_upserted,
+    EventKind.ability_removed.value: _ability_removed,
+    EventKind.settings_updated.value: _settings_updated,
+    EventKind.class_bonus_updated.value: _class_bonus_updated,
+    EventKind.item_template_upserted.value: _item_template_upserted,
+    EventKind.message_template_upserted.value: _message_template_upserted,
+    EventKind.stat_allocated.value: _stat_allocated,
+    EventKind.chat_contact_added.value: _chat_contact_added,
+    EventKind.chat_friend_request_sent.value: _friend_request_sent,
+    EventKind.chat_friend_request_accepted.value: _friend_request_accepted,
+    EventKind.chat_message.value: _chat_message,
+}
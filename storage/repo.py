@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from typing import List, Protocol
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Protocol
 
 from domain.events import EventLogEntry
 from domain.models import CampaignState
 
+from .compaction import CompactableStore, StoreCompaction
+from .event_query import EventQuery
 
-class CampaignRepository(Protocol):
+
+class CampaignRepository(CompactableStore, Protocol):
     def load(self) -> CampaignState:
         ...
 
@@ -16,15 +19,56 @@ class CampaignRepository(Protocol):
     def append_events(self, events: List[EventLogEntry]) -> List[EventLogEntry]:
         ...
 
+    def commit(
+        self,
+        events: List[EventLogEntry],
+        state: CampaignState,
+        sections: Optional[Iterable[str]] = None,
+    ) -> List[EventLogEntry]:
+        ...
+
+    def commit_snapshot(
+        self, events: List[EventLogEntry], snapshot: dict, partial: bool = False
+    ) -> List[EventLogEntry]:
+        ...
+
+    def state_at(self, seq: int) -> CampaignState:
+        ...
+
     def list_events(self, after_seq: int = 0) -> List[EventLogEntry]:
         ...
 
+    def iter_events(
+        self, after_seq: int = 0, limit: Optional[int] = None
+    ) -> Iterator[EventLogEntry]:
+        ...
+
+    def query_events(self, query: EventQuery, limit: int) -> List[EventLogEntry]:
+        ...
+
+    def entity_events(self, entity_type: str, entity_id: str) -> List[EventLogEntry]:
+        ...
+
+    def iter_event_lines(
+        self, after_seq: int = 0, max_seq: Optional[int] = None
+    ) -> Iterator[bytes]:
+        ...
+
     def get_last_seq(self) -> int:
         ...
 
+    def get_storage_stats(self) -> dict:
+        ...
+
+    def start_compaction(self) -> StoreCompaction:
+        ...
+
     def export_data(self) -> dict:
         ...
 
+    def export_snapshot(self) -> dict:
+        ...
+
     def import_data(self, data: dict) -> None:
         ...
 
@@ -40,8 +84,63 @@ class CampaignRepository(Protocol):
     def import_log(self, data: dict) -> None:
         ...
 
+    def import_events_batch(self, records: List[dict], reset: bool = False) -> int:
+        ...
+
+    def finish_import(self, snapshot: Optional[dict], last_seq: int) -> None:
+        ...
+
     def export_chats(self) -> dict:
         ...
 
     def import_chats(self, data: dict) -> None:
         ...
+
+
+class AsyncCampaignRepository(Protocol):
+    """Read side of ``CampaignRepository`` for async callers; see ``ThreadedCampaignRepository``."""
+
+    async def load(self) -> CampaignState:
+        ...
+
+    async def state_at(self, seq: int) -> CampaignState:
+        ...
+
+    async def get_last_seq(self) -> int:
+        ...
+
+    async def get_storage_stats(self) -> dict:
+        ...
+
+    async def export_snapshot(self) -> dict:
+        ...
+
+    async def export_templates(self) -> dict:
+        ...
+
+    async def export_chats(self) -> dict:
+        ...
+
+    async def list_events(
+        self, after_seq: int = 0, limit: Optional[int] = None
+    ) -> List[EventLogEntry]:
+        ...
+
+    async def query_events(self, query: EventQuery, limit: int) -> List[EventLogEntry]:
+        ...
+
+    async def entity_events(self, entity_type: str, entity_id: str) -> List[EventLogEntry]:
+        ...
+
+    def iter_events(
+        self, after_seq: int = 0, limit: Optional[int] = None
+    ) -> AsyncIterator[EventLogEntry]:
+        ...
+
+    def iter_event_batches(
+        self,
+        after_seq: int = 0,
+        limit: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> AsyncIterator[List[EventLogEntry]]:
+        ...
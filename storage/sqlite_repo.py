@@ -0,0 +1,599 @@
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from domain.events import EventLogEntry
+from domain.helpers import utcnow
+from domain.models import CampaignState
+
+from .checkpoints import Checkpoint, RetentionPolicy
+from .compaction import CompactionReport, StoreCompaction, files_bytes
+from .durability import DURABILITY_ALWAYS, DURABILITY_BATCH, Durability
+from .event_query import ENTITY_FIELDS, EventQuery, entity_fields
+from .json_repo import (
+    EAGER_SNAPSHOT_KEYS,
+    SCHEMA_VERSION,
+    JsonCampaignRepository,
+    LazyCampaignState,
+    _ensure_dict,
+    _encode_event_lines,
+    _ensure_store_schema,
+    _normalize_log_payload,
+    _safe_event_from_dict,
+    create_default_campaign_state,
+    datetime_from_iso,
+    serialize_campaign_sections,
+    serialize_campaign_state,
+    snapshot_keys,
+)
+from .jsonl_repo import JsonlCampaignRepository
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+TEMPLATE_SECTIONS = ("item_templates", "quest_templates", "message_templates")
+CHAT_SECTIONS = ("contacts", "chats", "friend_requests")
+EVENT_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshot_sections (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    actor TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_kind ON events (kind, seq);
+CREATE INDEX IF NOT EXISTS events_by_actor ON events (actor, seq);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    seq INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    snapshot TEXT NOT NULL
+);
+"""
+
+
+def _payload_field(name: str) -> str:
+    return f"json_extract(payload, '$.{name}')"
+
+
+# Expression indexes behind ``entity_events``, one per payload field naming an
+# entity; lookups must spell the expression exactly as ``_payload_field`` does.
+_ENTITY_SCHEMA = "".join(
+    f"CREATE INDEX IF NOT EXISTS events_by_{name} ON events ({_payload_field(name)});\n"
+    for name in sorted({name for fields in ENTITY_FIELDS.values() for name in fields})
+)
+
+_SYNCHRONOUS = {DURABILITY_ALWAYS: "FULL", DURABILITY_BATCH: "NORMAL"}
+_WAL_SUFFIXES = ("-wal", "-shm")
+
+
+class SqliteCampaignRepository:
+    """SQLite store in WAL mode.
+
+    Events are rows keyed by ``seq`` (the rowid), so reading a tail is an
+    index range scan and appending is a single-row insert. The snapshot is
+    kept as one JSON row per top-level section; every
+    ``retention.checkpoint_every`` events a full copy goes to ``checkpoints``
+    in the same transaction.
+    Every event stays in ``events``: reads reach rows through the ``seq``,
+    kind, actor and entity indexes, so the table size does not weigh on
+    them the way a whole-file log does, and a retention window
+    (``keep_events`` / ``keep_days``) is refused rather than ignored.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        durability: Optional[Durability] = None,
+        retention: Optional[RetentionPolicy] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.durability = durability or Durability()
+        self.retention = retention or RetentionPolicy()
+        if self.retention.archives:
+            raise ValueError(
+                "The SQLite store keeps the whole event log; "
+                "keep_events and keep_days apply to the jsonl store only"
+            )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = self._connect()
+
+    def load(self) -> CampaignState:
+        self._ensure_initialized()
+        return LazyCampaignState(self._read_sections(EAGER_SNAPSHOT_KEYS), self._read_sections)
+
+    def save(self, state: CampaignState) -> None:
+        self._ensure_initialized()
+        with self._transaction() as conn:
+            self._write_sections(conn, serialize_campaign_state(state))
+
+    def append_events(self, events: List[EventLogEntry]) -> List[EventLogEntry]:
+        if not events:
+            return []
+        self._ensure_initialized()
+        with self._transaction() as conn:
+            self._insert_events(conn, events)
+        return events
+
+    def commit(
+        self,
+        events: List[EventLogEntry],
+        state: CampaignState,
+        sections: Optional[Iterable[str]] = None,
+    ) -> List[EventLogEntry]:
+        if sections is None:
+            return self.commit_snapshot(events, serialize_campaign_state(state))
+        snapshot = serialize_campaign_sections(state, snapshot_keys(sections))
+        return self.commit_snapshot(events, snapshot, partial=True)
+
+    def commit_snapshot(
+        self, events: List[EventLogEntry], snapshot: Dict[str, Any], partial: bool = False
+    ) -> List[EventLogEntry]:
+        # Sections are rows, so a partial snapshot is simply fewer upserts.
+        self._ensure_initialized()
+        with self.durability.commit(), self._transaction() as conn:
+            self._insert_events(conn, events)
+            self._write_sections(conn, snapshot)
+            last_seq = self.get_last_seq()
+            if last_seq - self._latest_checkpoint_seq() >= self.retention.checkpoint_every:
+                self._write_checkpoint(conn, last_seq, self._read_sections())
+        return events
+
+    def state_at(self, seq: int) -> CampaignState:
+        """Rebuild the state as it was right after event ``seq`` from the nearest checkpoint."""
+        if seq >= self.get_last_seq():
+            return self.load()
+        checkpoint = self.nearest_checkpoint(seq)
+        if checkpoint is None:
+            raise ValueError(f"No checkpoint at or before seq {seq}")
+        from .projection import replay_checkpoint
+
+        return replay_checkpoint(checkpoint, self.iter_events(checkpoint.seq), seq).state
+
+    def nearest_checkpoint(self, seq: int) -> Optional[Checkpoint]:
+        self._ensure_initialized()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq, created_at, snapshot FROM checkpoints WHERE seq <= ? "
+                "ORDER BY seq DESC LIMIT 1",
+                (int(seq),),
+            ).fetchone()
+        if row is None:
+            return None
+        return Checkpoint(
+            seq=int(row[0]), created_at=datetime_from_iso(row[1]), snapshot=json.loads(row[2])
+        )
+
+    def list_events(self, after_seq: int = 0) -> List[EventLogEntry]:
+        return list(self.iter_events(after_seq))
+
+    def iter_events(
+        self, after_seq: int = 0, limit: Optional[int] = None
+    ) -> Iterator[EventLogEntry]:
+        """Page through ``seq > after_seq`` so the lock is never held while the caller iterates."""
+        cursor = int(after_seq)
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_size = EVENT_PAGE_SIZE if remaining is None else min(EVENT_PAGE_SIZE, remaining)
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, ts, actor, kind, payload FROM events "
+                    "WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (cursor, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                event = _event_from_row(row)
+                if event:
+                    yield event
+            cursor = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < page_size:
+                return
+
+    def query_events(self, query: EventQuery, limit: int) -> List[EventLogEntry]:
+        """At most ``limit`` events matching ``query``, walking the kind or actor index."""
+        if limit <= 0:
+            return []
+        clauses, params = ["seq > ?"], [query.after_seq]
+        if query.before_seq is not None:
+            clauses.append("seq < ?")
+            params.append(query.before_seq)
+        if query.actor is not None:
+            clauses.append("actor = ?")
+            params.append(query.actor)
+        select = (
+            "SELECT seq, ts, actor, kind, payload FROM events WHERE "
+            + " AND ".join(clauses)
+            + "{} ORDER BY seq "
+            + ("DESC" if query.reverse else "ASC")
+            + " LIMIT ?"
+        )
+        with self._lock:
+            if query.kinds:
+                # One index walk per kind, merged here: ``kind IN (...)`` would
+                # make SQLite sort every match before applying the limit.
+                runs = [
+                    self._conn.execute(
+                        select.format(" AND kind = ?"), (*params, kind, limit)
+                    ).fetchall()
+                    for kind in sorted(query.kinds)
+                ]
+                merged = heapq.merge(*runs, key=lambda row: row[0], reverse=query.reverse)
+                rows = list(islice(merged, limit))
+            else:
+                rows = self._conn.execute(select.format(""), (*params, limit)).fetchall()
+        events = [_event_from_row(row) for row in rows]
+        return [event for event in events if event]
+
+    def entity_events(self, entity_type: str, entity_id: str) -> List[EventLogEntry]:
+        """Every event naming the entity in its payload, oldest first, through its indexes."""
+        fields = entity_fields(entity_type)
+        matches = " OR ".join(f"{_payload_field(name)} = ?" for name in fields)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT seq, ts, actor, kind, payload FROM events WHERE {matches} ORDER BY seq",
+                (entity_id,) * len(fields),
+            ).fetchall()
+        events = [_event_from_row(row) for row in rows]
+        return [event for event in events if event]
+
+    def iter_event_lines(
+        self, after_seq: int = 0, max_seq: Optional[int] = None
+    ) -> Iterator[bytes]:
+        return _encode_event_lines(self.iter_events(after_seq), max_seq)
+
+    def get_last_seq(self) -> int:
+        try:
+            return int(self._get_meta("last_seq", "0"))
+        except (TypeError, ValueError):
+            return 0
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        stats = self.durability.summary()
+        with self._lock:
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+            checkpoints = self._conn.execute("SELECT seq FROM checkpoints ORDER BY seq").fetchall()
+        stats["backend"] = "sqlite"
+        stats["database_bytes"] = int(page_count) * int(page_size)
+        stats["checkpoints"] = [row[0] for row in checkpoints]
+        return stats
+
+    def start_compaction(self) -> StoreCompaction:
+        """Vacuum into a copy while commits continue, then catch the copy up and swap it in."""
+        return StoreCompaction(self, "sqlite")
+
+    def storage_bytes(self) -> int:
+        wal = [Path(f"{self.path}{suffix}") for suffix in _WAL_SUFFIXES]
+        return files_bytes([self.path] + wal)
+
+    def build_compaction(self, report: CompactionReport) -> Tuple[Path, int, int]:
+        staging = self.path.with_name(self.path.name + ".compact")
+        staging.unlink(missing_ok=True)
+        # A connection of its own: VACUUM INTO copies one read snapshot while
+        # commits keep going through ``_conn``.
+        conn = sqlite3.connect(str(self.path))
+        try:
+            base_seq, count = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0), COUNT(*) FROM events"
+            ).fetchone()
+            conn.execute("VACUUM INTO ?", (str(staging),))
+        finally:
+            conn.close()
+        return staging, int(base_seq), int(count)
+
+    def switch_compaction(
+        self, plan: Tuple[Path, int, int], report: CompactionReport
+    ) -> None:
+        staging, base_seq, count = plan
+        with self._lock:
+            stored = self._conn.execute(
+                "SELECT COUNT(*) FROM events WHERE seq <= ?", (base_seq,)
+            ).fetchone()[0]
+            if stored != count:
+                # The log was replaced (an import) while the copy was made.
+                report.superseded = True
+                staging.unlink(missing_ok=True)
+                return
+            self._conn.execute("ATTACH DATABASE ? AS compacted", (str(staging),))
+            try:
+                with self._transaction() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO compacted.events "
+                        "SELECT * FROM main.events WHERE seq > ?",
+                        (base_seq,),
+                    )
+                    for table in ("meta", "snapshot_sections", "checkpoints"):
+                        conn.execute(f"DELETE FROM compacted.{table}")
+                        conn.execute(f"INSERT INTO compacted.{table} SELECT * FROM main.{table}")
+            finally:
+                self._conn.execute("DETACH DATABASE compacted")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+            for suffix in _WAL_SUFFIXES:
+                # Left over only if closing could not checkpoint; never valid for the copy.
+                Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+            os.replace(staging, self.path)
+            self._conn = self._connect()
+            with self._transaction() as conn:
+                report.checkpoints_dropped = self._prune_checkpoints(conn)
+            report.indexes_rebuilt = self._conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'"
+            ).fetchone()[0]
+
+    def export_data(self) -> Dict[str, Any]:
+        self._ensure_initialized()
+        return {
+            "schema_version": SCHEMA_VERSION,
+            "snapshot": self._read_sections(),
+            "events": [event.to_dict() for event in self.list_events()],
+            "last_seq": self.get_last_seq(),
+        }
+
+    def export_snapshot(self) -> Dict[str, Any]:
+        self._ensure_initialized()
+        return self._read_sections()
+
+    def import_data(self, data: Dict[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError("Invalid import payload")
+        if "snapshot" not in data or not isinstance(data.get("snapshot"), dict):
+            raise ValueError("Missing snapshot")
+        normalized = _ensure_store_schema(dict(data))
+        events, last_seq = _normalize_log_payload(normalized)
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM snapshot_sections")
+            self._write_sections(conn, normalized["snapshot"])
+            self._replace_events(conn, events, last_seq)
+            self._set_meta(conn, "schema_version", str(SCHEMA_VERSION))
+            conn.execute("DELETE FROM checkpoints")
+            self._write_checkpoint(conn, last_seq, normalized["snapshot"])
+
+    def export_templates(self) -> Dict[str, Any]:
+        self._ensure_initialized()
+        sections = self._read_sections(TEMPLATE_SECTIONS)
+        return {
+            "schema_version": SCHEMA_VERSION,
+            **{name: _ensure_dict(sections.get(name)) for name in TEMPLATE_SECTIONS},
+        }
+
+    def import_templates(self, data: Dict[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError("Invalid templates payload")
+        self._ensure_initialized()
+        with self._transaction() as conn:
+            self._write_sections(
+                conn, {name: _ensure_dict(data.get(name)) for name in TEMPLATE_SECTIONS}
+            )
+
+    def export_log(self) -> Dict[str, Any]:
+        return {
+            "schema_version": SCHEMA_VERSION,
+            "events": [event.to_dict() for event in self.list_events()],
+            "last_seq": self.get_last_seq(),
+        }
+
+    def import_log(self, data: Dict[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError("Invalid log payload")
+        self._ensure_initialized()
+        events, last_seq = _normalize_log_payload(data)
+        with self._transaction() as conn:
+            self._replace_events(conn, events, last_seq)
+            conn.execute("DELETE FROM checkpoints")
+
+    def import_events_batch(self, records: List[Dict[str, Any]], reset: bool = False) -> int:
+        self._ensure_initialized()
+        events = [event for event in (_safe_event_from_dict(raw) for raw in records) if event]
+        with self._transaction() as conn:
+            if reset:
+                conn.execute("DELETE FROM events")
+                conn.execute("DELETE FROM checkpoints")
+                self._set_meta(conn, "last_seq", "0")
+            conn.executemany(
+                "INSERT OR REPLACE INTO events (seq, ts, actor, kind, payload) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [_event_row(event) for event in events],
+            )
+            last_seq = max([self.get_last_seq()] + [event.seq for event in events])
+            self._set_meta(conn, "last_seq", str(last_seq))
+        return last_seq
+
+    def finish_import(self, snapshot: Optional[Dict[str, Any]], last_seq: int) -> None:
+        self._ensure_initialized()
+        with self._transaction() as conn:
+            last_seq = max(self.get_last_seq(), int(last_seq))
+            if snapshot is not None:
+                conn.execute("DELETE FROM snapshot_sections")
+                self._write_sections(conn, snapshot)
+                conn.execute("DELETE FROM checkpoints")
+                self._write_checkpoint(conn, last_seq, snapshot)
+            self._set_meta(conn, "last_seq", str(last_seq))
+
+    def export_chats(self) -> Dict[str, Any]:
+        self._ensure_initialized()
+        sections = self._read_sections(CHAT_SECTIONS)
+        return {
+            "schema_version": SCHEMA_VERSION,
+            **{name: _ensure_dict(sections.get(name)) for name in CHAT_SECTIONS},
+        }
+
+    def import_chats(self, data: Dict[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError("Invalid chats payload")
+        self._ensure_initialized()
+        with self._transaction() as conn:
+            self._write_sections(
+                conn, {name: _ensure_dict(data.get(name)) for name in CHAT_SECTIONS}
+            )
+
+    def import_json_store(self, json_path: str | Path) -> bool:
+        """Copy a JSON or JSONL campaign store into an empty database.
+
+        Returns ``False`` when the database already holds a campaign or there is
+        nothing to import.
+        """
+        json_path = Path(json_path)
+        if self._get_meta("schema_version") is not None or not json_path.exists():
+            return False
+        if json_path.with_suffix(".events").exists():
+            source: JsonCampaignRepository = JsonlCampaignRepository(json_path)
+        else:
+            source = JsonCampaignRepository(json_path)
+        self.import_data(source.export_data())
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={_SYNCHRONOUS.get(self.durability.mode, 'OFF')}")
+        conn.executescript(_SCHEMA + _ENTITY_SCHEMA)
+        conn.commit()
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.rollback()
+                raise
+            started = time.perf_counter()
+            self._conn.commit()
+            self.durability.record_fsync((time.perf_counter() - started) * 1000)
+
+    def _ensure_initialized(self) -> None:
+        if self._get_meta("schema_version") is not None:
+            return
+        snapshot = serialize_campaign_state(create_default_campaign_state())
+        with self._transaction() as conn:
+            self._write_sections(conn, snapshot)
+            self._set_meta(conn, "schema_version", str(SCHEMA_VERSION))
+            self._set_meta(conn, "last_seq", "0")
+            self._write_checkpoint(conn, 0, snapshot)
+
+    def _read_sections(self, names: Optional[tuple[str, ...]] = None) -> Dict[str, Any]:
+        with self._lock:
+            if names is None:
+                rows = self._conn.execute("SELECT name, data FROM snapshot_sections").fetchall()
+            else:
+                placeholders = ",".join("?" for _ in names)
+                rows = self._conn.execute(
+                    f"SELECT name, data FROM snapshot_sections WHERE name IN ({placeholders})",
+                    names,
+                ).fetchall()
+        return {name: json.loads(data) for name, data in rows}
+
+    def _write_sections(self, conn: sqlite3.Connection, sections: Dict[str, Any]) -> None:
+        conn.executemany(
+            "INSERT INTO snapshot_sections (name, data) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+            [(name, _dumps(value)) for name, value in sections.items()],
+        )
+
+    def _insert_events(self, conn: sqlite3.Connection, events: List[EventLogEntry]) -> None:
+        if not events:
+            return
+        max_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+        last_seq = max(self.get_last_seq(), int(max_seq))
+        for event in events:
+            last_seq += 1
+            event.seq = last_seq
+            conn.execute(
+                "INSERT INTO events (seq, ts, actor, kind, payload) VALUES (?, ?, ?, ?, ?)",
+                _event_row(event),
+            )
+        self._set_meta(conn, "last_seq", str(last_seq))
+
+    def _replace_events(
+        self, conn: sqlite3.Connection, records: List[Dict[str, Any]], last_seq: int
+    ) -> None:
+        conn.execute("DELETE FROM events")
+        events = [event for event in (_safe_event_from_dict(raw) for raw in records) if event]
+        conn.executemany(
+            "INSERT OR REPLACE INTO events (seq, ts, actor, kind, payload) VALUES (?, ?, ?, ?, ?)",
+            [_event_row(event) for event in events],
+        )
+        self._set_meta(conn, "last_seq", str(int(last_seq)))
+
+    def _latest_checkpoint_seq(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM checkpoints").fetchone()
+        return int(row[0])
+
+    def _write_checkpoint(
+        self, conn: sqlite3.Connection, seq: int, snapshot: Dict[str, Any]
+    ) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoints (seq, created_at, snapshot) VALUES (?, ?, ?)",
+            (int(seq), utcnow().isoformat(), _dumps(snapshot)),
+        )
+        self._prune_checkpoints(conn)
+
+    def _prune_checkpoints(self, conn: sqlite3.Connection) -> List[int]:
+        rows = conn.execute(
+            "SELECT seq FROM checkpoints ORDER BY seq DESC LIMIT -1 OFFSET ?",
+            (max(1, self.retention.keep_checkpoints),),
+        ).fetchall()
+        conn.executemany("DELETE FROM checkpoints WHERE seq = ?", rows)
+        return sorted(int(row[0]) for row in rows)
+
+    def _get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value: str) -> None:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+
+def sqlite_paths_for(campaign_path: str | Path) -> tuple[Path, Optional[Path]]:
+    """Map ``AETHER_CAMPAIGN_PATH`` to a database path and an importable JSON store."""
+    campaign_path = Path(campaign_path)
+    if campaign_path.suffix.lower() in SQLITE_SUFFIXES:
+        return campaign_path, None
+    return campaign_path.with_suffix(".sqlite3"), campaign_path
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _event_row(event: EventLogEntry) -> tuple[int, str, str, str, str]:
+    return (event.seq, event.ts.isoformat(), event.actor, event.kind, _dumps(event.payload))
+
+
+def _event_from_row(row: tuple) -> Optional[EventLogEntry]:
+    seq, ts, actor, kind, payload = row
+    return _safe_event_from_dict(
+        {"seq": seq, "ts": ts, "actor": actor, "kind": kind, "payload": json.loads(payload)}
+    )
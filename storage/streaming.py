@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .json_repo import SCHEMA_VERSION, _ensure_store_schema, _safe_event_from_dict
+from .repo import CampaignRepository
+
+EXPORT_FORMAT_JSON = "json"
+EXPORT_FORMAT_NDJSON = "ndjson"
+EXPORT_MEDIA_TYPES = {
+    EXPORT_FORMAT_JSON: "application/json",
+    EXPORT_FORMAT_NDJSON: "application/x-ndjson",
+}
+EXPORT_CHUNK_BYTES = 64 * 1024
+IMPORT_BATCH_SIZE = 500
+
+
+def iter_export(
+    repo: CampaignRepository, fmt: str = EXPORT_FORMAT_JSON, include_snapshot: bool = True
+) -> Iterator[bytes]:
+    """Encode a campaign (or just its log) chunk by chunk, reading events from storage.
+
+    ``json`` produces the same document as ``export_data``/``export_log``.
+    ``ndjson`` puts ``schema_version``, ``last_seq`` and the snapshot on the
+    first line and one event per line after it. Events committed while the
+    export runs are left out, so ``last_seq`` always matches the last event.
+    """
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return iter_export_body(repo, export_header(repo, include_snapshot), fmt)
+
+
+def export_header(repo: CampaignRepository, include_snapshot: bool = True) -> Dict[str, Any]:
+    """``schema_version``, the snapshot and the ``last_seq`` an export is cut at.
+
+    The snapshot and ``last_seq`` only agree if no commit lands between the
+    two reads; the server calls this through ``PersistenceQueue.run``.
+    """
+    header: Dict[str, Any] = {"schema_version": SCHEMA_VERSION}
+    if include_snapshot:
+        header["snapshot"] = repo.export_snapshot()
+    header["last_seq"] = repo.get_last_seq()
+    return header
+
+
+def iter_export_body(
+    repo: CampaignRepository, header: Dict[str, Any], fmt: str
+) -> Iterator[bytes]:
+    """The export document for ``header``, with the events up to its ``last_seq``."""
+    lines = repo.iter_event_lines(0, header["last_seq"])
+    if fmt == EXPORT_FORMAT_NDJSON:
+        yield _dumps(header) + b"\n"
+        yield from _chunked(lines, b"")
+        return
+    yield _dumps(header)[:-1] + b',"events":['
+    # JSON Lines never contain a raw newline inside a record, so a run of
+    # lines becomes array items by swapping the separators.
+    yield from _chunked((bytes(chunk)[:-1].replace(b"\n", b",") for chunk in lines), b",")
+    yield b"]}"
+
+
+def _chunked(pieces: Iterable[Any], separator: bytes) -> Iterator[Any]:
+    """Coalesce small pieces into ~``EXPORT_CHUNK_BYTES`` chunks; large ones pass through."""
+    buffer = bytearray()
+    first = True
+    for piece in pieces:
+        if not first:
+            buffer += separator
+        first = False
+        if len(piece) >= EXPORT_CHUNK_BYTES:
+            if buffer:
+                yield bytes(buffer)
+                buffer.clear()
+            yield piece
+            continue
+        buffer += piece
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@dataclass
+class ImportProgress:
+    bytes_read: int = 0
+    lines: int = 0
+    events: int = 0
+    skipped: int = 0
+    cursor: int = 0
+    done: bool = False
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class NdjsonImporter:
+    """Incremental reader for the ``ndjson`` export format.
+
+    Feed it the body chunk by chunk; events are validated and handed to the
+    repository ``batch_size`` at a time, so memory stays bounded by one batch
+    plus the header line. ``progress.cursor`` is the last ``seq`` the
+    repository has accepted: a failed import can be retried with
+    ``resume_after=cursor``, which keeps what is stored and skips events up to
+    that ``seq``. Without ``resume_after`` the existing log is replaced.
+    """
+
+    def __init__(
+        self,
+        repo: CampaignRepository,
+        include_snapshot: bool = True,
+        resume_after: Optional[int] = None,
+        batch_size: int = IMPORT_BATCH_SIZE,
+    ) -> None:
+        self.repo = repo
+        self.include_snapshot = include_snapshot
+        self.resume_after = resume_after
+        self.batch_size = max(1, int(batch_size))
+        self.progress = ImportProgress(cursor=int(resume_after or 0))
+        self._header: Optional[Dict[str, Any]] = None
+        self._buffer = b""
+        self._batch: List[Dict[str, Any]] = []
+        self._previous_seq = 0
+        self._reset_pending = resume_after is None
+
+    def feed(self, chunk: bytes) -> None:
+        self.progress.bytes_read += len(chunk)
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            self._handle_line(line)
+
+    def finish(self) -> ImportProgress:
+        if self._buffer:
+            self._handle_line(self._buffer)
+            self._buffer = b""
+        if self._header is None:
+            raise ValueError("Missing header line")
+        self._flush()
+        self.repo.finish_import(self._header.get("snapshot"), self._header["last_seq"])
+        self.progress.done = True
+        return self.progress
+
+    def _handle_line(self, line: bytes) -> None:
+        line = line.strip()
+        if not line:
+            return
+        self.progress.lines += 1
+        try:
+            record = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+            raise ValueError(f"Invalid JSON on line {self.progress.lines}") from exc
+        if self._header is None:
+            self._header = self._read_header(record)
+            return
+        event = _safe_event_from_dict(record)
+        if event is None:
+            raise ValueError(f"Invalid event on line {self.progress.lines}")
+        if event.seq <= self._previous_seq:
+            raise ValueError(f"Events must be ordered by seq (line {self.progress.lines})")
+        self._previous_seq = event.seq
+        if self.resume_after is not None and event.seq <= self.resume_after:
+            self.progress.skipped += 1
+            return
+        self._batch.append(event.to_dict())
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _read_header(self, record: Any) -> Dict[str, Any]:
+        if not isinstance(record, dict) or "schema_version" not in record:
+            raise ValueError("First line must be the export header")
+        if not self.include_snapshot:
+            record.pop("snapshot", None)
+            header = _ensure_store_schema(record)
+            header["snapshot"] = None
+            return header
+        if not isinstance(record.get("snapshot"), dict):
+            raise ValueError("Missing snapshot")
+        return _ensure_store_schema(record)
+
+    def _flush(self) -> None:
+        if not self._batch and not self._reset_pending:
+            return
+        self.progress.cursor = self.repo.import_events_batch(
+            self._batch, reset=self._reset_pending
+        )
+        self.progress.events += len(self._batch)
+        self._reset_pending = False
+        self._batch = []
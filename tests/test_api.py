@@ -0,0 +1,456 @@
+import asyncio
+import json
+import threading
+
+from fastapi import HTTPException
+
+from app.permissions import HOST_ROLE, PLAYER_ROLE
+from app.services import CampaignService
+from domain.models import (
+    Ability,
+    ItemTemplate,
+    ItemType,
+    MessageSeverity,
+    QuestStatus,
+    QuestTemplate,
+    Rarity,
+)
+from server.api import (
+    ApiContext,
+    entity_history,
+    export_campaign,
+    get_snapshot,
+    import_log_stream,
+    list_events,
+    list_player_linkables,
+    router,
+)
+from server.auth import PairingManager
+from server.persistence import COMMIT_WAIT_ACCEPTED, PersistenceQueue
+from server.snapshot_cache import SnapshotFragmentCache, project_events
+from server.ws import WebSocketHub
+from storage.async_repo import ThreadedCampaignRepository
+from storage.json_repo import create_default_campaign_state, serialize_campaign_state
+from storage.jsonl_repo import JsonlCampaignRepository
+from storage.streaming import iter_export
+
+
+def test_snapshot_answers_not_modified_until_the_campaign_changes(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+
+    async def scenario():
+        context = ApiContext(
+            service=CampaignService(repo.load()),
+            pairing=PairingManager(),
+            hub=WebSocketHub(),
+            repo=repo,
+            async_repo=ThreadedCampaignRepository(repo),
+            persistence=PersistenceQueue(repo),
+        )
+        auth = f"Bearer {context.pairing.set_pin('1234')}"
+
+        async def fetch(etag=None):
+            response = await get_snapshot(context, auth, etag)
+            return response.status_code, response.headers["ETag"]
+
+        first = await fetch()
+        unchanged = await fetch(f"W/{first[1]}")
+        service = context.service
+        await context.persistence.commit(
+            service.update_currency("gold", 5), service.state, service.take_dirty_sections()
+        )
+        after_commit = await fetch(first[1])
+        context.replace_state(repo.load())
+        after_import = await fetch(after_commit[1])
+        await context.persistence.close()
+        context.async_repo.close()
+        return first, unchanged, after_commit, after_import
+
+    first, unchanged, after_commit, after_import = asyncio.run(scenario())
+
+    assert first[0] == 200
+    assert unchanged == (304, first[1])
+    assert after_commit[0] == 200 and after_commit[1] != first[1]
+    assert after_import[0] == 200 and after_import[1] != after_commit[1]
+
+
+def test_snapshot_cache_reencodes_only_changed_sections(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+    cache = SnapshotFragmentCache(service)
+
+    first = json.loads(cache.encode(3))
+    service.update_currency("gold", 5)
+    second = json.loads(cache.encode(4))
+
+    assert first == {"snapshot": serialize_campaign_state(repo.load()), "last_seq": 3}
+    assert second == {"snapshot": serialize_campaign_state(service.state), "last_seq": 4}
+    assert second["snapshot"]["character"]["currencies"]["gold"] == 5
+    # Only the character section was encoded again.
+    assert cache.misses == 9 and cache.hits == 7
+
+    service.state = repo.load()
+    assert json.loads(cache.encode(4))["snapshot"]["character"]["currencies"].get("gold") != 5
+
+
+def test_player_snapshot_leaves_out_host_only_data():
+    state = create_default_campaign_state()
+    for tpl_id in ("owned", "unowned"):
+        state.item_templates[tpl_id] = ItemTemplate(
+            id=tpl_id, name=tpl_id, item_type=ItemType.misc
+        )
+    for tpl_id in ("visible", "secret", "unassigned"):
+        state.quest_templates[tpl_id] = QuestTemplate(id=tpl_id, name=tpl_id)
+    service = CampaignService(state)
+    service.add_item_instance("owned")
+    service.assign_quest_from_template("visible")
+    service.assign_quest_from_template("secret")
+    service.update_quest_status(state.active_quests[1].id, QuestStatus.hidden)
+    service.upsert_ability(Ability(id="shown", name="Shown"), scope="library")
+    service.upsert_ability(Ability(id="masked", name="Masked", hidden=True), scope="library")
+    cache = SnapshotFragmentCache(service)
+
+    host = json.loads(cache.encode(1))["snapshot"]
+    player = json.loads(cache.encode(1, PLAYER_ROLE))["snapshot"]
+
+    assert host == serialize_campaign_state(state)
+    assert set(player["item_templates"]) == {"owned"}
+    assert set(player["quest_templates"]) == {"visible"}
+    assert [quest["template_id"] for quest in player["active_quests"]] == ["visible"]
+    assert set(player["abilities"]) == {"shown"}
+    assert player["message_templates"] == {}
+    assert set(player["classes"]) == {state.character.class_id}
+
+    service.add_item_instance("unowned")
+    player = json.loads(cache.encode(2, PLAYER_ROLE))["snapshot"]
+    assert set(player["item_templates"]) == {"owned", "unowned"}
+
+
+def test_events_are_served_in_pages_with_cursors(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=4)
+    service = CampaignService(repo.load())
+    for value in range(10):
+        repo.commit(service.update_currency("gold", value), service.state)
+
+    async def scenario():
+        async_repo = ThreadedCampaignRepository(repo)
+        context = ApiContext(
+            service=service,
+            pairing=PairingManager(),
+            hub=WebSocketHub(),
+            repo=repo,
+            async_repo=async_repo,
+            persistence=PersistenceQueue(repo),
+        )
+        auth = f"Bearer {context.pairing.set_pin('1234')}"
+
+        async def page(**params):
+            params = {
+                "after_seq": 0,
+                "before_seq": None,
+                "limit": 4,
+                "kinds": None,
+                "actor": None,
+                "order": "desc",
+                "cursor": None,
+                **params,
+            }
+            return await list_events(**params, context=context, authorization=auth)
+
+        pages = [await page()]
+        while pages[-1]["next_cursor"]:
+            pages.append(await page(cursor=pages[-1]["next_cursor"]))
+        try:
+            await page(cursor="not-a-cursor")
+        except HTTPException as exc:
+            bad_cursor = exc.status_code
+        await context.persistence.close()
+        async_repo.close()
+        return pages, bad_cursor
+
+    pages, bad_cursor = asyncio.run(scenario())
+
+    assert [[event["seq"] for event in page["events"]] for page in pages] == [
+        [10, 9, 8, 7],
+        [6, 5, 4, 3],
+        [2, 1],
+    ]
+    assert bad_cursor == 400
+
+
+def test_history_lists_the_events_of_one_entity(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=4)
+    state = repo.load()
+    for tpl_id in ("first", "second"):
+        state.quest_templates[tpl_id] = QuestTemplate(id=tpl_id, name=tpl_id)
+    service = CampaignService(state)
+    for tpl_id in ("first", "second"):
+        repo.commit(service.assign_quest_from_template(tpl_id), service.state)
+    first = state.active_quests[0].id
+    repo.commit(service.update_currency("gold", 5), service.state)
+    repo.commit(service.update_quest_status(first, QuestStatus.completed), service.state)
+
+    async def scenario():
+        async_repo = ThreadedCampaignRepository(repo)
+        context = ApiContext(
+            service=service,
+            pairing=PairingManager(),
+            hub=WebSocketHub(),
+            repo=repo,
+            async_repo=async_repo,
+            persistence=PersistenceQueue(repo),
+        )
+        host_auth = f"Bearer {context.pairing.set_pin('1234')}"
+        player_auth = f"Bearer {context.pairing.pair_player('1234')}"
+        route = next(route for route in router.routes if route.path.startswith("/api/history/"))
+        (require_host,) = [dependency.dependency for dependency in route.dependencies]
+        await require_host(authorization=host_auth, context=context)
+        try:
+            await require_host(authorization=player_auth, context=context)
+        except HTTPException as exc:
+            player_status = exc.status_code
+        history = await entity_history("quest", first, context=context)
+        try:
+            await entity_history("dragon", first, context=context)
+        except HTTPException as exc:
+            unknown_type = exc.status_code
+        await context.persistence.close()
+        async_repo.close()
+        return history, unknown_type, player_status
+
+    history, unknown_type, player_status = asyncio.run(scenario())
+
+    assert history["entity_id"] == first
+    assert [event["kind"] for event in history["events"]] == ["quest.assigned", "quest.status"]
+    assert [event["seq"] for event in history["events"]] == [1, 4]
+    assert unknown_type == 404
+    assert player_status == 403
+
+
+class _RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, payload):
+        self.sent.append(payload)
+
+
+def test_players_get_events_without_hidden_entities(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    state = repo.load()
+    state.quest_templates["secret"] = QuestTemplate(id="secret", name="Secret")
+    service = CampaignService(state)
+    events = service.assign_quest_from_template("secret")
+    events += service.update_quest_status(state.active_quests[0].id, QuestStatus.hidden)
+    events += service.upsert_ability(
+        Ability(id="masked", name="Masked", hidden=True), scope="library"
+    )
+    repo.commit(events, service.state)
+
+    async def scenario():
+        async_repo = ThreadedCampaignRepository(repo)
+        context = ApiContext(
+            service=service,
+            pairing=PairingManager(),
+            hub=WebSocketHub(),
+            repo=repo,
+            async_repo=async_repo,
+            persistence=PersistenceQueue(repo),
+        )
+        host_auth = f"Bearer {context.pairing.set_pin('1234')}"
+        player_auth = f"Bearer {context.pairing.pair_player('1234')}"
+        params = {"after_seq": 0, "before_seq": None, "limit": 10, "kinds": None}
+        params.update({"actor": None, "order": "asc", "cursor": None, "context": context})
+        host = await list_events(**params, authorization=host_auth)
+        player = await list_events(**params, authorization=player_auth)
+        host_socket, player_socket = _RecordingSocket(), _RecordingSocket()
+        await context.hub.connect(host_socket)
+        await context.hub.connect(player_socket, PLAYER_ROLE)
+        await context.hub.broadcast_events(repo.list_events(), service.state)
+        await context.persistence.close()
+        async_repo.close()
+        return host["events"], player["events"], host_socket.sent, player_socket.sent
+
+    host, player, host_sent, player_sent = asyncio.run(scenario())
+
+    assert host == [event.to_dict() for event in repo.list_events()]
+    assert [event["seq"] for event in player] == [1, 2, 3]
+    assert host[1]["payload"]["quest"]["template_id"] == "secret"
+    assert "template_id" not in json.dumps(player)
+    assert "Masked" not in json.dumps(player)
+    assert player[2]["payload"] == {
+        "character_id": state.character.id,
+        "scope": "library",
+        "ability_id": "masked",
+        "hidden": True,
+    }
+    assert host_sent == [{"type": "events", "items": host}]
+    assert player_sent == [{"type": "events", "items": player}]
+
+
+def test_players_get_template_upserts_only_for_what_they_own():
+    service = CampaignService(create_default_campaign_state())
+    events = service.upsert_message_template(
+        None, "Ambush", "Boss ambush", "spoiler", MessageSeverity.info, True
+    )
+    for name in ("owned", "unowned"):
+        events += service.upsert_item_template(
+            name, name, ItemType.misc, Rarity.white, f"{name} loot", [], False, {}, []
+        )
+    service.add_item_instance("owned")
+    for seq, event in enumerate(events, start=1):
+        event.seq = seq
+
+    host = project_events(events, HOST_ROLE, service.state)
+    player = project_events(events, PLAYER_ROLE, service.state)
+
+    assert [event["seq"] for event in player] == [1, 2, 3]
+    assert host[0]["payload"]["template"]["body"] == "spoiler"
+    assert player[0]["payload"] == {}
+    assert player[1]["payload"] == host[1]["payload"]
+    assert player[2]["payload"] == {}
+
+
+def test_player_linkables_follow_the_player_snapshot():
+    state = create_default_campaign_state()
+    for tpl_id in ("owned", "unowned"):
+        state.item_templates[tpl_id] = ItemTemplate(
+            id=tpl_id, name=tpl_id, item_type=ItemType.misc
+        )
+    for tpl_id in ("visible", "secret", "unassigned"):
+        state.quest_templates[tpl_id] = QuestTemplate(id=tpl_id, name=tpl_id)
+    service = CampaignService(state)
+    service.add_item_instance("owned")
+    service.assign_quest_from_template("visible")
+    service.assign_quest_from_template("secret")
+    service.update_quest_status(state.active_quests[1].id, QuestStatus.hidden)
+    context = ApiContext(
+        service=service,
+        pairing=PairingManager(),
+        hub=WebSocketHub(),
+        repo=None,
+        async_repo=None,
+        persistence=None,
+    )
+
+    catalog = list_player_linkables(context)
+
+    assert [entry["id"] for entry in catalog["items"]] == ["owned"]
+    assert [entry["id"] for entry in catalog["quests"]] == ["visible"]
+
+
+def test_export_includes_accepted_commits_and_stops_at_its_header(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+
+    async def scenario():
+        context = ApiContext(
+            service=service,
+            pairing=PairingManager(),
+            hub=WebSocketHub(),
+            repo=repo,
+            async_repo=ThreadedCampaignRepository(repo),
+            persistence=PersistenceQueue(repo, wait=COMMIT_WAIT_ACCEPTED),
+        )
+
+        async def commit(value):
+            await context.persistence.commit(
+                service.update_currency("gold", value),
+                service.state,
+                service.take_dirty_sections(),
+            )
+
+        await commit(5)
+        response = await export_campaign(format="json", context=context)
+        await commit(7)
+        await context.persistence.flush()
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        await context.persistence.close()
+        context.async_repo.close()
+        return json.loads(body)
+
+    exported = asyncio.run(scenario())
+
+    assert exported["last_seq"] == 1
+    assert [event["seq"] for event in exported["events"]] == [1]
+    assert exported["snapshot"]["character"]["currencies"]["gold"] == 5
+    assert repo.get_last_seq() == 2
+
+
+class _ThreadRecordingRepo(JsonlCampaignRepository):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.import_threads = set()
+
+    def import_events_batch(self, records, reset=False):
+        self.import_threads.add(threading.current_thread().name)
+        return super().import_events_batch(records, reset)
+
+
+class _StreamedRequest:
+    def __init__(self, chunks, between):
+        self.chunks = chunks
+        self.between = between
+
+    async def stream(self):
+        for number, chunk in enumerate(self.chunks):
+            yield chunk
+            if number == 0:
+                await self.between()
+
+
+def test_streamed_import_holds_commits_until_it_finishes(tmp_path):
+    source = JsonlCampaignRepository(tmp_path / "source.json")
+    source_service = CampaignService(source.load())
+    for value in range(10):
+        source.commit(source_service.update_currency("silver", value), source_service.state)
+    body = b"".join(iter_export(source, "ndjson", include_snapshot=False))
+    chunks = [body[start:start + 200] for start in range(0, len(body), 200)]
+
+    repo = _ThreadRecordingRepo(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+
+    async def scenario():
+        async_repo = ThreadedCampaignRepository(repo)
+        context = ApiContext(
+            service=service,
+            pairing=PairingManager(),
+            hub=WebSocketHub(),
+            repo=repo,
+            async_repo=async_repo,
+            persistence=PersistenceQueue(repo),
+        )
+        live = []
+
+        async def commit_meanwhile():
+            events = service.update_currency("gold", 5)
+            live.append(
+                asyncio.ensure_future(
+                    context.persistence.commit(
+                        events, service.state, service.take_dirty_sections()
+                    )
+                )
+            )
+            await asyncio.sleep(0.05)
+            assert not live[0].done()
+
+        request = _StreamedRequest(chunks, commit_meanwhile)
+        result = await import_log_stream(request, resume_after=None, context=context)
+        committed = await live[0]
+        await context.persistence.close()
+        async_repo.close()
+        return result, committed
+
+    result, committed = asyncio.run(scenario())
+
+    assert result["events"] == 10
+    assert [event.seq for event in committed] == [11]
+    stored = repo.list_events()
+    assert [event.seq for event in stored] == list(range(1, 12))
+    assert [event.payload["new_value"] for event in stored[:10]] == list(range(10))
+    assert repo.import_threads and all(
+        name.startswith("aether-persist") for name in repo.import_threads
+    )
@@ -4,7 +4,16 @@ from app.permissions import PLAYER_ROLE
 from app.services import CampaignService
 from domain.errors import QuestError
 from domain.errors import DomainError
-from domain.models import EquipmentSlot, ItemInstance, ItemTemplate, ItemType, Objective, QuestTemplate
+from domain.models import (
+    SECTION_CHATS,
+    SECTION_QUESTS,
+    EquipmentSlot,
+    ItemInstance,
+    ItemTemplate,
+    ItemType,
+    Objective,
+    QuestTemplate,
+)
 from storage.json_repo import create_default_campaign_state
 
 
@@ -93,3 +102,15 @@ def test_host_chat_message_requires_contact():
     assert state.chats[chat_id].messages[0].text == "Hello"
     assert state.chats[chat_id].messages[0].links[0].title == "Старейшина"
     assert events[0].payload["links"] == [link_payload]
+
+
+def test_service_tracks_dirty_sections():
+    state = create_default_campaign_state()
+    state.quest_templates["quest_tpl"] = QuestTemplate(id="quest_tpl", name="Quest")
+    service = CampaignService(state)
+
+    service.assign_quest_from_template("quest_tpl")
+    service.add_chat_contact("Торговец")
+
+    assert service.take_dirty_sections() == {SECTION_QUESTS, SECTION_CHATS}
+    assert service.take_dirty_sections() == set()
@@ -0,0 +1,170 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import CampaignService
+from domain.models import ChatContact, ItemInstance, QuestTemplate
+from server.persistence import COMMIT_WAIT_ACCEPTED, PersistenceQueue
+from storage.json_repo import serialize_campaign_state
+from storage.jsonl_repo import JsonlCampaignRepository
+
+
+class _CountingRepo(JsonlCampaignRepository):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.snapshot_writes = 0
+        self.fail = False
+
+    def commit_snapshot(self, events, snapshot, partial=False):
+        if self.fail:
+            raise OSError("disk full")
+        self.snapshot_writes += 1
+        return super().commit_snapshot(events, snapshot, partial)
+
+
+def test_back_to_back_commits_are_coalesced(tmp_path):
+    repo = _CountingRepo(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+
+    async def scenario():
+        queue = PersistenceQueue(repo)
+        commits = []
+        for value in range(10):
+            events = service.update_currency("gold", value)
+            commits.append(queue.commit(events, service.state, service.take_dirty_sections()))
+        results = await asyncio.gather(*commits)
+        await queue.close()
+        return queue, results
+
+    queue, results = asyncio.run(scenario())
+
+    assert [events[0].seq for events in results] == list(range(1, 11))
+    assert queue.commits == 10
+    assert repo.snapshot_writes == queue.writes < 10
+    reopened = JsonlCampaignRepository(tmp_path / "campaign.json")
+    assert reopened.load().character.currencies["gold"] == 9
+    assert [event.payload["new_value"] for event in reopened.list_events()] == list(range(10))
+
+
+def test_accepted_commit_returns_before_the_write(tmp_path):
+    repo = _CountingRepo(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+
+    async def scenario():
+        queue = PersistenceQueue(repo, wait=COMMIT_WAIT_ACCEPTED)
+        events = await queue.commit(
+            service.update_currency("gold", 7), service.state, service.take_dirty_sections()
+        )
+        # The snapshot was copied at submit time, so later edits do not leak in.
+        service.state.character.currencies["gold"] = 99
+        written_before_flush = repo.snapshot_writes
+        await queue.flush()
+        await queue.close()
+        return events, written_before_flush
+
+    events, written_before_flush = asyncio.run(scenario())
+
+    assert written_before_flush == 0
+    assert events[0].seq == 1
+    assert repo.load().character.currencies["gold"] == 7
+
+
+def test_failed_write_reaches_durable_waiters(tmp_path):
+    repo = _CountingRepo(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+
+    async def scenario():
+        queue = PersistenceQueue(repo)
+        repo.fail = True
+        with pytest.raises(OSError):
+            await queue.commit(service.update_currency("gold", 1), service.state)
+        repo.fail = False
+        events = await queue.commit(service.update_currency("gold", 2), service.state)
+        await queue.close()
+        return events
+
+    assert asyncio.run(scenario())[0].seq == 1
+    assert repo.get_last_seq() == 1
+
+
+def test_release_keeps_sections_not_yet_written(tmp_path):
+    repo = _CountingRepo(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+
+    async def scenario():
+        queue = PersistenceQueue(repo, wait=COMMIT_WAIT_ACCEPTED)
+        await queue.commit(
+            service.send_system_message("Dawn", "The gates open."),
+            service.state,
+            service.take_dirty_sections(),
+        )
+        service.state.chats
+        queued = await queue.release_clean_sections(service.state, service.dirty_sections)
+        service.send_system_message("Dusk", "The gates close.")
+        unsaved = await queue.release_clean_sections(service.state, service.dirty_sections)
+        await queue.close()
+        return queued, unsaved
+
+    queued, unsaved = asyncio.run(scenario())
+
+    # The queued commit is flushed before releasing; an unsubmitted edit pins its section.
+    assert sorted(queued) == ["chats", "system_messages"]
+    assert unsaved == []
+    assert [msg.title for msg in service.state.system_messages] == ["Dawn", "Dusk"]
+
+
+def test_commit_after_a_failed_write_saves_the_sections_it_lost(tmp_path):
+    repo = _CountingRepo(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+
+    async def scenario():
+        queue = PersistenceQueue(repo)
+        repo.fail = True
+        with pytest.raises(OSError):
+            await queue.commit(
+                service.send_system_message("Dawn", "The gates open."),
+                service.state,
+                service.take_dirty_sections(),
+            )
+        repo.fail = False
+        # Only the character is dirty now; the messages section rides along anyway.
+        await queue.commit(
+            service.update_currency("gold", 3), service.state, service.take_dirty_sections()
+        )
+        await queue.commit(
+            service.update_currency("gold", 4), service.state, service.take_dirty_sections()
+        )
+        await queue.close()
+
+    asyncio.run(scenario())
+
+    reopened = JsonlCampaignRepository(tmp_path / "campaign.json")
+    state = reopened.load()
+    assert [msg.title for msg in state.system_messages] == ["Dawn"]
+    assert state.character.currencies["gold"] == 4
+
+
+def test_queued_snapshot_does_not_follow_later_state_changes(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    state = repo.load()
+    state.character.inventory.add(ItemInstance(id="inst", template_id="tpl", meta={"runes": []}))
+    state.quest_templates["quest"] = QuestTemplate(id="quest", name="Q", rewards={"items": []})
+    state.contacts["npc"] = ChatContact(id="npc", display_name="N", link_payload={"tags": []})
+    service = CampaignService(state)
+
+    async def scenario():
+        queue = PersistenceQueue(repo)
+        pending = await queue.submit(service.update_currency("gold", 5), state)
+        before = json.dumps(serialize_campaign_state(state), sort_keys=True)
+        state.character.currencies["gold"] = 99
+        state.character.inventory.items["inst"].meta["runes"].append("fire")
+        state.quest_templates["quest"].rewards["items"].append("sword")
+        state.contacts["npc"].link_payload["tags"].append("ally")
+        queued = json.dumps(pending.snapshot, sort_keys=True)
+        await queue.close()
+        return before, queued
+
+    before, queued = asyncio.run(scenario())
+
+    assert queued == before
@@ -0,0 +1,62 @@
+import pytest
+
+from domain.events import EventLogEntry
+from domain.helpers import utcnow
+from storage.checkpoints import RetentionPolicy
+from storage.json_repo import JsonCampaignRepository
+from storage.sqlite_repo import SqliteCampaignRepository, sqlite_paths_for
+
+
+def _event(kind="xp.granted", **payload):
+    return EventLogEntry(seq=0, ts=utcnow(), actor="host", kind=kind, payload=payload)
+
+
+def test_sqlite_commit_and_range_read(tmp_path):
+    repo = SqliteCampaignRepository(tmp_path / "campaign.sqlite3")
+    state = repo.load()
+    state.character.currencies["gold"] = 10
+
+    repo.commit([_event(amount=1), _event(amount=2), _event(amount=3)], state)
+
+    assert repo.get_last_seq() == 3
+    assert [event.payload["amount"] for event in repo.list_events(after_seq=1)] == [2, 3]
+    reopened = SqliteCampaignRepository(tmp_path / "campaign.sqlite3")
+    assert reopened.load().character.currencies == {"gold": 10}
+    assert reopened.append_events([_event(amount=4)])[0].seq == 4
+
+
+def test_sqlite_imports_existing_json_store(tmp_path):
+    json_path = tmp_path / "campaign.json"
+    legacy = JsonCampaignRepository(json_path)
+    state = legacy.load()
+    state.character.name = "Imported"
+    legacy.commit([_event(amount=7)], state)
+
+    db_path, source = sqlite_paths_for(json_path)
+    repo = SqliteCampaignRepository(db_path)
+
+    assert repo.import_json_store(source) is True
+    assert repo.load().character.name == "Imported"
+    assert [event.payload for event in repo.list_events()] == [{"amount": 7}]
+    assert repo.import_json_store(source) is False
+    assert repo.export_templates()["item_templates"] == {}
+
+
+def test_sqlite_iter_events_pages_with_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr("storage.sqlite_repo.EVENT_PAGE_SIZE", 2)
+    repo = SqliteCampaignRepository(tmp_path / "campaign.sqlite3")
+    repo.append_events([_event(amount=index) for index in range(7)])
+
+    assert [event.seq for event in repo.iter_events(after_seq=2, limit=3)] == [3, 4, 5]
+    assert [event.seq for event in repo.iter_events(after_seq=4)] == [5, 6, 7]
+
+
+def test_sqlite_refuses_a_retention_window(tmp_path):
+    with pytest.raises(ValueError):
+        SqliteCampaignRepository(
+            tmp_path / "campaign.sqlite3", retention=RetentionPolicy(keep_events=100)
+        )
+    with pytest.raises(ValueError):
+        SqliteCampaignRepository(
+            tmp_path / "campaign.sqlite3", retention=RetentionPolicy(keep_days=7)
+        )
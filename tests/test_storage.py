@@ -0,0 +1,870 @@
+import asyncio
+import json
+import threading
+from copy import deepcopy
+
+import pytest
+
+from app.permissions import PLAYER_ROLE
+from app.services import CampaignService
+from domain.events import EventLogEntry
+from domain.helpers import utcnow
+from domain.models import SECTION_CHARACTER, EquipmentSlot, ItemType, MessageSeverity, Rarity
+from storage import event_log
+from storage.async_repo import ThreadedCampaignRepository
+from storage.checkpoints import RetentionPolicy
+from storage.codecs import (
+    MAGIC,
+    ContainerCodec,
+    MarshalCodec,
+    SnapshotContainer,
+    decode_any,
+    get_codec,
+)
+from storage.durability import Durability
+from storage.event_query import EventQuery
+from storage.json_repo import (
+    LAZY_SNAPSHOT_KEYS,
+    JsonCampaignRepository,
+    LazyCampaignState,
+    serialize_campaign_state,
+)
+from storage.jsonl_repo import JsonlCampaignRepository
+from storage.sqlite_repo import SqliteCampaignRepository
+from storage.streaming import NdjsonImporter, iter_export
+
+
+def _event(kind="xp.granted", **payload):
+    return EventLogEntry(seq=0, ts=utcnow(), actor="host", kind=kind, payload=payload)
+
+
+def test_jsonl_append_does_not_touch_snapshot(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=2)
+    repo.save(repo.load())
+    snapshot_before = (tmp_path / "campaign.json").read_text(encoding="utf-8")
+
+    repo.append_events([_event(amount=1), _event(amount=2), _event(amount=3)])
+
+    assert (tmp_path / "campaign.json").read_text(encoding="utf-8") == snapshot_before
+    assert len(repo.log.segment_paths()) == 2
+    assert [event.seq for event in repo.list_events(after_seq=1)] == [2, 3]
+    assert JsonlCampaignRepository(tmp_path / "campaign.json").get_last_seq() == 3
+
+
+def test_jsonl_migrates_single_file_store(tmp_path):
+    legacy = JsonCampaignRepository(tmp_path / "campaign.json")
+    legacy.append_events([_event(amount=5), _event(amount=7)])
+
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+
+    assert [event.payload["amount"] for event in repo.list_events()] == [5, 7]
+    stored = json.loads((tmp_path / "campaign.json").read_text(encoding="utf-8"))
+    assert "events" not in stored
+    assert stored["last_seq"] == 2
+    assert repo.append_events([_event(amount=9)])[0].seq == 3
+
+
+def test_jsonl_drops_half_written_record(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    repo.append_events([_event(amount=1)])
+    segment = repo.log.segment_paths()[-1]
+    with segment.open("a", encoding="utf-8") as handle:
+        handle.write('{"seq": 2, "ts": ')
+
+    reopened = JsonlCampaignRepository(tmp_path / "campaign.json")
+
+    assert reopened.append_events([_event(amount=2)])[0].seq == 2
+    assert [event.seq for event in reopened.list_events()] == [1, 2]
+
+
+def test_commit_writes_events_and_snapshot_once(tmp_path, monkeypatch):
+    repo = JsonCampaignRepository(tmp_path / "campaign.json")
+    state = repo.load()
+    state.character.name = "Committed"
+    writes = []
+    original_write = repo._write_data
+    monkeypatch.setattr(repo, "_write_data", lambda data: writes.append(1) or original_write(data))
+
+    persisted = repo.commit([_event(amount=3)], state)
+
+    assert len(writes) == 1
+    assert persisted[0].seq == 1
+    assert repo.get_last_seq() == 1
+    assert repo.load().character.name == "Committed"
+
+
+def test_jsonl_commit_tags_snapshot_with_last_seq(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    state = repo.load()
+
+    repo.commit([_event(amount=1), _event(amount=2)], state)
+
+    stored = json.loads((tmp_path / "campaign.json").read_text(encoding="utf-8"))
+    assert stored["last_seq"] == 2
+    shard = json.loads((tmp_path / "campaign.sections" / "id.json").read_text(encoding="utf-8"))
+    assert shard == {"last_seq": 2, "data": state.id}
+
+
+def test_json_repo_serves_reads_from_memory(tmp_path, monkeypatch):
+    repo = JsonCampaignRepository(tmp_path / "campaign.json")
+    repo.append_events([_event(amount=1), _event(amount=2)])
+    monkeypatch.setattr(json, "loads", lambda *args, **kwargs: pytest.fail("store re-read"))
+
+    assert repo.get_last_seq() == 2
+    assert [event.seq for event in repo.list_events(after_seq=1)] == [2]
+    repo.append_events([_event(amount=3)])
+    assert [event.seq for event in repo.list_events(after_seq=1)] == [2, 3]
+
+
+def test_json_repo_reloads_after_external_write(tmp_path):
+    repo = JsonCampaignRepository(tmp_path / "campaign.json")
+    repo.append_events([_event(amount=1)])
+    other = JsonCampaignRepository(tmp_path / "campaign.json")
+    other.append_events([_event(amount=2), _event(amount=3)])
+
+    assert repo.get_last_seq() == 3
+    assert [event.payload["amount"] for event in repo.list_events()] == [1, 2, 3]
+
+
+def test_commit_replaces_file_atomically_and_reports_fsync(tmp_path):
+    repo = JsonCampaignRepository(tmp_path / "campaign.json", durability=Durability("always"))
+
+    repo.commit([_event(amount=1)], repo.load())
+
+    stats = repo.get_storage_stats()
+    assert stats["durability"] == "always"
+    assert stats["last_commit"]["fsync_calls"] >= 2
+    assert stats["last_commit"]["bytes_written"] > 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "campaign.checkpoints",
+        "campaign.json",
+    ]
+
+
+def test_batch_durability_defers_fsync_to_group_flush(tmp_path):
+    durability = Durability("batch", window_ms=10_000)
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", durability=durability)
+
+    repo.commit([_event(amount=1)], repo.load(), sections=())
+
+    # The replaced snapshot file is synced before its rename; the appended
+    # segment and the directories wait for the group flush.
+    assert durability.last_commit.deferred is True
+    assert durability.last_commit.fsync_calls == 1
+    assert durability._pending == {repo.log.segment_paths()[0]}
+    assert tmp_path in durability._pending_directories
+    durability.flush()
+    assert not durability._pending
+    assert not durability._pending_directories
+
+
+def test_jsonl_iter_events_seeks_with_offset_index(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=4)
+    repo.append_events([_event(amount=index) for index in range(10)])
+
+    assert [event.seq for event in repo.iter_events(after_seq=5, limit=3)] == [6, 7, 8]
+    assert [event.seq for event in repo.iter_events(after_seq=9)] == [10]
+    assert list(repo.iter_events(after_seq=10)) == []
+
+    segment = repo.log.segment_paths()[1]
+    index = repo.log.segment_index(segment)
+    assert list(index.seqs) == [5, 6, 7, 8]
+    with segment.open("rb") as handle:
+        handle.seek(index.offsets[2])
+        assert json.loads(handle.readline())["seq"] == 7
+
+    fresh = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=4)
+    assert [event.seq for event in fresh.iter_events(after_seq=3, limit=2)] == [4, 5]
+
+
+def test_jsonl_checkpoints_and_archives_old_segments(tmp_path):
+    retention = RetentionPolicy(keep_events=3, checkpoint_every=4, keep_checkpoints=2)
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=2, retention=retention)
+    state = repo.load()
+
+    for amount in range(10):
+        repo.commit([_event(amount=amount)], state)
+
+    assert repo.checkpoints.seqs() == [4, 8]
+    assert repo.checkpoints.nearest(7).seq == 4
+    assert repo.checkpoints.nearest(7).snapshot["id"] == state.id
+    archived = [path.name for path in repo.log.archive_paths()]
+    assert archived == ["000000000001.jsonl", "000000000003.jsonl", "000000000005.jsonl"]
+    assert [path.name for path in repo.log.segment_paths()] == [
+        "000000000007.jsonl",
+        "000000000009.jsonl",
+    ]
+    assert [event.seq for event in repo.iter_events(after_seq=0, limit=3)] == [1, 2, 3]
+    assert len(repo.export_log()["events"]) == 10
+
+
+def test_store_is_compact_and_readable_after_codec_change(tmp_path):
+    path = tmp_path / "campaign.json"
+    repo = JsonCampaignRepository(path)
+    state = repo.load()
+    repo.commit([_event(amount=1)], state)
+    assert b"\n" not in path.read_bytes()
+
+    binary = JsonlCampaignRepository(path, codec=MarshalCodec())
+    assert binary.load().id == state.id
+    binary.commit([_event(amount=2)], state)
+    assert path.read_bytes().startswith(MAGIC)
+
+    reopened = JsonlCampaignRepository(path)
+    assert reopened.load().id == state.id
+    assert [event.seq for event in reopened.list_events()] == [1, 2]
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        get_codec("yaml")
+
+
+def test_streamed_export_matches_export_data(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=2)
+    state = repo.load()
+    for amount in range(5):
+        repo.commit([_event(amount=amount)], state)
+
+    streamed = json.loads(b"".join(iter_export(repo)))
+    exported = repo.export_data()
+    assert streamed["snapshot"] == exported["snapshot"]
+    assert streamed["events"] == exported["events"]
+    assert streamed["last_seq"] == 5
+
+    lines = b"".join(iter_export(repo, "ndjson", include_snapshot=False)).splitlines()
+    assert json.loads(lines[0]) == {"schema_version": 1, "last_seq": 5}
+    assert [json.loads(line)["seq"] for line in lines[1:]] == [1, 2, 3, 4, 5]
+
+    with pytest.raises(ValueError):
+        iter_export(repo, "xml")
+
+
+def test_exported_events_are_the_same_on_every_backend(tmp_path):
+    repos = {
+        "json": JsonCampaignRepository(tmp_path / "campaign.json"),
+        "jsonl": JsonlCampaignRepository(tmp_path / "campaign.jsonl.json", segment_events=2),
+        "sqlite": SqliteCampaignRepository(tmp_path / "campaign.sqlite3"),
+    }
+    state = repos["json"].load()
+    events = [_event(amount=amount) for amount in range(5)]
+    for repo in repos.values():
+        for event in events:
+            repo.commit([event], state)
+    repos["jsonl"].log.archive(max_seq=2)
+
+    documents = {
+        name: {
+            "data": repo.export_data()["events"],
+            "log": repo.export_log()["events"],
+            "streamed": json.loads(b"".join(iter_export(repo)))["events"],
+            "ndjson": [
+                json.loads(line)
+                for line in b"".join(iter_export(repo, "ndjson")).splitlines()[1:]
+            ],
+        }
+        for name, repo in repos.items()
+    }
+
+    expected = documents["json"]["data"]
+    assert [event["seq"] for event in expected] == [1, 2, 3, 4, 5]
+    for name, exports in documents.items():
+        for kind, exported in exports.items():
+            assert exported == expected, (name, kind)
+
+
+@pytest.mark.parametrize("backend", ["json", "jsonl", "sqlite"])
+def test_ndjson_import_round_trip_and_resume(tmp_path, backend):
+    source = JsonlCampaignRepository(tmp_path / "source.json", segment_events=3)
+    state = source.load()
+    state.character.currencies["gold"] = 42
+    for amount in range(7):
+        source.commit([_event(amount=amount)], state)
+    body = b"".join(iter_export(source, "ndjson"))
+
+    if backend == "json":
+        target = JsonCampaignRepository(tmp_path / "target.json")
+    elif backend == "jsonl":
+        target = JsonlCampaignRepository(tmp_path / "target.json", segment_events=3)
+    else:
+        target = SqliteCampaignRepository(tmp_path / "target.sqlite3")
+    target.commit([_event(amount=99)], target.load())
+
+    lines = body.splitlines(keepends=True)
+    broken = NdjsonImporter(target, batch_size=2)
+    with pytest.raises(ValueError):
+        for line in lines[:5] + [b"{not json}\n"]:
+            broken.feed(line)
+    assert broken.progress.cursor == 4
+
+    resumed = NdjsonImporter(target, resume_after=broken.progress.cursor, batch_size=2)
+    for offset in range(0, len(body), 7):
+        resumed.feed(body[offset:offset + 7])
+    progress = resumed.finish()
+
+    assert progress.skipped == 4
+    assert progress.events == 3
+    assert [event.payload["amount"] for event in target.list_events()] == list(range(7))
+    assert target.get_last_seq() == 7
+    assert target.load().character.currencies["gold"] == 42
+
+
+def test_archived_segments_are_read_through_mmap(tmp_path):
+    retention = RetentionPolicy(keep_events=2, checkpoint_every=2)
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=2, retention=retention)
+    state = repo.load()
+    for amount in range(8):
+        repo.commit([_event(amount=amount)], state)
+    archived = repo.log.archive_paths()
+    assert archived
+
+    assert [event.seq for event in repo.iter_events(after_seq=2, limit=3)] == [3, 4, 5]
+    chunks = list(repo.log.iter_lines(after_seq=1, max_seq=6))
+    assert isinstance(chunks[0], memoryview)
+    seqs = [json.loads(line)["seq"] for chunk in chunks for line in bytes(chunk).splitlines()]
+    assert seqs == [2, 3, 4, 5, 6]
+
+
+def test_jsonl_commit_rewrites_only_dirty_sections(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+    repo.save(service.state)
+    shards = tmp_path / "campaign.sections"
+    inodes = {path.name: path.stat().st_ino for path in shards.iterdir()}
+
+    events = service.update_currency("gold", 15)
+    assert service.dirty_sections == {SECTION_CHARACTER}
+    repo.commit(events, service.state, service.take_dirty_sections())
+
+    changed = {path.name for path in shards.iterdir() if path.stat().st_ino != inodes[path.name]}
+    assert changed == {"character.json"}
+    assert service.dirty_sections == set()
+    reopened = JsonlCampaignRepository(tmp_path / "campaign.json")
+    assert reopened.load().character.currencies["gold"] == 15
+    assert reopened.export_data()["snapshot"]["item_templates"] == {}
+
+
+def test_sqlite_and_json_commit_dirty_sections(tmp_path):
+    for repo in (
+        JsonCampaignRepository(tmp_path / "campaign.json"),
+        SqliteCampaignRepository(tmp_path / "campaign.sqlite3"),
+    ):
+        service = CampaignService(repo.load())
+        events = service.send_system_message("Привет", "Тело")
+        repo.commit(events, service.state, service.take_dirty_sections())
+        assert [msg.title for msg in repo.load().system_messages] == ["Привет"]
+
+
+def _play_session(service):
+    yield service.upsert_item_template(
+        None, "Меч", ItemType.weapon, Rarity.white, "", [EquipmentSlot.weapon_1], False, {}, []
+    )
+    template_id = next(iter(service.state.item_templates))
+    yield service.add_item_instance(template_id, custom_name="Клинок")
+    item_id = next(iter(service.state.character.inventory.items))
+    yield service.equip_item(item_id, EquipmentSlot.weapon_1)
+    yield service.grant_xp(500)
+    yield service.update_currency("gold", 15)
+    yield service.update_resource("hp", 5, 10)
+    yield service.send_system_message("Привет", "Тело")
+    yield service.upsert_message_template(
+        None, "Приветствие", "Привет", "Тело", MessageSeverity.info, True
+    )
+    yield service.add_chat_contact("Торговец", {"kind": "npc"})
+    contact_id = next(iter(service.state.contacts))
+    yield service.send_friend_request(contact_id)
+    request_id = next(iter(service.state.friend_requests))
+    yield service.accept_friend_request(request_id, actor_role=PLAYER_ROLE)
+    chat_id = next(iter(service.state.chats))
+    yield service.send_chat_message(chat_id, "Есть товар?", actor_role=PLAYER_ROLE)
+    yield service.remove_item_instance(item_id)
+
+
+@pytest.mark.parametrize("backend", ["json", "jsonl", "sqlite"])
+def test_state_at_replays_events_from_nearest_checkpoint(tmp_path, backend):
+    retention = RetentionPolicy(checkpoint_every=3, keep_checkpoints=10)
+    if backend == "json":
+        repo = JsonCampaignRepository(tmp_path / "campaign.json", retention=retention)
+    elif backend == "jsonl":
+        repo = JsonlCampaignRepository(tmp_path / "campaign.json", retention=retention)
+    else:
+        repo = SqliteCampaignRepository(tmp_path / "campaign.sqlite3", retention=retention)
+    service = CampaignService(repo.load())
+    history = {0: deepcopy(serialize_campaign_state(service.state))}
+    for events in _play_session(service):
+        repo.commit(events, service.state, service.take_dirty_sections())
+        history[repo.get_last_seq()] = deepcopy(serialize_campaign_state(service.state))
+
+    assert len(repo.get_storage_stats()["checkpoints"]) > 1
+    for seq, expected in history.items():
+        assert serialize_campaign_state(repo.state_at(seq)) == expected
+
+
+def test_state_at_without_checkpoint_is_rejected(tmp_path):
+    repo = JsonCampaignRepository(tmp_path / "campaign.json")
+    repo.load()
+    repo.import_log({"events": [_event(amount=1).to_dict() | {"seq": 1}], "last_seq": 1})
+
+    with pytest.raises(ValueError):
+        repo.state_at(0)
+
+
+def test_jsonl_load_replays_events_missing_from_stale_snapshot(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+    repo.commit(service.update_currency("gold", 5), service.state)
+    # Simulate a crash mid-commit: the events reached the log, the character
+    # shard was rewritten, but the manifest and the messages shard were not.
+    xp_events = service.grant_xp(10)
+    message_events = service.send_system_message("Привет", "Тело")
+    repo.append_events(xp_events + message_events)
+    shard = {
+        "last_seq": repo.get_last_seq(),
+        "data": serialize_campaign_state(service.state)["character"],
+    }
+    (tmp_path / "campaign.sections" / "character.json").write_text(json.dumps(shard))
+
+    reopened = JsonlCampaignRepository(tmp_path / "campaign.json")
+    state = reopened.load()
+
+    assert state.character.xp == service.state.character.xp
+    assert state.character.currencies["gold"] == 5
+    assert [msg.title for msg in state.system_messages] == ["Привет"]
+    manifest = json.loads((tmp_path / "campaign.json").read_text())
+    assert manifest["last_seq"] == reopened.get_last_seq()
+
+
+def test_threaded_repository_streams_reads_off_the_event_loop(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=4)
+    repo.append_events([_event(amount=amount) for amount in range(10)])
+    reader_threads = set()
+    original_iter = repo.iter_events
+
+    def tracking_iter(*args, **kwargs):
+        reader_threads.add(threading.current_thread().name)
+        return original_iter(*args, **kwargs)
+
+    repo.iter_events = tracking_iter
+    async_repo = ThreadedCampaignRepository(repo, max_workers=1, batch_size=3)
+
+    async def scenario():
+        order = []
+
+        async def scan(name):
+            async for batch in async_repo.iter_event_batches(after_seq=1):
+                order.append((name, [event.seq for event in batch]))
+
+        await asyncio.gather(scan("a"), scan("b"))
+        tail = await async_repo.list_events(after_seq=7, limit=2)
+        return order, tail, await async_repo.get_last_seq()
+
+    order, tail, last_seq = asyncio.run(scenario())
+    async_repo.close()
+
+    assert threading.current_thread().name not in reader_threads
+    assert [seqs for name, seqs in order if name == "a"] == [[2, 3, 4], [5, 6, 7], [8, 9, 10]]
+    # A single read thread still serves both scans batch by batch.
+    assert [name for name, _ in order[:2]] == ["a", "b"]
+    assert [event.seq for event in tail] == [8, 9]
+    assert last_seq == 10
+
+
+def _damage_record(repo, seq):
+    """Flip a digit inside a stored record so the line is still valid JSON."""
+    for segment in repo.log.archive_paths() + repo.log.segment_paths():
+        lines = segment.read_bytes().splitlines(keepends=True)
+        for position, line in enumerate(lines):
+            if line.startswith(b'{"seq":%d,' % seq):
+                digit = line.index(b'"payload":') + 20
+                while not line[digit:digit + 1].isdigit():
+                    digit += 1
+                flipped = b"%d" % ((int(line[digit:digit + 1]) + 1) % 10)
+                lines[position] = line[:digit] + flipped + line[digit + 1:]
+                segment.write_bytes(b"".join(lines))
+                return
+    raise AssertionError(f"seq {seq} not found")
+
+
+def test_jsonl_skips_records_failing_their_checksum(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=2)
+    repo.append_events([_event(amount=amount * 11) for amount in range(5)])
+    _damage_record(repo, 3)
+    _damage_record(repo, 5)
+
+    reopened = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=2)
+
+    assert [event.seq for event in reopened.list_events()] == [1, 2, 4]
+    lines = b"".join(reopened.iter_event_lines()).splitlines()
+    assert [json.loads(line)["seq"] for line in lines] == [1, 2, 4]
+    assert [record.seq for record in reopened.log.damaged_records()] == [3, 5]
+    # The damaged tail record keeps its seq reserved.
+    assert reopened.append_events([_event(amount=1)])[0].seq == 6
+
+
+def test_corrupt_jsonl_store_is_rebuilt_from_checkpoint_and_intact_events(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+    seqs = []
+    for events in _play_session(service):
+        seqs.append(repo.commit(events, service.state, service.take_dirty_sections())[-1].seq)
+    expected = serialize_campaign_state(service.state)
+    gold_seq = seqs[4]
+    _damage_record(repo, gold_seq)
+    (tmp_path / "campaign.json").write_bytes(b'{"sections": ["charac')
+    (tmp_path / "campaign.sections" / "system_messages.json").write_bytes(b"\x00\x00")
+
+    reopened = JsonlCampaignRepository(tmp_path / "campaign.json")
+    restored = serialize_campaign_state(reopened.load())
+
+    # Messages are replayed from checkpoint 0; the character shard survived
+    # and still carries the currency change from the damaged record.
+    assert restored == expected
+    report = reopened.get_storage_stats()["recovery"]
+    assert report["checkpoint_seq"] == 0
+    assert report["lost_seqs"] == [gold_seq]
+    assert "system_messages" not in report["sections_from_shards"]
+    assert "character" in report["sections_from_shards"]
+    assert reopened.get_last_seq() == seqs[-1]
+    assert list(tmp_path.glob("campaign.json.corrupt-*"))
+
+
+def test_corrupt_json_store_restarts_from_latest_checkpoint(tmp_path):
+    retention = RetentionPolicy(checkpoint_every=2)
+    repo = JsonCampaignRepository(tmp_path / "campaign.json", retention=retention)
+    service = CampaignService(repo.load())
+    for amount in (10, 20, 30):
+        repo.commit(service.grant_xp(amount), service.state, service.take_dirty_sections())
+    checkpoint_seq = repo.checkpoints.latest_seq()
+    (tmp_path / "campaign.json").write_bytes(b"{broken")
+
+    reopened = JsonCampaignRepository(tmp_path / "campaign.json", retention=retention)
+
+    assert reopened.get_last_seq() == checkpoint_seq
+    assert reopened.load().character.xp == repo.checkpoints.latest().snapshot["character"]["xp"]
+    report = reopened.get_storage_stats()["recovery"]
+    assert report["reason"] == "undecodable store"
+    assert report["lost_after_seq"] == checkpoint_seq
+
+
+def test_archived_segments_are_compressed_in_blocks(tmp_path, monkeypatch):
+    decompressed = []
+    compress, decompress = event_log._COMPRESSORS["zlib"]
+
+    def counting_decompress(data):
+        decompressed.append(len(data))
+        return decompress(data)
+
+    monkeypatch.setitem(event_log._COMPRESSORS, "zlib", (compress, counting_decompress))
+    plain = JsonlCampaignRepository(
+        tmp_path / "plain.json",
+        segment_events=50,
+        retention=RetentionPolicy(keep_events=20, checkpoint_every=50),
+    )
+    repo = JsonlCampaignRepository(
+        tmp_path / "campaign.json",
+        segment_events=50,
+        retention=RetentionPolicy(keep_events=20, checkpoint_every=50, archive_compression="zlib"),
+    )
+    repo.log.block_bytes = 1024
+    state = repo.load()
+    text = "Торговец предлагает редкий товар. " * 8
+    for amount in range(200):
+        events = [_event("message.sent", amount=amount, text=text)]
+        plain.commit(deepcopy(events), state, sections=())
+        repo.commit(events, state, sections=())
+
+    archived = [path.name for path in repo.log.archive_paths()]
+    assert archived == ["000000000001.jsonl.z", "000000000051.jsonl.z", "000000000101.jsonl.z"]
+    assert repo.get_storage_stats()["archive_bytes"] * 5 < plain.get_storage_stats()["archive_bytes"]
+
+    decompressed.clear()
+    assert [event.seq for event in repo.iter_events(after_seq=60, limit=2)] == [61, 62]
+    assert len(decompressed) == 1
+    assert repo.export_log() == plain.export_log()
+    lines = b"".join(bytes(chunk) for chunk in repo.iter_event_lines(after_seq=40, max_seq=120))
+    assert [json.loads(line)["seq"] for line in lines.splitlines()] == list(range(41, 121))
+
+    # Segments archived before compression was turned on are picked up too.
+    enabled = JsonlCampaignRepository(
+        tmp_path / "plain.json",
+        segment_events=50,
+        retention=RetentionPolicy(keep_events=20, checkpoint_every=50, archive_compression="lzma"),
+    )
+    assert [path.name for path in enabled.log.compress_archive()][0] == "000000000001.jsonl.xz"
+    assert enabled.export_log() == plain.export_log()
+
+
+def test_container_store_decodes_only_requested_sections(tmp_path, monkeypatch):
+    path = tmp_path / "campaign.json"
+    repo = JsonCampaignRepository(path, codec=ContainerCodec())
+    service = CampaignService(repo.load())
+    for events in _play_session(service):
+        repo.commit(events, service.state, service.take_dirty_sections())
+    expected = serialize_campaign_state(service.state)
+    decoded = []
+    section = SnapshotContainer.section
+    monkeypatch.setattr(
+        SnapshotContainer, "section", lambda self, name: decoded.append(name) or section(self, name)
+    )
+
+    reopened = JsonCampaignRepository(path, codec=ContainerCodec())
+    assert reopened.get_last_seq() == repo.get_last_seq()
+    assert reopened.export_templates()["item_templates"] == expected["item_templates"]
+    assert decoded == [
+        "snapshot/item_templates",
+        "snapshot/quest_templates",
+        "snapshot/message_templates",
+    ]
+    assert serialize_campaign_state(reopened.load()) == expected
+    assert "events" not in decoded
+
+    assert [event.seq for event in reopened.list_events()] == [
+        event.seq for event in repo.list_events()
+    ]
+    assert decode_any(path.read_bytes()) == repo.export_data()
+
+
+@pytest.mark.parametrize("backend", ["json", "jsonl", "sqlite"])
+def test_lazy_state_loads_sections_on_first_access(tmp_path, backend):
+    if backend == "sqlite":
+        repo = SqliteCampaignRepository(tmp_path / "campaign.sqlite3")
+    elif backend == "jsonl":
+        repo = JsonlCampaignRepository(tmp_path / "campaign.json")
+    else:
+        repo = JsonCampaignRepository(tmp_path / "campaign.json")
+    service = CampaignService(repo.load())
+    service.send_system_message("Dawn", "The gates open.")
+    service.update_currency("gold", 5)
+    repo.save(service.state)
+
+    requested = []
+    read_sections = repo._read_sections
+    repo._read_sections = lambda names=None: requested.append(names) or read_sections(names)
+    state = repo.load()
+
+    assert isinstance(state, LazyCampaignState)
+    assert state.character.currencies["gold"] == 5
+    assert state.materialized() == []
+    assert state.system_messages[0].title == "Dawn"
+    assert state.materialized() == ["system_messages"]
+    assert requested[-1] == ("system_messages",)
+
+    # Untouched sections go back to disk as stored, without being built first.
+    assert serialize_campaign_state(state) == serialize_campaign_state(service.state)
+    assert state.materialized() == ["system_messages"]
+
+    assert state.release() == ["system_messages"]
+    assert "system_messages" not in state.__dict__
+    assert state.system_messages[0].body == "The gates open."
+    assert set(LAZY_SNAPSHOT_KEYS).isdisjoint({"id", "character", "classes", "settings"})
+
+
+def test_jsonl_compaction_merges_segments_while_commits_continue(tmp_path):
+    path = tmp_path / "campaign.json"
+    repo = JsonlCampaignRepository(path, segment_events=2)
+    repo.commit_snapshot([_event(amount=value) for value in range(1, 8)], {}, partial=True)
+    (tmp_path / "campaign.sections" / "retired_section.json").write_text("{}", encoding="utf-8")
+    (tmp_path / ".campaign.json.crashed.tmp").write_bytes(b"partial")
+
+    repo = JsonlCampaignRepository(path, segment_events=10)
+    reader = repo.iter_events()
+    assert next(reader).seq == 1
+    compaction = repo.start_compaction()
+    compaction.build()
+    # Appended to the tail while the staged copy waits to be switched in.
+    repo.commit_snapshot([_event(amount=8), _event(amount=9)], {}, partial=True)
+    report = compaction.switch()
+
+    assert [segment.name for segment in repo.log.segment_paths()] == [
+        "000000000001.jsonl",
+        "000000000007.jsonl",
+    ]
+    assert report.segments_merged == 3
+    assert report.segments_skipped == 0
+    assert sorted(report.files_removed) == [".campaign.json.crashed.tmp", "retired_section.json"]
+    assert report.indexes_rebuilt == 1
+    # A reader that listed the segments before the switch still sees every event once.
+    assert [event.seq for event in reader] == list(range(2, 10))
+    reopened = JsonlCampaignRepository(path, segment_events=10)
+    assert [event.payload["amount"] for event in reopened.list_events()] == list(range(1, 10))
+    assert reopened.get_last_seq() == 9
+    assert not (tmp_path / "campaign.events.compact").exists()
+
+
+def test_jsonl_compaction_skips_segments_archived_during_build(tmp_path):
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=2)
+    repo.append_events([_event(amount=value) for value in range(1, 6)])
+    repo = JsonlCampaignRepository(tmp_path / "campaign.json", segment_events=10)
+    compaction = repo.start_compaction()
+    compaction.build()
+    repo.log.archive(max_seq=2)
+    report = compaction.switch()
+
+    assert report.segments_merged == 0
+    assert report.segments_skipped == 2
+    assert [event.seq for event in repo.list_events()] == [1, 2, 3, 4, 5]
+
+
+def test_sqlite_compaction_keeps_commits_made_during_the_copy(tmp_path):
+    retention = RetentionPolicy(checkpoint_every=1, keep_checkpoints=5)
+    repo = SqliteCampaignRepository(tmp_path / "campaign.sqlite3", retention=retention)
+    service = CampaignService(repo.load())
+    for value in range(3):
+        repo.commit(service.update_currency("gold", value), service.state)
+    compaction = repo.start_compaction()
+    compaction.build()
+    repo.commit(service.update_currency("gold", 42), service.state)
+    repo.retention.keep_checkpoints = 2
+    report = compaction.switch()
+
+    assert not report.superseded
+    assert report.checkpoints_dropped == [0, 1, 2]
+    assert repo.get_last_seq() == 4
+    assert [event.seq for event in repo.list_events()] == [1, 2, 3, 4]
+    assert repo.load().character.currencies["gold"] == 42
+    assert not (tmp_path / "campaign.sqlite3.compact").exists()
+
+
+@pytest.mark.parametrize("backend", ["json", "jsonl", "sqlite"])
+def test_query_events_filters_and_pages_in_both_directions(tmp_path, backend):
+    retention = RetentionPolicy(keep_events=10, checkpoint_every=10, archive_compression="zlib")
+    if backend == "json":
+        repo = JsonCampaignRepository(tmp_path / "campaign.json", retention=retention)
+    elif backend == "jsonl":
+        repo = JsonlCampaignRepository(
+            tmp_path / "campaign.json", segment_events=10, retention=retention
+        )
+    else:
+        repo = SqliteCampaignRepository(tmp_path / "campaign.sqlite3")
+    state = repo.load()
+    kinds = ["xp.granted", "chat.message", "currency.updated"]
+    for number in range(60):
+        event = _event(kinds[number % 3], number=number)
+        event.actor = "player" if number % 4 == 0 else "host"
+        repo.commit([event], state, sections=())
+    if backend == "jsonl":
+        assert any(path.suffix == ".z" for path in repo.log.archive_paths())
+
+    def seqs(query, limit=100):
+        return [event.seq for event in repo.query_events(query, limit)]
+
+    chats = EventQuery(kinds=frozenset({"chat.message"}))
+    assert seqs(chats) == list(range(2, 61, 3))
+    assert seqs(EventQuery(reverse=True), 3) == [60, 59, 58]
+    mixed = EventQuery(
+        kinds=frozenset({"xp.granted", "chat.message"}), actor="player", reverse=True
+    )
+    expected = [n + 1 for n in range(59, -1, -1) if n % 4 == 0 and n % 3 != 2]
+    assert seqs(mixed) == expected
+
+    # Page through with the cursor the API hands out.
+    paged, query = [], EventQuery.from_cursor(mixed.to_cursor())
+    while True:
+        page = seqs(query, 4)
+        paged.extend(page)
+        if len(page) < 4:
+            break
+        query = EventQuery.from_cursor(query.following(page[-1]).to_cursor())
+    assert paged == expected
+    assert seqs(EventQuery(after_seq=10, before_seq=15)) == [11, 12, 13, 14]
+
+
+@pytest.mark.parametrize("backend", ["json", "jsonl", "sqlite"])
+def test_entity_events_follow_one_entity_through_the_log(tmp_path, backend):
+    retention = RetentionPolicy(keep_events=10, checkpoint_every=10, archive_compression="zlib")
+    if backend == "json":
+        repo = JsonCampaignRepository(tmp_path / "campaign.json", retention=retention)
+    elif backend == "jsonl":
+        repo = JsonlCampaignRepository(
+            tmp_path / "campaign.json", segment_events=10, retention=retention
+        )
+    else:
+        repo = SqliteCampaignRepository(tmp_path / "campaign.sqlite3")
+    state = repo.load()
+
+    def commit(number):
+        if number % 2:
+            event = _event("quest.status_changed", quest_id=f"q{number % 5}")
+        else:
+            event = _event(
+                "chat.message",
+                chat_id=f"c{number % 3}",
+                contact_id=f"u{number % 4}",
+                sender_contact_id="u0",
+            )
+        repo.commit([event], state, sections=())
+
+    for number in range(60):
+        commit(number)
+    if backend == "jsonl":
+        assert any(path.suffix == ".z" for path in repo.log.archive_paths())
+
+    def timeline(entity_type, entity_id):
+        return [event.seq for event in repo.entity_events(entity_type, entity_id)]
+
+    assert timeline("quest", "q2") == [n + 1 for n in range(60) if n % 2 and n % 5 == 2]
+    assert timeline("chat", "c0") == [n + 1 for n in range(0, 60, 2) if n % 3 == 0]
+    # Either contact field names the contact; an event naming it twice appears once.
+    assert timeline("contact", "u0") == list(range(1, 61, 2))
+    assert timeline("contact", "u2") == [n + 1 for n in range(0, 60, 2) if n % 4 == 2]
+    assert timeline("quest", "missing") == []
+
+    # Appends after the first lookup are indexed too.
+    commit(61)
+    assert timeline("quest", "q1")[-1] == 61
+
+    with pytest.raises(ValueError):
+        repo.entity_events("dragon", "q1")
+
+
+def test_event_log_reads_stay_whole_while_the_tail_is_written(tmp_path):
+    log = event_log.EventLog(tmp_path / "events", segment_events=1000)
+    done = threading.Event()
+    problems = []
+
+    def read():
+        while not done.is_set():
+            seqs = [event.seq for event in log.iter()]
+            if seqs != list(range(1, len(seqs) + 1)):
+                problems.append(seqs)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    try:
+        for number in range(100):
+            log.append([_event(amount=number) for _ in range(10)])
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+
+    assert problems == []
+    assert [event.seq for event in log.iter()] == list(range(1, 1001))
+
+
+def test_json_reads_see_whole_commits_while_the_writer_runs(tmp_path):
+    repo = JsonCampaignRepository(tmp_path / "campaign.json", durability=Durability("none"))
+    state = repo.load()
+    done = threading.Event()
+    problems = []
+
+    def read():
+        while not done.is_set():
+            seqs = [event.seq for event in repo.query_events(EventQuery(), 1000)]
+            if seqs != list(range(1, len(seqs) + 1)):
+                problems.append(seqs)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    try:
+        for number in range(200):
+            repo.commit([_event(amount=number)], state, sections=())
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+
+    assert problems == []
+    assert [event.seq for event in repo.list_events()] == list(range(1, 201))